@@ -1,3 +1,4 @@
+import dataclasses
 import datetime
 import logging
 import random
@@ -14,51 +15,48 @@ import pytz
 import asyncio
 import aiohttp
 from functools import wraps
-from collections import defaultdict
 
 from bot.utils import urls, config, chunking
 from bot.store import MissingPuzzleError, PuzzleData, PuzzleJsonDb, GuildSettings, GuildSettingsDb, HuntSettings, \
-    RoundData, RoundJsonDb, HuntData, HuntJsonDb, MySQLRoundJsonDb, MySQLAdditionalSheetsDb, SheetsJsonDb, AdditionalSheetData
+    RoundData, RoundJsonDb, HuntData, HuntJsonDb, MySQLRoundJsonDb, MySQLAdditionalSheetsDb, SheetsJsonDb, AdditionalSheetData, \
+    SchemaDb, NoteData, NotesDb, channel_index, codec, CommandContext, command_contexts, \
+    LAZY_FIELDS, uses_context, JobData, JobsDb
 from bot.utils.chunking import build_note_embeds
+from bot.utils.gsheets import HuntSheets
+from bot.utils.jobs import JobCommandContext, JobQueue
+from bot.utils.locks import puzzle_locks
+from bot.utils.meta_refresh import MetaRefresher
 
 logger = logging.getLogger(__name__)
 
-# One asyncio.Lock per puzzle id
-_PUZZLE_LOCKS = defaultdict(asyncio.Lock)
-
 def with_puzzle_mutex(*, wait: bool = True):
     """
     Decorator that serializes commands per puzzle.
     If wait=False, it will error immediately if busy.
+    Commands on other puzzles in the same round and hunt still run in parallel.
     """
     def decorator(func):
         @wraps(func)
         async def wrapper(self, ctx: commands.Context, *args, **kwargs):
-            env = getattr(ctx, "env", None) or self.environment.get(ctx.message.id)
-            puzzle = (env or {}).get("puzzle")
+            context = self.environment.get(ctx.message.id)
+            # The puzzle id is known from the channel, without loading the puzzle
+            channel = context.channel if context is not None else None
 
             # If not in a puzzle context, just run
-            if not puzzle:
+            if channel is None or not channel.puzzle_id:
                 return await func(self, ctx, *args, **kwargs)
 
-            lock = _PUZZLE_LOCKS[puzzle.id]
-
-            if wait:
-                if lock.locked():
-                    await ctx.send("⏳ Hold your horses!  Another command is running for this puzzle, I'll get to you in a second.")
-                async with lock:
+            path = (("hunt", channel.hunt_id), ("round", channel.round_id), ("puzzle", channel.puzzle_id))
+            # Checked and taken in one step, so two commands cannot both find it free
+            async with puzzle_locks.hold(*path, blocking=False) as acquired:
+                if acquired:
                     return await func(self, ctx, *args, **kwargs)
-
-            try:
-                await asyncio.wait_for(lock.acquire(), timeout=0.001)
-            except asyncio.TimeoutError:
+            if not wait:
                 await ctx.send("⏳ Woah there, I'm busy running another command on that puzzle. Patience is a virtue, try again later.")
                 return
-
-            try:
+            await ctx.send("⏳ Hold your horses!  Another command is running for this puzzle, I'll get to you in a second.")
+            async with puzzle_locks.hold(*path):
                 return await func(self, ctx, *args, **kwargs)
-            finally:
-                lock.release()
 
         return wrapper
     return decorator
@@ -76,6 +74,10 @@ class Puzzles(commands.Cog):
     HUNT_REASON = "bot-hunt-general"
     ROUND_REASON = "bot-round"
     SOLVE_CATEGORY = False
+    ARCHIVE_LOOP_MINUTES = 5
+    # How long after a solve the archive loop leaves a puzzle for !solve to tidy up itself
+    ARCHIVE_DELAY_MINUTES = 10
+    JOB_WORKERS = 4
     SOLVE_DIVIDER = "———solved———"
     SOLVED_PUZZLES_CATEGORY = "solved"
     PUZZLE_GROUPS = ["Round","Metapuzzle","Metaless Round"]
@@ -100,7 +102,6 @@ class Puzzles(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        # self.archived_solved_puzzles_loop.start()
         self.reminder_index=0
         self.guild = None
         self.guild_data = None
@@ -108,69 +109,95 @@ class Puzzles(commands.Cog):
         self.puzzle = None
         self.gsheet_cog = None
         self.position_lock = asyncio.Lock()
-        self.environment = {}
+        self.environment = command_contexts
+        self.jobs = JobQueue(JobsDb, workers=self.JOB_WORKERS)
+        self.meta_refresher = MetaRefresher(self.refresh_meta_sheet, window=config.meta_refresh_seconds)
+        # Meta rewrites are coalesced by the refresher, so need not wait for one another
+        self.jobs.register("refresh_meta", self.refresh_meta_job, ordered=False)
+        for kind, handler in (("archive_sheet", self.archive_sheet_job), ("move_to_solved", self.move_to_solved_job),
+                              ("update_info", self.update_info_job), ("announce", self.announce_job)):
+            self.jobs.register(kind, handler)
+
+    async def cog_load(self):
+        """Check the schema, build the channel index used to resolve command context and start the job queue"""
+        await SchemaDb.check()
+        channel_index.load(*await GuildSettingsDb.get_channel_index_rows())
+        logger.info(f"Channel index loaded with {len(channel_index)} channels")
+        self.archive_solved_puzzles_loop.start()
+        await self.jobs.start()
+
+    async def cog_unload(self):
+        self.archive_solved_puzzles_loop.cancel()
+        await self.jobs.stop()
+        await self.meta_refresher.close()
 
     async def cog_before_invoke(self, ctx):
-        """For separating commands use ctx.message.id"""
-        """For logging ctx.author.name and ctx.message.content"""
-        """Before command invoked setup puzzle objects and channel type"""
-        guild = None
-        guild_data = None
-        channel_type = None
-        hunt = None
-        hunt_round = None
-        puzzle = None
-        gsheet_cog = None
-        guild = ctx.guild
-        guild_data = GuildSettingsDb.get(ctx.guild.id)
-        channel_type = GuildSettingsDb.get_channel_type(ctx.channel.id)
-        if channel_type is None:
-            channel_type = GuildSettingsDb.get_channel_type(ctx.channel.category.id)
-        if channel_type is None:
-            channel_type = "Guild"
-        if channel_type == 'Hunt':
-            hunt = HuntJsonDb.get_by_attr(channel_id=ctx.channel.id,)
-        if channel_type == 'Group':
-            hunt_round = RoundJsonDb.get_by_attr(category_id=ctx.channel.category.id,)
-            if hunt_round:
-                channel_type = hunt_round.type
-                hunt = HuntJsonDb.get_by_attr(id=hunt_round.hunt_id)
-                if hunt_round.meta_id:
-                    puzzle = PuzzleJsonDb.get_by_attr(id=hunt_round.meta_id)
-        if channel_type == 'Puzzle':
-            puzzle = PuzzleJsonDb.get_by_attr(channel_id=ctx.channel.id,)
-            hunt_round = RoundJsonDb.get_by_attr(meta_id=puzzle.id)
-            if hunt_round:
-                channel_type = hunt_round.type
-            else:
-                hunt_round = RoundJsonDb.get_by_attr(category_id=ctx.channel.category.id, )
-            if puzzle:
-                hunt = HuntJsonDb.get_by_attr(id=puzzle.hunt_id)
-        print (f"Channel type: {channel_type}")
-        # print (f"Group data type: {hunt_round}")
+        """Before command invoked open its context, keyed by ctx.message.id
+
+        The hunt, round and puzzle are loaded here only if the command
+        declared it needs them with @uses_context (all of them if it did not
+        declare anything), so utility commands do not touch the database.
+        """
+        await self.open_context(ctx, getattr(ctx.command.callback, "context_needs", LAZY_FIELDS))
+
+    async def open_context(self, ctx, needs) -> CommandContext:
+        """Open the context of a command, or of a job running command code, and load what it needs"""
+        category_id = ctx.channel.category.id if ctx.channel.category else None
+        unknown = channel_index.unknown(ctx.channel.id, category_id)
+        if unknown:
+            channel_index.load(*await GuildSettingsDb.get_channel_rows(unknown), looked_up=unknown)
+        channel = channel_index.resolve(ctx.channel.id, category_id)
         gsheet_cog = self.bot.get_cog("GoogleSheets")
-        if hunt is not None:
-            gsheet_cog.set_spreadsheet_id(hunt.google_sheet_id)
-            gsheet_cog.set_archive_spreadsheet_id(hunt.archive_google_sheet_id)
-        self.environment[ctx.message.id] = {'channel_type': channel_type,
-                                            'hunt': hunt,
-                                            'hunt_round': hunt_round,
-                                            'puzzle': puzzle,
-                                            'guild': guild,
-                                            'guild_data': guild_data,
-                                            'gsheet_cog': gsheet_cog}
+
+        async def load_hunt():
+            return await HuntJsonDb.get_by_attr(id=channel.hunt_id) if channel.hunt_id else None
+
+        async def load_hunt_round():
+            return await RoundJsonDb.get_by_attr(id=channel.round_id) if channel.round_id else None
+
+        async def load_puzzle():
+            return await PuzzleJsonDb.get_by_attr(id=channel.puzzle_id) if channel.puzzle_id else None
+
+        async def load_guild_data():
+            return await GuildSettingsDb.get_cached(ctx.guild.id)
+
+        context = CommandContext(
+            channel,
+            {"hunt": load_hunt, "hunt_round": load_hunt_round, "puzzle": load_puzzle, "guild_data": load_guild_data},
+            needs=needs,
+            guild=ctx.guild,
+            gsheet_cog=gsheet_cog,
+        )
+        self.environment.open(ctx.message.id, context)
+        try:
+            await context.load()
+        except BaseException:
+            # cog_after_invoke is not called when this hook fails
+            self.environment.close(ctx.message.id)
+            raise
+        return context
 
     async def cog_after_invoke(self, ctx):
-        """After command invoked ensure changes committed to database"""
-        if self.get_puzzle(ctx):
-            PuzzleJsonDb.commit(self.get_puzzle(ctx))
-        if self.get_hunt_round(ctx):
-            RoundJsonDb.commit(self.get_hunt_round(ctx))
-        if self.get_hunt(ctx):
-            HuntJsonDb.commit(self.get_hunt(ctx))
-        if self.get_guild_data(ctx):
-            GuildSettingsDb.commit(self.get_guild_data(ctx))
-        self.environment.pop(ctx.message.id, None)
+        """After command invoked ensure changes committed to database, then close its context
+
+        discord.py calls this however the command ended.
+        """
+        await self.close_context(ctx)
+
+    async def close_context(self, ctx):
+        """Commit what the command changed and close its context"""
+        context = self.environment.get(ctx.message.id)
+        if context is None:
+            return
+        try:
+            # Only objects the command loaded and actually changed are written back
+            for name, store in (("puzzle", PuzzleJsonDb), ("hunt_round", RoundJsonDb), ("hunt", HuntJsonDb),
+                                ("guild_data", GuildSettingsDb)):
+                data = context.loaded(name)
+                if data is not None and data.is_dirty():
+                    await store.commit(data)
+        finally:
+            self.environment.close(ctx.message.id)
 
     async def meta_code_autocomplete(
             self,
@@ -179,8 +206,8 @@ class Puzzles(commands.Cog):
     ) -> list[app_commands.Choice[str]]:
         # Pull valid rounds/metas from DB
         channel = interaction.channel
-        hunt_id = RoundJsonDb.get_by_attr(category_id = channel.category.id).hunt_id
-        rounds = RoundJsonDb.get_all(hunt_id)
+        hunt_id = (await RoundJsonDb.get_by_attr(category_id = channel.category.id)).hunt_id
+        rounds = await RoundJsonDb.get_all(hunt_id)
         rounds_sorted = sorted(
             rounds,
             key=lambda r: (
@@ -192,7 +219,7 @@ class Puzzles(commands.Cog):
         choices: list[app_commands.Choice[str]] = []
         for r in rounds_sorted:
             # filter to only rounds that are metas
-            if len(r.meta_code) != 6:
+            if not r.meta_code or len(r.meta_code) != 6:
                 continue
             # Build a human label. Keep it short-ish.
             label = f"{r.name} ({r.meta_code})"
@@ -223,46 +250,50 @@ class Puzzles(commands.Cog):
         return "-".join(name.lower().split())
 
     def get_channel_type(self, ctx):
-        return self.environment[ctx.message.id]['channel_type'] or None
+        return self.environment[ctx.message.id].peek('channel_type') or None
 
     def set_channel_type(self, ctx, channel_type):
-        self.environment[ctx.message.id]['channel_type'] = channel_type
+        self.environment[ctx.message.id].set('channel_type', channel_type)
 
     def get_hunt(self, ctx):
-        return self.environment[ctx.message.id]['hunt'] or None
+        return self.environment[ctx.message.id].peek('hunt') or None
 
     def set_hunt(self, ctx, hunt):
-        self.environment[ctx.message.id]['hunt'] = hunt
+        self.environment[ctx.message.id].set('hunt', hunt)
 
     def get_hunt_round(self, ctx):
-        return self.environment[ctx.message.id]['hunt_round'] or None
+        return self.environment[ctx.message.id].peek('hunt_round') or None
 
     def set_hunt_round(self, ctx, hunt_round):
-        self.environment[ctx.message.id]['hunt_round'] = hunt_round
+        self.environment[ctx.message.id].set('hunt_round', hunt_round)
 
     def get_puzzle(self, ctx):
-        return self.environment[ctx.message.id]['puzzle'] or None
+        return self.environment[ctx.message.id].peek('puzzle') or None
 
     def set_puzzle(self, ctx, puzzle):
-        self.environment[ctx.message.id]['puzzle'] = puzzle
+        self.environment[ctx.message.id].set('puzzle', puzzle)
 
     def get_guild(self, ctx):
-        return self.environment[ctx.message.id]['guild'] or None
+        return self.environment[ctx.message.id].peek('guild') or None
 
     def set_guild(self, ctx, guild):
-        self.environment[ctx.message.id]['guild'] = guild
+        self.environment[ctx.message.id].set('guild', guild)
 
     def get_guild_data(self, ctx):
-        return self.environment[ctx.message.id]['guild_data'] or None
+        return self.environment[ctx.message.id].peek('guild_data') or None
 
     def set_guild_data(self, ctx, guild_data):
-        self.environment[ctx.message.id]['guild_data'] = guild_data
+        self.environment[ctx.message.id].set('guild_data', guild_data)
 
     def get_gsheet_cog(self, ctx):
-        return self.environment[ctx.message.id]['gsheet_cog'] or None
+        return self.environment[ctx.message.id].peek('gsheet_cog') or None
 
     def set_gsheet_cog(self, ctx, gsheet_cog):
-        self.environment[ctx.message.id]['gsheet_cog'] = gsheet_cog
+        self.environment[ctx.message.id].set('gsheet_cog', gsheet_cog)
+
+    def get_hunt_sheets(self, ctx) -> HuntSheets:
+        """The command's hunt's spreadsheets, to pass to the GoogleSheets cog"""
+        return HuntSheets.for_hunt(self.get_hunt(ctx))
 
     def get_puzzle_sheet(self, ctx, puzzle: PuzzleData):
         hunt = self.get_hunt(ctx)
@@ -280,6 +311,8 @@ class Puzzles(commands.Cog):
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
+        # A failed check or argument means the command never ran, so cog_after_invoke will not close its context
+        self.environment.close(ctx.message.id)
         if isinstance(error, commands.CheckFailure) and str(error) == "PUZZLE_BUSY":
             await ctx.send("⏳ That puzzle is busy running another command. Try again in a moment.")
             return
@@ -287,7 +320,7 @@ class Puzzles(commands.Cog):
 
     async def check_is_bot_channel(self, ctx) -> bool:
         """Check if command was sent to bot channel configured in settings"""
-        settings = GuildSettingsDb.get_cached(ctx.guild.id)
+        settings = await GuildSettingsDb.get_cached(ctx.guild.id)
         if not settings.discord_bot_channel:
             # If no channel is designated, then all channels are fine
             # to listen to commands.
@@ -345,7 +378,7 @@ class Puzzles(commands.Cog):
             arg, role = arg.split(", ", 1)
         if ":" in arg:
             hunt_name, hunt_url = arg.split(":", 1)
-            if HuntJsonDb.check_duplicates(hunt_name):
+            if await HuntJsonDb.check_duplicates(hunt_name):
                 return await ctx.send(f":exclamation: **Hunt {hunt_name}** already exists, please use a different name")
             await self.create_hunt(ctx, hunt_name, hunt_url, role)
             return await ctx.send(
@@ -385,21 +418,18 @@ class Puzzles(commands.Cog):
         if self.get_gsheet_cog(ctx) is not None:
             google_drive_id = await self.get_gsheet_cog(ctx).create_hunt_spreadsheet(hunt_name)
 
-        uid = HuntJsonDb.generate_uid('uid')
-
         new_hunt = HuntData(
             name=hunt_name,
             category_id=category.id,
             channel_id=text_channel.id,
             guild_id=settings.id,
             url=hunt_url,
-            uid=uid,
         )
 
         if google_drive_id:
             new_hunt.google_sheet_id=google_drive_id
 
-        HuntJsonDb.commit(new_hunt)
+        await HuntJsonDb.commit_with_uid(new_hunt, 'uid')
 
         # add hunt settings
         initial_message = await self.send_initial_hunt_channel_messages(ctx, text_channel, hunt=new_hunt)
@@ -425,7 +455,7 @@ class Puzzles(commands.Cog):
             google_drive_id = await self.get_gsheet_cog(ctx).create_hunt_archive_spreadsheet(hunt.name)
             hunt.archive_google_sheet_id = google_drive_id
 
-        HuntJsonDb.commit(hunt)
+        await HuntJsonDb.commit(hunt)
 
         await ctx.send(":white_check_mark: The hunt has been set to use a second sheet for solved puzzles")
         await self.info(ctx, update=True)
@@ -439,7 +469,7 @@ class Puzzles(commands.Cog):
 
         puzzle_name = arg
         self.start = datetime.datetime.now()
-        if PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
+        if await PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
             return await ctx.send(f":exclamation: Puzzle **{puzzle_name}** already exists in this hunt or will lead to a duplicate channel name, please use a different name")
 
         if await self.check_available_space(ctx,1) is False:
@@ -449,7 +479,7 @@ class Puzzles(commands.Cog):
         # RoundJsonDb.commit(self.get_hunt_round(ctx))
         check_duplicate = datetime.datetime.now()
         category = ctx.channel.category
-        new_puzzle = await self.create_puzzle(ctx, puzzle_name, self.get_tag_from_category(category))
+        new_puzzle = await self.create_puzzle(ctx, puzzle_name, await self.get_tag_from_category(category))
         puzzle_created = datetime.datetime.now()
         await self.create_puzzle_channel(ctx, new_puzzle, position='bottom')
         channel_sent = datetime.datetime.now()
@@ -484,36 +514,69 @@ class Puzzles(commands.Cog):
 
         if self.get_gsheet_cog(ctx) is not None:
             # update google sheet ID
-            await self.get_gsheet_cog(ctx).create_puzzle_spreadsheet(new_puzzle)
+            await self.get_gsheet_cog(ctx).create_puzzle_spreadsheet(self.get_hunt_sheets(ctx), new_puzzle)
 
-        PuzzleJsonDb.commit(new_puzzle)
+        await PuzzleJsonDb.commit(new_puzzle)
 
         for tag in new_puzzle.tags:
-            meta_round = RoundJsonDb.get_by_attr(id=tag)
+            meta_round = await RoundJsonDb.get_by_attr(id=tag)
             await self.update_metapuzzle(ctx, meta_round)
 
         return new_puzzle
 
-    async def _update_metameta_impl(self, ctx, metameta, hunt_id):
-        all_puzzles = PuzzleJsonDb.get_all_from_hunt(hunt_id)
-        await self.get_gsheet_cog(ctx).add_metametapuzzle_data(metameta, all_puzzles)
+    async def _update_metameta_impl(self, gsheet_cog, hunt_sheets, metameta, hunt_id):
+        # One refresh of a meta's sheet at a time, read inside the lock so the last write has the latest puzzles
+        async with puzzle_locks.hold(("hunt", hunt_id), ("meta", metameta.id)):
+            all_puzzles = await PuzzleJsonDb.get_all_from_hunt(hunt_id)
+            await gsheet_cog.add_metametapuzzle_data(hunt_sheets, metameta, all_puzzles)
 
     @commands.command()
     async def update_metameta(self, ctx):
         hunt_id = self.get_hunt(ctx).id
-        meta_meta_puzzle = PuzzleJsonDb.get_by_attr(metameta=1)
+        meta_meta_puzzle = await PuzzleJsonDb.get_by_attr(metameta=1)
         if meta_meta_puzzle:
-            await self._update_metameta_impl(ctx, meta_meta_puzzle, hunt_id)
+            await self._update_metameta_impl(self.get_gsheet_cog(ctx), self.get_hunt_sheets(ctx), meta_meta_puzzle,
+                                             hunt_id)
         await ctx.send(":white_check_mark: Meta meta updated")
 
     async def update_metapuzzle(self, ctx, hunt_round):
-        round_puzzles = PuzzleJsonDb.get_all_from_round(hunt_round.id)
-        if hunt_round.meta_id:
-            metapuzzle = PuzzleJsonDb.get_by_attr(id=hunt_round.meta_id)
-            if metapuzzle.metameta:
-                await self._update_metameta_impl(ctx,metapuzzle,hunt_round.hunt_id)
-            else:
-                await self.get_gsheet_cog(ctx).add_metapuzzle_data(metapuzzle, round_puzzles)
+        """Mark the round's meta sheet for rewriting, see MetaRefresher"""
+        key = await self.meta_refresh_key(hunt_round)
+        if key is not None:
+            self.meta_refresher.mark(key)
+
+    async def meta_refresh_key(self, hunt_round):
+        """MetaRefresher key for the round's meta sheet, or None if the round has no meta"""
+        if not hunt_round.meta_id:
+            return None
+        metapuzzle = await PuzzleJsonDb.get_by_attr(id=hunt_round.meta_id)
+        if metapuzzle is None:
+            return None
+        if metapuzzle.metameta:
+            return ("metameta", hunt_round.hunt_id, metapuzzle.id)
+        return ("meta", hunt_round.hunt_id, hunt_round.id)
+
+    async def refresh_meta_sheet(self, key):
+        """Rewrite a meta sheet marked by update_metapuzzle, once its window has passed"""
+        kind, hunt_id, key_id = key
+        gsheet_cog = self.bot.get_cog("GoogleSheets")
+        hunt = await HuntJsonDb.get_by_attr(id=hunt_id)
+        if gsheet_cog is None or hunt is None:
+            return
+        hunt_sheets = HuntSheets.for_hunt(hunt)
+        if kind == "metameta":
+            metameta = await PuzzleJsonDb.get_by_attr(id=key_id)
+            if metameta is not None:
+                await self._update_metameta_impl(gsheet_cog, hunt_sheets, metameta, hunt_id)
+            return
+        hunt_round = await RoundJsonDb.get_by_attr(id=key_id)
+        if hunt_round is None or not hunt_round.meta_id:
+            return
+        metapuzzle = await PuzzleJsonDb.get_by_attr(id=hunt_round.meta_id)
+        # Solves in different puzzles of the round would otherwise rewrite the meta's tab at the same time
+        async with puzzle_locks.hold(("hunt", hunt_id), ("round", hunt_round.id), ("meta", metapuzzle.id)):
+            round_puzzles = await PuzzleJsonDb.get_all_from_round(hunt_round.id)
+            await gsheet_cog.add_metapuzzle_data(hunt_sheets, metapuzzle, round_puzzles)
 
     # @commands.command()
     # @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
@@ -540,6 +603,7 @@ class Puzzles(commands.Cog):
 
     @commands.hybrid_command(description="Move the channel to the top of the unsolved section of the category (organisers only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context()
     async def move_to_top(self, ctx):
         channel = ctx.channel
         position = self.get_first_channel(ctx, channel.category)
@@ -548,6 +612,7 @@ class Puzzles(commands.Cog):
 
     @commands.hybrid_command(description="Move the channel to the bottom of the unsolved section of the category (organisers only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context()
     async def move_to_bottom(self, ctx):
         channel = ctx.channel
         position = self.get_solve_divider_position(ctx, channel.category)
@@ -556,6 +621,7 @@ class Puzzles(commands.Cog):
 
     @commands.hybrid_command(description="Move the channel to the solved section of the category (organisers only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context()
     async def move_to_solved(self, ctx):
         channel = ctx.channel
         position = self.get_solve_divider_position(ctx, channel.category)
@@ -569,8 +635,8 @@ class Puzzles(commands.Cog):
     #     position = int(position)
     #     await channel.edit(position=position)
 
-    def get_tag_from_category(self, category):
-        hunt_round = RoundJsonDb.get_by_attr(category_id=category.id)
+    async def get_tag_from_category(self, category):
+        hunt_round = await RoundJsonDb.get_by_attr(category_id=category.id)
         if hunt_round:
             return hunt_round.id
         else:
@@ -578,13 +644,14 @@ class Puzzles(commands.Cog):
 
     @commands.hybrid_command(description="Show all tags on the puzzle (admin only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context("puzzle", "hunt")
     async def list_tags(self, ctx):
         """*(admin) For troubleshooting only: !list_tags*"""
         puzzle = self.get_puzzle(ctx)
         tag_info = ""
         tags = puzzle.tags.copy()
         for tag in tags:
-            tag_name = RoundJsonDb.get_by_attr(id=tag).name
+            tag_name = (await RoundJsonDb.get_by_attr(id=tag)).name
             tag_info += f"{tag_name} - ID:{tag}\n"
         embed = discord.Embed(
             description=f"""Tag listing for {puzzle.name}"""
@@ -594,7 +661,7 @@ class Puzzles(commands.Cog):
             value=tag_info,
             inline=False,
         )
-        groups = RoundJsonDb.get_all(self.get_hunt(ctx).id)
+        groups = await RoundJsonDb.get_all(self.get_hunt(ctx).id)
         group_info = ""
         for group in groups:
             group_info += f"{group.name} - ID:{group.id}\n"
@@ -607,23 +674,25 @@ class Puzzles(commands.Cog):
 
     @commands.command()
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context("puzzle")
     async def add_tag(self, ctx, *, arg):
         """*(admin) For troubleshooting only: !add_tag tag_id*"""
         new_tag = arg
         puzzle = self.get_puzzle(ctx)
         puzzle.tags.append(new_tag)
-        await ctx.channel.send(f"```json\n{puzzle.to_json(indent=2)}```")
+        await ctx.channel.send(f"```json\n{codec.encode(puzzle, indent=2)}```")
 
     @commands.command()
     @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
     @with_puzzle_mutex(wait=True)
+    @uses_context("puzzle")
     async def remove_tag(self, ctx, *, arg):
         """*(admin) For troubleshooting only: !remove_tag tag_id*"""
         remove_tag = int(arg)
         puzzle = self.get_puzzle(ctx)
         if remove_tag in puzzle.tags:
             puzzle.tags.remove(remove_tag)
-        await ctx.channel.send(f"```json\n{puzzle.to_json(indent=2)}```")
+        await ctx.channel.send(f"```json\n{codec.encode(puzzle, indent=2)}```")
 
     @commands.command()
     @with_puzzle_mutex(wait=True)
@@ -640,13 +709,15 @@ class Puzzles(commands.Cog):
             puzzle_name=name or f"Extra sheet for {puzzle.name}"
         )
 
-        sheet.google_page_id = await self.get_gsheet_cog(ctx).create_additional_spreadsheet(puzzle, name)
+        sheet.google_page_id = await self.get_gsheet_cog(ctx).create_additional_spreadsheet(self.get_hunt_sheets(ctx),
+                                                                                             puzzle, name)
         puzzle.additional_sheets.append(sheet)
-        SheetsJsonDb.commit(sheet)
+        await PuzzleJsonDb.commit(puzzle)
         await self.info(ctx, update=True)
         return await ctx.send(f":white_check_mark: Added sheet {name} to puzzle.")
 
     @commands.command(aliases=['list_sheets'])
+    @uses_context("puzzle", "hunt")
     async def list_additional_sheets(self, ctx):
         puzzle = self.get_puzzle(ctx)
         if len(puzzle.additional_sheets) == 0:
@@ -730,7 +801,7 @@ class Puzzles(commands.Cog):
                 # f":white_check_mark: I've created new puzzle {created_desc} channels for {self.get_hunt_round(ctx).name}: {text_channel.mention}"
                 f":white_check_mark: I've created new puzzle {created_desc} channels for {category.name}: {text_channel.mention}"
             )
-            PuzzleJsonDb.commit(new_puzzle)
+            await PuzzleJsonDb.commit(new_puzzle)
 
         else:
             await ctx.send(
@@ -750,23 +821,21 @@ class Puzzles(commands.Cog):
             await ctx.send(":x: This does not appear to be a main group channel")
             return
         meta_category = ctx.channel.category
-        meta_round = RoundJsonDb.get_by_attr(category_id=meta_category.id)
+        meta_round = await RoundJsonDb.get_by_attr(category_id=meta_category.id)
         old_tags = []
         if meta_round:
-            for channel in meta_category.channels:
-                puzzle = PuzzleJsonDb.get_by_attr(channel_id=channel.id)
-                if puzzle:
-                    if puzzle.tags:
-                        old_tags.extend(puzzle.tags.copy())
-                    # Remove puzzle from old rounds if a not a metapuzzle
-                    if puzzle.is_metapuzzle() is False:
-                        puzzle.tags.clear()
-                    puzzle.tags.append(meta_round.id)
-                    PuzzleJsonDb.commit(puzzle)
+            puzzles = await PuzzleJsonDb.get_many(channel_ids=[channel.id for channel in meta_category.channels])
+            for puzzle in puzzles:
+                if puzzle.tags:
+                    old_tags.extend(puzzle.tags.copy())
+                # Remove puzzle from old rounds if a not a metapuzzle
+                if puzzle.is_metapuzzle() is False:
+                    puzzle.tags.clear()
+                puzzle.tags.append(meta_round.id)
+            await PuzzleJsonDb.commit_many(puzzles)
             await self.update_metapuzzle(ctx, meta_round)
-            unique_old_tags = list(dict.fromkeys(old_tags))
-            for old_tag in unique_old_tags:
-                old_meta_round = RoundJsonDb.get_by_attr(id=old_tag)
+            unique_old_tags = [old_tag for old_tag in dict.fromkeys(old_tags) if old_tag != meta_round.id]
+            for old_meta_round in await RoundJsonDb.get_many(ids=unique_old_tags):
                 await self.update_metapuzzle(ctx, old_meta_round)
 
         await ctx.send(f":white_check_mark: All the puzzles in this category have been tagged to the group")
@@ -784,10 +853,10 @@ class Puzzles(commands.Cog):
             await ctx.send(":x: This does not appear to be a Puzzle channel")
             return
         puzzle = self.get_puzzle(ctx)
-        meta_round = RoundJsonDb.get_by_attr(meta_code=meta_code)
+        meta_round = await RoundJsonDb.get_by_attr(meta_code=meta_code)
         if meta_round:
             puzzle.tags.append(meta_round.id)
-            PuzzleJsonDb.commit(puzzle)
+            await PuzzleJsonDb.commit(puzzle)
             await ctx.send(
                 f":white_check_mark: This puzzle has been tagged to {meta_round.name} and meta sheets are being updated.")
             await self.update_metapuzzle(ctx, meta_round)
@@ -808,7 +877,7 @@ class Puzzles(commands.Cog):
             return
         puzzle = self.get_puzzle(ctx)
         old_tags = []
-        meta_round = RoundJsonDb.get_by_attr(meta_code=meta_code)
+        meta_round = await RoundJsonDb.get_by_attr(meta_code=meta_code)
         if meta_round:
             new_category = discord.utils.get(self.get_guild(ctx).categories, id=meta_round.category_id)
             await ctx.channel.edit(category=new_category, position=2)
@@ -819,10 +888,10 @@ class Puzzles(commands.Cog):
             if puzzle.is_metapuzzle() is False:
                 puzzle.tags.clear()
             puzzle.tags.append(meta_round.id)
-            PuzzleJsonDb.commit(puzzle)
+            await PuzzleJsonDb.commit(puzzle)
             await self.update_metapuzzle(ctx, meta_round)
             for old_tag in old_tags:
-                old_meta_round = RoundJsonDb.get_by_attr(id=old_tag)
+                old_meta_round = await RoundJsonDb.get_by_attr(id=old_tag)
                 await self.update_metapuzzle(ctx, old_meta_round)
         else:
             await ctx.send(":x: Please send a valid meta code")
@@ -840,7 +909,7 @@ class Puzzles(commands.Cog):
             await ctx.send(":x: This does not appear to be a Puzzle channel")
             return
         puzzle = self.get_puzzle(ctx)
-        meta_round = RoundJsonDb.get_by_attr(meta_code=meta_code)
+        meta_round = await RoundJsonDb.get_by_attr(meta_code=meta_code)
         if puzzle.id == meta_round.meta_id:
             await ctx.send(":x: You can't remove a metapuzzle from it's own round!")
             return
@@ -849,12 +918,12 @@ class Puzzles(commands.Cog):
             old_tags = []
             old_tags.extend(puzzle.tags.copy())
             puzzle.tags.remove(meta_round.id)
-            PuzzleJsonDb.commit(puzzle)
+            await PuzzleJsonDb.commit(puzzle)
             await ctx.send(
                 f":white_check_mark: This puzzle has been removed from {meta_round.name} and meta sheets are being updated.")
             await self.update_metapuzzle(ctx, meta_round)
             for old_tag in old_tags:
-                old_meta_round = RoundJsonDb.get_by_attr(id=old_tag)
+                old_meta_round = await RoundJsonDb.get_by_attr(id=old_tag)
                 await self.update_metapuzzle(ctx, old_meta_round)
         else:
             await ctx.send(":x: Please send a valid meta code")
@@ -890,12 +959,12 @@ class Puzzles(commands.Cog):
 
         self.start = datetime.datetime.now()
 
-        if RoundJsonDb.check_duplicates_in_hunt(arg, self.get_hunt(ctx)):
+        if await RoundJsonDb.check_duplicates_in_hunt(arg, self.get_hunt(ctx)):
             return await ctx.send(f":exclamation: **{group_type} {arg}** already exists in this hunt or will lead to a duplicate channel name, please use a different name.")
 
         if puzzle:
             puzzle_name = arg + " - meta" if group_type == "Round" else arg
-            if PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
+            if await PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
                 return await ctx.send(f":exclamation: **{group_type} {arg}** will cause a puzzle name clash within this hunt, please use a different name.")
         check_duplicate = datetime.datetime.now()
         new_round = RoundData(arg)
@@ -926,10 +995,10 @@ class Puzzles(commands.Cog):
         new_round.category_id = new_category.id
         new_round.type = group_type
         new_round.start_time = datetime.datetime.now()
-        RoundJsonDb.commit(new_round)
+        await RoundJsonDb.commit_with_uid(new_round, 'meta_code', 6, arg)
 
         if puzzle:
-            round_puzzle = await self.create_metapuzzle(ctx, puzzle_name, self.get_tag_from_category(new_category))
+            round_puzzle = await self.create_metapuzzle(ctx, puzzle_name, await self.get_tag_from_category(new_category))
             text_channel, created = await self.create_puzzle_channel(ctx, round_puzzle, new_category, send_initial_message=False, position=0)
             new_round.meta_id = round_puzzle.id
         else:
@@ -938,11 +1007,7 @@ class Puzzles(commands.Cog):
                 channel_type="text", reason=self.PUZZLE_REASON, position=0
             )
 
-        meta_code = RoundJsonDb.generate_uid('meta_code',6,arg)
-
-        new_round.meta_code = meta_code
-
-        RoundJsonDb.commit(new_round)
+        await RoundJsonDb.commit(new_round)
 
         puzzle_created = datetime.datetime.now()
 
@@ -983,32 +1048,33 @@ class Puzzles(commands.Cog):
             data = self.get_guild_data(ctx)
         return data
 
-    def save_settings(self, ctx, settings):
+    async def save_settings(self, ctx, settings):
         if self.get_channel_type(ctx) == "Puzzle":
-            PuzzleJsonDb.commit(settings)
+            await PuzzleJsonDb.commit(settings)
         elif self.get_channel_type(ctx) in self.PUZZLE_GROUPS:
-            RoundJsonDb.commit(settings)
+            await RoundJsonDb.commit(settings)
         elif self.get_channel_type(ctx) == "Hunt":
-            HuntJsonDb.commit(settings)
+            await HuntJsonDb.commit(settings)
         else:
-            GuildSettingsDb.commit(settings)
+            await GuildSettingsDb.commit(settings)
 
     @commands.hybrid_command(description="Show channel settings (admin only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin')
     @commands.has_permissions(manage_channels=True)
     async def show_settings(self, ctx):
         """*(admin) Show channel settings for debug*"""
-        await ctx.send(f"```json\n{self.get_settings(ctx).to_json(indent=2)}```")
+        await ctx.send(f"```json\n{codec.encode(self.get_settings(ctx), indent=2)}```")
 
     @commands.hybrid_command(description="Show puzzle settings (admin only)",)
     @commands.has_any_role('Moderator', 'mod', 'admin')
     @commands.has_permissions(manage_channels=True)
+    @uses_context("puzzle")
     async def show_puzzle_settings(self, ctx):
         """*(admin) Show channel puzzle settings for debug*"""
         if self.get_puzzle(ctx):
             settings = []
-            for attr, value in self.get_puzzle(ctx).__dict__.items():
-                settings.append(f"{attr} = {value}")
+            for f in dataclasses.fields(self.get_puzzle(ctx)):
+                settings.append(f"{f.name} = {getattr(self.get_puzzle(ctx), f.name)}")
 
             embeds = build_note_embeds(
                 message="",
@@ -1119,9 +1185,9 @@ class Puzzles(commands.Cog):
 
             setattr(settings, setting_key, value)
             if command not in ("update_puzzle_setting", "update_puzzle_settings"):
-                self.save_settings(ctx, settings)
+                await self.save_settings(ctx, settings)
             else:
-                PuzzleJsonDb.commit(settings)
+                await PuzzleJsonDb.commit(settings)
             await ctx.send(f":white_check_mark: Updated `{setting_key}={value}` from old value: `{old_value}`")
         else:
             await ctx.send(f":exclamation: Unrecognized setting key: `{setting_key}`. Use `!show_settings` for more info.")
@@ -1157,7 +1223,7 @@ class Puzzles(commands.Cog):
         all_puzzles = {}
         embed_title = ""
         if self.get_channel_type(ctx) in ["Round","Puzzle","Metaless Round","Metapuzzle"]:
-            round_puzzles = PuzzleJsonDb.get_all_from_round(self.get_hunt_round(ctx).id)
+            round_puzzles = await PuzzleJsonDb.get_all_from_round(self.get_hunt_round(ctx).id)
             all_puzzles[self.get_hunt_round(ctx).id] = {
                         'name': self.get_hunt_round(ctx).name,
                         'puzzles': round_puzzles
@@ -1638,16 +1704,16 @@ class Puzzles(commands.Cog):
     async def rename_puzzle(self, ctx, *, puzzle_name: str):
         """Rename a puzzle"""
         if self.get_puzzle(ctx):
-            if PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
+            if await PuzzleJsonDb.check_duplicates_in_hunt(puzzle_name, self.get_hunt(ctx).id):
                 return await ctx.send(
                     f":exclamation: Puzzle **{puzzle_name}** already exists in this hunt or will lead to a duplicate channel name, please use a different name")
             await ctx.channel.edit(name=self.clean_name(puzzle_name))
             self.get_puzzle(ctx).name = puzzle_name
             self.get_puzzle(ctx).channel_name = self.clean_name(puzzle_name)
-            PuzzleJsonDb.commit(self.get_puzzle(ctx))
+            await PuzzleJsonDb.commit(self.get_puzzle(ctx))
             if self.get_gsheet_cog(ctx) is not None:
                 # update google sheet ID
-                await self.get_gsheet_cog(ctx).update_puzzle(self.get_puzzle(ctx), True)
+                await self.get_gsheet_cog(ctx).update_puzzle(self.get_hunt_sheets(ctx), self.get_puzzle(ctx), True)
                 if self.get_hunt_round(ctx):
                     await self.update_metapuzzle(ctx, self.get_hunt_round(ctx))
             await ctx.channel.send(":white_check_mark: I've updated the puzzle and channel names")
@@ -1662,7 +1728,7 @@ class Puzzles(commands.Cog):
             self.get_puzzle(ctx).url = url
             if self.get_gsheet_cog(ctx) is not None:
                 # update google sheet ID
-                await self.get_gsheet_cog(ctx).update_puzzle(self.get_puzzle(ctx))
+                await self.get_gsheet_cog(ctx).update_puzzle(self.get_hunt_sheets(ctx), self.get_puzzle(ctx))
             # await self.update_puzzle_attr_by_command(ctx, "hunt_url", url, reply=False)
             await self.send_state(
                 ctx, ctx.channel, self.get_puzzle(ctx), description=":white_check_mark: I've updated:" if url else None
@@ -1730,35 +1796,30 @@ class Puzzles(commands.Cog):
 
     @commands.command(aliases=["notes"])
     @with_puzzle_mutex(wait=True)
+    @uses_context("puzzle")
     async def note(self, ctx, *, note: Optional[str]):
         """*Show or add a note about the puzzle*"""
         if self.get_puzzle(ctx) is None:
             await self.send_not_puzzle_channel(ctx)
             return
 
+        puzzle = self.get_puzzle(ctx)
         message = "Showing notes left by users!"
         if note:
-            self.get_puzzle(ctx).notes.append(f"{note} - {ctx.message.jump_url}")
-            PuzzleJsonDb.commit(self.get_puzzle(ctx))
+            await NotesDb.commit(NoteData(puzzle_id=puzzle.id, text=note, author=ctx.author.display_name,
+                                          jump_url=ctx.message.jump_url))
+        # Notes are only read here and by erase_note, not with the puzzle
+        notes = await NotesDb.get_by_puzzle(puzzle.id)
+        if note:
             message = (
-                f"Added a new note! Use `!erase_note {len(self.get_puzzle(ctx).notes)}` to remove the note if needed. "
+                f"Added a new note! Use `!erase_note {len(notes)}` to remove the note if needed. "
                 f"Check `!notes` for the current list of notes."
             )
 
-        if self.get_puzzle(ctx).notes:
-            # embed = discord.Embed(description=f"{message}")
-            # i = len(self.get_puzzle(ctx).notes)
-            # for x in range(i):
-            #     embed.add_field(
-            #         name=f"Note {x+1}",
-            #         value=self.get_puzzle(ctx).notes[x],
-            #         inline=False
-            #     )
-            puzzle = self.get_puzzle(ctx)
-
+        if notes:
             embeds = build_note_embeds(
                 message=message,
-                notes = puzzle.notes,
+                notes=[str(puzzle_note) for puzzle_note in notes],
                 title="Puzzle Notes",
             )
 
@@ -1776,6 +1837,7 @@ class Puzzles(commands.Cog):
 
     @commands.command(aliases=["delete_note"])
     @with_puzzle_mutex(wait=True)
+    @uses_context("puzzle")
     async def erase_note(self, ctx, note_index: int):
         """*Remove a note by index*"""
 
@@ -1783,19 +1845,17 @@ class Puzzles(commands.Cog):
             await self.send_not_puzzle_channel(ctx)
             return
 
-        if 1 <= note_index <= len(self.get_puzzle(ctx).notes):
-            note = self.get_puzzle(ctx).notes[note_index-1]
-            del self.get_puzzle(ctx).notes[note_index - 1]
+        notes = await NotesDb.get_by_puzzle(self.get_puzzle(ctx).id)
+        if 1 <= note_index <= len(notes):
+            await NotesDb.delete(notes[note_index - 1].id)
+            del notes[note_index - 1]
             description = f"Erased note {note_index}"
         else:
             description = f"Unable to find note {note_index}"
 
-        embed = discord.Embed(description=description)
-        puzzle = self.get_puzzle(ctx)
-
         embeds = build_note_embeds(
             message=description,
-            notes=puzzle.notes,
+            notes=[str(puzzle_note) for puzzle_note in notes],
             title="Puzzle Notes",
         )
 
@@ -1819,10 +1879,10 @@ class Puzzles(commands.Cog):
         else:
             self.get_puzzle(ctx).solution = solution
 
-        PuzzleJsonDb.commit(self.get_puzzle(ctx))
+        await PuzzleJsonDb.commit(self.get_puzzle(ctx))
 
         for tag in self.get_puzzle(ctx).tags:
-            meta_round = RoundJsonDb.get_by_attr(id=tag)
+            meta_round = await RoundJsonDb.get_by_attr(id=tag)
             await self.update_metapuzzle(ctx, meta_round)
 
         # if self.get_hunt_round(ctx):
@@ -1878,20 +1938,16 @@ class Puzzles(commands.Cog):
         puzzle.solved = True
         puzzle.solve_time = datetime.datetime.now(tz=pytz.UTC)
 
-        PuzzleJsonDb.commit(puzzle)
+        await PuzzleJsonDb.commit(puzzle)
 
         if self.get_hunt_round(ctx).meta_id == puzzle.id:
             self.get_hunt_round(ctx).solve_time = datetime.datetime.now(tz=pytz.UTC)
 
-        for tag in puzzle.tags:
-            meta_round = RoundJsonDb.get_by_attr(id=tag)
-            await self.update_metapuzzle(ctx, meta_round)
+        meta_rounds = await RoundJsonDb.get_many(ids=puzzle.tags) if puzzle.tags else []
+        for meta_round in meta_rounds:
             if meta_round.meta_id == puzzle.id:
                 meta_round.solve_time = datetime.datetime.now(tz=pytz.UTC)
-                RoundJsonDb.commit(meta_round)
-        #
-        # if self.get_hunt_round(ctx):
-        #     await self.update_metapuzzle(ctx, self.get_hunt_round(ctx))
+                await RoundJsonDb.commit(meta_round)
 
         emoji = self.get_guild_data(ctx).discord_bot_emoji
         embed = discord.Embed(title="PUZZLE SOLVED!",
@@ -1901,13 +1957,96 @@ class Puzzles(commands.Cog):
             value="If the solution was entered incorrectly, please use `!update_solution` to update it, if the puzzle isn't actually solved at all then use `!unsolve`.  \nGive me a sec to tidy up the sheets."
         )
         await ctx.send(embed=embed)
-        await self.get_gsheet_cog(ctx).archive_puzzle_spreadsheet(puzzle)
-        puzzle.archive_time = datetime.datetime.now(tz=pytz.UTC)
-        await self.move_to_solved(ctx)
-        await self.info(ctx, update=True)
-        for sheet in puzzle.additional_sheets:
-            SheetsJsonDb.commit(sheet)
-        await ctx.send(":white_check_mark: Sheets all tidied away.")
+
+        # The solve is saved, the sheets and channel are tidied up in the background, in this order
+        for meta_round in meta_rounds:
+            # Keyed by round only, so the solves of a round waiting to refresh it share one job
+            await self.jobs.enqueue("refresh_meta", puzzle.hunt_id, round_id=meta_round.id)
+        for kind in ("archive_sheet", "move_to_solved", "update_info"):
+            await self.jobs.enqueue(kind, puzzle.hunt_id, channel_id=ctx.channel.id)
+        await self.jobs.enqueue("announce", puzzle.hunt_id, channel_id=ctx.channel.id,
+                                message=":white_check_mark: Sheets all tidied away.")
+
+    async def run_puzzle_job(self, job: JobData, action):
+        """Run `action(ctx, puzzle)` for a job, as a command in the job's channel would
+
+        The puzzle is held as `with_puzzle_mutex` holds it and changes are
+        committed afterwards.  A job for a channel that no longer exists has
+        nothing left to do.
+        """
+        channel = self.bot.get_channel(job.payload["channel_id"])
+        if channel is None:
+            logger.info(f"Job {job} skipped, its channel is gone")
+            return
+        ctx = JobCommandContext(self.bot, channel, job)
+        context = await self.open_context(ctx, LAZY_FIELDS)
+        try:
+            async with puzzle_locks.hold(("hunt", context.channel.hunt_id), ("round", context.channel.round_id),
+                                         ("puzzle", context.channel.puzzle_id)):
+                await action(ctx, self.get_puzzle(ctx))
+        finally:
+            await self.close_context(ctx)
+
+    async def refresh_meta_job(self, job: JobData):
+        # Runs alongside the round's other refresh_meta jobs and waits for the same write, so the job
+        # is only done, and kept across a restart until then, once the sheet is
+        meta_round = await RoundJsonDb.get_by_attr(id=job.payload["round_id"])
+        if meta_round is None:
+            return
+        key = await self.meta_refresh_key(meta_round)
+        if key is not None:
+            await self.meta_refresher.refresh(key)
+
+    async def archive_sheet_job(self, job: JobData):
+        async def action(ctx, puzzle):
+            # Already done by an earlier attempt or the archive loop, or unsolved since
+            if puzzle is None or not puzzle.solved or puzzle.archive_time:
+                return
+            await self.get_gsheet_cog(ctx).archive_puzzle_spreadsheet(self.get_hunt_sheets(ctx), puzzle)
+            puzzle.archive_time = datetime.datetime.now(tz=pytz.UTC)
+        await self.run_puzzle_job(job, action)
+
+    async def move_to_solved_job(self, job: JobData):
+        async def action(ctx, puzzle):
+            if puzzle is None or not puzzle.solved:
+                return
+            position = self.get_solve_divider_position(ctx, ctx.channel.category)
+            if position is not False:
+                await ctx.channel.edit(position=position + 1)
+        await self.run_puzzle_job(job, action)
+
+    async def update_info_job(self, job: JobData):
+        async def action(ctx, puzzle):
+            await self.info(ctx, update=True)
+        await self.run_puzzle_job(job, action)
+
+    async def announce_job(self, job: JobData):
+        if job.payload.get("message_id"):
+            # Sent by an earlier attempt
+            return
+        channel = self.bot.get_channel(job.payload["channel_id"])
+        if channel is not None:
+            message = await channel.send(job.payload["message"])
+            await self.jobs.record(job, message_id=message.id)
+
+    @commands.command()
+    @commands.has_any_role('Moderator', 'mod', 'admin', 'Organisers')
+    @uses_context()
+    async def jobs(self, ctx):
+        """*(admin) Show the background job backlog: !jobs*"""
+        counts = await JobsDb.counts()
+        embed = discord.Embed(title="Background Jobs")
+        embed.description = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "No jobs"
+        pending = await JobsDb.get_pending(limit=10)
+        if pending:
+            embed.add_field(name="Next up", value="\n".join(str(job) for job in pending), inline=False)
+        failed = await JobsDb.get_recent("failed", limit=5)
+        if failed:
+            embed.add_field(name="Recently failed",
+                            value="\n".join(f"{job} - {job.last_error[:100]}" for job in failed), inline=False)
+        embed.add_field(name="This process",
+                        value=", ".join(f"{key}: {value}" for key, value in self.jobs.metrics().items()), inline=False)
+        await ctx.send(embed=embed)
 
     @commands.command(aliases=["s"])
     @with_puzzle_mutex(wait=False)
@@ -1950,13 +2089,13 @@ class Puzzles(commands.Cog):
         puzzle.solution = solution
         puzzle.solve_time = datetime.datetime.now(tz=pytz.UTC)
 
-        PuzzleJsonDb.commit(puzzle)
+        await PuzzleJsonDb.commit(puzzle)
 
         # if self.get_hunt_round(ctx):
         #     await self.update_metapuzzle(ctx, self.get_hunt_round(ctx))
 
         for tag in puzzle.tags:
-            meta_round = RoundJsonDb.get_by_attr(id=tag)
+            meta_round = await RoundJsonDb.get_by_attr(id=tag)
             await self.update_metapuzzle(ctx, meta_round)
 
         emoji = self.get_guild_data(ctx).discord_bot_emoji
@@ -1967,7 +2106,7 @@ class Puzzles(commands.Cog):
             value="If the solution was entered incorrectly, please use `!update_solution` to update it, if the puzzle isn't actually solved at all then use `!unsolve`. "
         )
         await ctx.send(embed=embed)
-        await self.get_gsheet_cog(ctx).update_solution(puzzle)
+        await self.get_gsheet_cog(ctx).update_solution(self.get_hunt_sheets(ctx), puzzle)
         await self.info(ctx, update=True)
 
     @commands.command(aliases=["add_to_solution"])
@@ -1997,20 +2136,20 @@ class Puzzles(commands.Cog):
         puzzle.solution += "/" + solution
         puzzle.solve_time = datetime.datetime.now(tz=pytz.UTC)
 
-        PuzzleJsonDb.commit(puzzle)
+        await PuzzleJsonDb.commit(puzzle)
 
         # if self.get_hunt_round(ctx):
         #     await self.update_metapuzzle(ctx, self.get_hunt_round(ctx))
 
         for tag in puzzle.tags:
-            meta_round = RoundJsonDb.get_by_attr(id=tag)
+            meta_round = await RoundJsonDb.get_by_attr(id=tag)
             await self.update_metapuzzle(ctx, meta_round)
 
         emoji = self.get_guild_data(ctx).discord_bot_emoji
         embed = discord.Embed(title="EXTRA PUZZLE SOLUTION ADDED!",
                               description=f"{emoji} :partying_face: Great work! I've updated the solution to `{puzzle.solution}`")
         await ctx.send(embed=embed)
-        await self.get_gsheet_cog(ctx).update_solution(puzzle)
+        await self.get_gsheet_cog(ctx).update_solution(self.get_hunt_sheets(ctx), puzzle)
         await self.info(ctx, update=True)
 
     @commands.command(name="mark_as_complete", aliases=["mark_as_solved","complete"])
@@ -2041,7 +2180,7 @@ class Puzzles(commands.Cog):
         # if self.get_puzzle(ctx).archive_time:
         puzzle.archive_time = None
 
-        PuzzleJsonDb.commit(self.get_puzzle(ctx))
+        await PuzzleJsonDb.commit(self.get_puzzle(ctx))
 
         emoji = self.get_guild_data(ctx).discord_bot_emoji
         embed = discord.Embed(
@@ -2050,7 +2189,7 @@ class Puzzles(commands.Cog):
         )
         await ctx.send(embed=embed)
 
-        await self.get_gsheet_cog(ctx).restore_puzzle_spreadsheet(puzzle)
+        await self.get_gsheet_cog(ctx).restore_puzzle_spreadsheet(self.get_hunt_sheets(ctx), puzzle)
         await self.move_to_bottom(ctx)
 
         puzzle.solved = False
@@ -2059,8 +2198,7 @@ class Puzzles(commands.Cog):
             await self.update_metapuzzle(ctx, self.get_hunt_round(ctx))
 
         await self.info(ctx, update=True)
-        for sheet in puzzle.additional_sheets:
-            SheetsJsonDb.commit(sheet)
+        await PuzzleJsonDb.commit(puzzle)
         await ctx.send(":white_check_mark: Sheets all restored.")
 
     @commands.command()
@@ -2113,7 +2251,7 @@ class Puzzles(commands.Cog):
             await ctx.channel.send(":x: Can't find a webhook in that channel, please create one before archiving")
             return False
         thread_message = await archive_to.send(content=f'Archive of channel {channel.name}', silent=True)
-        puzzle = PuzzleJsonDb.get_by_attr(channel_id=channel.id)
+        puzzle = await PuzzleJsonDb.get_by_attr(channel_id=channel.id)
         if puzzle:
             hunt_round = self.get_hunt_round(ctx)
             if hunt_round:
@@ -2170,7 +2308,7 @@ class Puzzles(commands.Cog):
     async def archive_solved_manually(self, ctx):
         """*(admin) Permanently archive solved puzzles*"""
         guild = ctx.guild
-        settings = GuildSettingsDb.get(guild.id)
+        settings = await GuildSettingsDb.get(guild.id)
         hunt_id = ctx.channel.category.id
         hunt_category = discord.utils.get(guild.categories, id=hunt_id)
         hunt_settings = settings.hunt_settings[hunt_id]
@@ -2232,8 +2370,16 @@ class Puzzles(commands.Cog):
     async def delete_puzzle_data(self, ctx, puzzle: PuzzleData, delete_sheet=True):
         if delete_sheet is True:
             if self.get_gsheet_cog(ctx) is not None:
-                await self.get_gsheet_cog(ctx).delete_puzzle_spreadsheet(puzzle)
-        PuzzleJsonDb.delete(puzzle.id)
+                await self.get_gsheet_cog(ctx).delete_puzzle_spreadsheet(self.get_hunt_sheets(ctx), puzzle)
+        await PuzzleJsonDb.delete(puzzle.id)
+        return True
+
+    async def delete_puzzles_data(self, ctx, puzzles: List[PuzzleData], delete_sheet=True):
+        """delete_puzzle_data for several puzzles, removing their records in one go"""
+        if delete_sheet is True and self.get_gsheet_cog(ctx) is not None:
+            for puzzle in puzzles:
+                await self.get_gsheet_cog(ctx).delete_puzzle_spreadsheet(self.get_hunt_sheets(ctx), puzzle)
+        await PuzzleJsonDb.delete_many([puzzle.id for puzzle in puzzles])
         return True
 
     @commands.command(aliases=['delete_metapuzzle','delete_group'])
@@ -2249,12 +2395,14 @@ class Puzzles(commands.Cog):
         hunt_general_channel = self.bot.get_channel(self.get_hunt(ctx).channel_id)
 
         hunt_round = self.get_hunt_round(ctx)
-        round_puzzles = PuzzleJsonDb.get_all_from_round(hunt_round.id)
-        for round_puzzle in round_puzzles:
-            await self.delete_puzzle_data(ctx, round_puzzle)
-            await discord.utils.get(self.get_guild(ctx).channels, id=round_puzzle.channel_id).delete(reason=self.DELETE_REASON)
+        # Waits for commands running in the round's puzzles, and holds off new ones
+        async with puzzle_locks.hold(("hunt", hunt_round.hunt_id), ("round", hunt_round.id)):
+            round_puzzles = await PuzzleJsonDb.get_all_from_round(hunt_round.id)
+            await self.delete_puzzles_data(ctx, round_puzzles)
+            for round_puzzle in round_puzzles:
+                await discord.utils.get(self.get_guild(ctx).channels, id=round_puzzle.channel_id).delete(reason=self.DELETE_REASON)
 
-        await self.delete_round_data(hunt_round)
+            await self.delete_round_data(hunt_round)
 
         category = discord.utils.get(self.get_guild(ctx).categories, id=hunt_round.category_id)
         if self.SOLVE_CATEGORY is False:
@@ -2269,7 +2417,7 @@ class Puzzles(commands.Cog):
         self.set_hunt_round(ctx, None)
 
     async def delete_round_data(self, hunt_round: RoundData):
-        RoundJsonDb.delete(hunt_round.id)
+        await RoundJsonDb.delete(hunt_round.id)
         return True
 
     @commands.command()
@@ -2281,15 +2429,15 @@ class Puzzles(commands.Cog):
         else:
             await ctx.send(f":x: This command must be done from the main hunt channel")
             return
-        hunt_puzzles = PuzzleJsonDb.get_all_from_hunt(self.get_hunt(ctx).id)
+        hunt_puzzles = await PuzzleJsonDb.get_all_from_hunt(self.get_hunt(ctx).id)
+        await self.delete_puzzles_data(ctx, hunt_puzzles)
         for hunt_puzzle in hunt_puzzles:
-            await self.delete_puzzle_data(ctx, hunt_puzzle)
             channel = discord.utils.get(self.get_guild(ctx).channels, id=hunt_puzzle.channel_id)
             await channel.delete(reason=self.DELETE_REASON)
-        hunt_rounds = RoundJsonDb.get_all(self.get_hunt(ctx).id)
+        hunt_rounds = await RoundJsonDb.get_all(self.get_hunt(ctx).id)
+        await RoundJsonDb.delete_many([hunt_round.id for hunt_round in hunt_rounds])
         for hunt_round in hunt_rounds:
             try:
-                await self.delete_round_data(hunt_round)
                 category = discord.utils.get(self.get_guild(ctx).categories, id=hunt_round.category_id)
                 if self.SOLVE_CATEGORY is False:
                     solved_divider = self.get_solved_channel(category)
@@ -2300,7 +2448,7 @@ class Puzzles(commands.Cog):
                 pass
         await hunt_channel.delete(reason=self.DELETE_REASON)
         await hunt_channel.category.delete(reason=self.DELETE_REASON)
-        HuntJsonDb.delete(self.get_hunt(ctx).id)
+        await HuntJsonDb.delete(self.get_hunt(ctx).id)
         self.set_puzzle(ctx, None)
         self.set_hunt_round(ctx, None)
         self.set_hunt(ctx, None)
@@ -2308,6 +2456,7 @@ class Puzzles(commands.Cog):
 
     @commands.command()
     @commands.has_any_role('Moderator', 'mod', 'admin')
+    @uses_context("puzzle")
     async def debug_puzzle_channel(self, ctx):
         """*(admin) See puzzle metadata*"""
 
@@ -2315,89 +2464,73 @@ class Puzzles(commands.Cog):
             await self.send_not_puzzle_channel(ctx)
             return
 
-        await ctx.channel.send(f"```json\n{self.get_puzzle(ctx).to_json()}```")
+        await ctx.channel.send(f"```json\n{codec.encode(self.get_puzzle(ctx))}```")
 
-    # async def archive_solved_puzzles(self, guild: discord.Guild) -> List[PuzzleData]:
-    #     """Archive puzzles for which sufficient time has elapsed since solve time
-    #
-    #     Move them to a solved-puzzles channel category, and rename spreadsheet
-    #     to start with the text [SOLVED]
-    #     """
-    #     guild_data = GuildSettingsDb.get(guild.id)
-    #     puzzles_to_archive = PuzzleJsonDb.get_solved_puzzles_to_archive(guild_data.id)
-    #     gsheet_cog = self.bot.get_cog("GoogleSheets")
-    #
-    #     puzzles_by_hunt = {}
-    #     for puzz in puzzles_to_archive:
-    #         hunt = HuntJsonDb.get_by_attr(id=puzz.hunt_id)
-    #         logger.info(f"{puzz.name} - archiving")
-    #         if not hunt in puzzles_by_hunt:
-    #             puzzles_by_hunt[hunt] = []
-    #         puzzles_by_hunt[hunt].append(puzz)
-    #     # if puzzles_by_hunt:
-    #     #     logger.info(puzzles_by_hunt)
-    #     for hunt, puzzles in puzzles_by_hunt.items():
-    #         if self.SOLVE_CATEGORY:
-    #             solved_category_name = self.get_solved_puzzle_category(hunt.name)
-    #             solved_category = discord.utils.get(guild.categories, name=solved_category_name)
-    #             if not solved_category:
-    #                 avail_categories = [c.name for c in guild.categories]
-    #                 raise ValueError(
-    #                     f"{solved_category_name} category does not exist; available categories: {avail_categories}"
-    #             )
-    #
-    #         for puzzle in puzzles:
-    #             channel = discord.utils.get(guild.channels, id=puzzle.channel_id)
-    #             if channel:
-    #                 if self.SOLVE_CATEGORY:
-    #                     await channel.edit(category=solved_category)
-    #                 else:
-    #                     await channel.move(end=True, category=channel.category)
-    #                     message = f"Puzzle channel {channel.name} moved to the end of category {channel.category.name}."
-    #                     logger.info(message)
-    #             if gsheet_cog:
-    #                 """TODO Less efficient now
-    #                 Make this more resilient if the sheet has been deleted"""
-    #                 # hunt_round = RoundJsonDb.get_by_attr(id=puzzle.round_id)
-    #                 # hunt = HuntJsonDb.get_by_attr(id=hunt_round.hunt_id)
-    #                 gsheet_cog.set_spreadsheet_id(hunt.google_sheet_id)
-    #                 try:
-    #                     await gsheet_cog.archive_puzzle_spreadsheet(puzzle, hunt.archive_google_sheet_id)
-    #                 except:
-    #                     message = f"Unable to update {puzzle.name} from {hunt.name} as solved on Google Sheet."
-    #                     logger.info(message)
-    #
-    #             puzzle.archive_time = datetime.datetime.now(tz=pytz.UTC)
-    #             PuzzleJsonDb.commit(puzzle)
-    #     return puzzles_to_archive
-    #
-    # async def archive_solved(self, ctx):
-    #     """*(admin) Archive solved puzzles. Done automatically*
-    #
-    #     Done automatically on task loop, so this is only useful for debugging
-    #     """
-    #     if not (await self.check_is_bot_channel(ctx)):
-    #         return
-    #     puzzles_to_archive = await self.archive_solved_puzzles(ctx.guild)
-    #     mentions = " ".join([p.channel_mention for p in puzzles_to_archive])
-    #     message = f"Archived {len(puzzles_to_archive)} solved puzzle channels: {mentions}"
-    #     logger.info(message)
-    #     await ctx.send(message)
-    #
-    # @tasks.loop(seconds=300.0)
-    # async def archived_solved_puzzles_loop(self):
-    #     """Ref: https://discordpy.readthedocs.io/en/latest/ext/tasks/"""
-    #     logger.info(f"Archived solved puzzles loop")
-    #     for guild in self.bot.guilds:
-    #         try:
-    #             await self.archive_solved_puzzles(guild)
-    #         except Exception:
-    #             logger.exception("Unable to archive solved puzzles for guild {guild.id} {guild.name}")
-    #
-    # @archived_solved_puzzles_loop.before_loop
-    # async def before_archiving(self):
-    #     await self.bot.wait_until_ready()
-    #     logger.info("Ready to start archiving solved puzzles")
+    async def archive_solved_puzzles(self, guild: discord.Guild) -> List[PuzzleData]:
+        """Archive puzzles for which sufficient time has elapsed since solve time
+
+        `!solve` normally queues jobs to archive the sheet and move the channel
+        below the solved divider, this catches puzzles where those did not finish.
+        Only the candidates are loaded from the database, so it is cheap to
+        run every few minutes.
+        """
+        settings = await GuildSettingsDb.get_cached(guild.id)
+        if settings is None:
+            return []
+        # Hunts are keyed by the guilds row id, not the Discord guild id
+        puzzles_to_archive = await PuzzleJsonDb.get_solved_puzzles_to_archive(settings.id, minutes=self.ARCHIVE_DELAY_MINUTES)
+        if not puzzles_to_archive:
+            return []
+        gsheet_cog = self.bot.get_cog("GoogleSheets")
+
+        puzzles_by_hunt = {}
+        for puzzle in puzzles_to_archive:
+            puzzles_by_hunt.setdefault(puzzle.hunt_id, []).append(puzzle)
+        archived = []
+        for hunt in await HuntJsonDb.get_many(ids=list(puzzles_by_hunt)):
+            for puzzle in puzzles_by_hunt[hunt.id]:
+                channel = guild.get_channel(puzzle.channel_id)
+                # The round a command in the channel would hold, so one holding the whole round keeps this out
+                category_id = channel.category.id if channel and channel.category else None
+                round_id = channel_index.resolve(puzzle.channel_id, category_id).round_id
+                if not round_id and puzzle.tags:
+                    round_id = puzzle.tags[0]
+                async with puzzle_locks.hold(("hunt", hunt.id), ("round", round_id), ("puzzle", puzzle.id),
+                                             blocking=False) as acquired:
+                    if not acquired:
+                        # A command is running on it, e.g. !solve itself, try again next time
+                        continue
+                    logger.info(f"{puzzle.name} - archiving")
+                    if channel and channel.category:
+                        position = self.get_solve_divider_position(None, channel.category)
+                        if position is not False:
+                            await channel.edit(position=position + 1)
+                    if gsheet_cog:
+                        try:
+                            await gsheet_cog.archive_puzzle_spreadsheet(HuntSheets.for_hunt(hunt), puzzle)
+                        except Exception:
+                            logger.exception(f"Unable to update {puzzle.name} from {hunt.name} as solved on Google Sheet.")
+                            continue
+                    puzzle.archive_time = datetime.datetime.now(tz=pytz.UTC)
+                    archived.append(puzzle)
+        await PuzzleJsonDb.commit_many(archived)
+        return archived
+
+    @tasks.loop(minutes=ARCHIVE_LOOP_MINUTES)
+    async def archive_solved_puzzles_loop(self):
+        """Ref: https://discordpy.readthedocs.io/en/latest/ext/tasks/"""
+        for guild in self.bot.guilds:
+            try:
+                archived = await self.archive_solved_puzzles(guild)
+                if archived:
+                    logger.info(f"Archived {len(archived)} solved puzzles for guild {guild.id} {guild.name}")
+            except Exception:
+                logger.exception(f"Unable to archive solved puzzles for guild {guild.id} {guild.name}")
+
+    @archive_solved_puzzles_loop.before_loop
+    async def before_archiving(self):
+        await self.bot.wait_until_ready()
+        logger.info("Ready to start archiving solved puzzles")
 
     @tasks.loop(hours=2)
     async def reminder_loop(self, channel):
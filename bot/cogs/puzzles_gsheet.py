@@ -18,7 +18,10 @@ import pytz
 
 from bot.utils import urls, config
 from bot.store import MissingPuzzleError, PuzzleData, PuzzleJsonDb, GuildSettings, GuildSettingsDb, HuntSettings, RoundData, RoundJsonDb, HuntJsonDb, HuntData
-from bot.utils.gsheets import get_sheet, get_drive
+from bot.store import channel_index
+from bot.utils.gsheets import HuntSheets, transport
+from bot.utils.sheet_properties import SheetPropertiesCache
+from bot.utils.write_batcher import SheetsWriteBatcher
 from bot.utils.appscript import create_project, add_javascript
 from bot.utils.gsheet_nexus import update_nexus
 from googleapiclient.discovery import build
@@ -36,15 +39,23 @@ class GoogleSheets(commands.Cog):
     METAPUZZLE_SHEET = "Meta Tab template"
     ROUND_SHEET = "OVERVIEW Template"
     INITIAL_OFFSET = 7
-    sheets_service = None
-    spreadsheet_id = None
-    archive_spreadsheet_id = None
 
     def __init__(self, bot):
         self.bot = bot
         self._puzzle_data = None
         self.overview_page_id = None
-        self.sheets_service = get_sheet()
+        self.sheet_properties = SheetPropertiesCache()
+        self.writes = SheetsWriteBatcher(self._send_batch_update, interval=config.sheet_write_batch_seconds)
+
+    async def cog_load(self):
+        """Build the Google clients on the transport's worker threads, where the calls run"""
+        try:
+            await transport.prewarm()
+        except Exception:
+            logger.exception("Unable to build the Google API clients, they will be built on first use")
+
+    async def cog_unload(self):
+        await self.writes.close()
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -52,48 +63,51 @@ class GoogleSheets(commands.Cog):
 
     @commands.command()
     async def read(self, ctx):
-        print(get_sheet().get(spreadsheetId=self.get_spreadsheet_id()).execute())
-
-    def set_spreadsheet_id(self, spreadsheet_id):
-        self.spreadsheet_id = spreadsheet_id
-
-    def set_archive_spreadsheet_id(self, archive_spreadsheet_id):
-        self.archive_spreadsheet_id = archive_spreadsheet_id
-
-    def get_spreadsheet_id(self):
-        return self.spreadsheet_id
-
-    def get_archive_spreadsheet_id(self):
-        return self.archive_spreadsheet_id
-
-    async def batch_update(self, body, archive = False):
-        spreadsheet_id = self.get_archive_spreadsheet_id() if archive else self.get_spreadsheet_id()
-        req = get_sheet().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body=body
-        )
-
-        return await asyncio.to_thread(req.execute)
-
-
-    def sheet_list(self, spreadsheet_id = None):
-        spreadsheet_id = spreadsheet_id or self.get_spreadsheet_id()
-        return get_sheet().get(spreadsheetId=spreadsheet_id).execute()
-
-    def get_unique_tab_name(self, desired_name: str, spreadsheet_id = None) -> str:
-        if spreadsheet_id is None:
-            existing = {
-                s["properties"]["title"].casefold()
-                for s in self.sheet_list()["sheets"]
-            }
-        else:
-            meta = get_sheet().get(
-                spreadsheetId=spreadsheet_id
-            ).execute()
-            existing = {
-                s["properties"]["title"].casefold()
-                for s in meta["sheets"]
-            }
+        category_id = ctx.channel.category.id if ctx.channel.category else None
+        hunt = await HuntJsonDb.get_by_attr(id=channel_index.resolve(ctx.channel.id, category_id).hunt_id)
+        print(await self.sheet_list(hunt.google_sheet_id))
+
+    async def batch_update(self, hunt_sheets: HuntSheets, body, archive = False):
+        return await self.batch_update_spreadsheet(hunt_sheets.target(archive), body)
+
+    async def batch_update_spreadsheet(self, spreadsheet_id, body):
+        """batchUpdate, merged with other commands' writes to the spreadsheet, see SheetsWriteBatcher
+
+        Returns `{'replies': [...]}` for this body's requests only.
+        """
+        return {'replies': await self.writes.submit(spreadsheet_id, body.get('requests', []))}
+
+    async def _send_batch_update(self, spreadsheet_id, body):
+        """batchUpdate, keeping the cached tab properties in step with it"""
+        try:
+            response = await transport.sheets(spreadsheet_id, lambda sheets: sheets.batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body=body
+            ))
+        except Exception:
+            # Perhaps the tabs were changed by hand, read them again next time
+            self.sheet_properties.invalidate(spreadsheet_id)
+            raise
+        self.sheet_properties.apply(spreadsheet_id, body.get('requests', []), response.get('replies', []))
+        return response
+
+    async def sheet_list(self, spreadsheet_id):
+        """The spreadsheet's tab properties, from the cache unless it has none for this spreadsheet"""
+        sheets = self.sheet_properties.sheets(spreadsheet_id)
+        if sheets is None:
+            response = await transport.sheets(spreadsheet_id, lambda sheets: sheets.get(
+                spreadsheetId=spreadsheet_id,
+                fields="sheets.properties"
+            ))
+            sheets = response.get('sheets', [])
+            self.sheet_properties.store(spreadsheet_id, sheets)
+        return {'sheets': sheets}
+
+    async def get_unique_tab_name(self, desired_name: str, spreadsheet_id) -> str:
+        existing = {
+            s["properties"]["title"].casefold()
+            for s in (await self.sheet_list(spreadsheet_id))["sheets"]
+        }
 
         if desired_name.casefold() not in existing:
             return desired_name
@@ -105,33 +119,37 @@ class GoogleSheets(commands.Cog):
                 return candidate
             i += 1
 
-    def get_page_id_by_name(self, name):
-        for sheet in self.sheet_list()["sheets"]:
+    async def get_page_id_by_name(self, hunt_sheets: HuntSheets, name):
+        for sheet in (await self.sheet_list(hunt_sheets.spreadsheet_id))["sheets"]:
             if (sheet['properties']['title']) == name:
                 return sheet['properties']['sheetId']
 
-    def get_page_name_by_id(self, id, spreadsheet_id = None):
-        for sheet in self.sheet_list(spreadsheet_id)["sheets"]:
+    async def get_page_name_by_id(self, id, spreadsheet_id):
+        for sheet in (await self.sheet_list(spreadsheet_id))["sheets"]:
             if (sheet['properties']['sheetId']) == int(id):
                 return sheet['properties']['title']
 
-    def get_puzzle_sheet_index(self, puzzle:PuzzleData):
+    async def get_puzzle_sheet_index(self, hunt_sheets: HuntSheets, puzzle:PuzzleData):
         name = puzzle.name
-        for sheet in self.sheet_list()["sheets"]:
+        for sheet in (await self.sheet_list(hunt_sheets.spreadsheet_id))["sheets"]:
             if (sheet['properties']['title']) == name:
                 return sheet['properties']['index']
         return self.INITIAL_OFFSET
 
-    def get_overview(self):
-        return get_sheet().values().get(spreadsheetId=self.get_spreadsheet_id(),
-                                        range="OVERVIEW!B9:B"
-                                        ).execute()
+    async def get_overview(self, hunt_sheets: HuntSheets):
+        spreadsheet_id = hunt_sheets.spreadsheet_id
+        return await transport.sheets(spreadsheet_id, lambda sheets: sheets.values().get(
+            spreadsheetId=spreadsheet_id,
+            range="OVERVIEW!B9:B"
+        ))
 
-    def get_overview_urls(self):
-        return get_sheet().values().get(spreadsheetId=self.get_spreadsheet_id(),
-                                        range="OVERVIEW!C9:C",
-                                        valueRenderOption='FORMULA'
-                                        ).execute()
+    async def get_overview_urls(self, hunt_sheets: HuntSheets):
+        spreadsheet_id = hunt_sheets.spreadsheet_id
+        return await transport.sheets(spreadsheet_id, lambda sheets: sheets.values().get(
+            spreadsheetId=spreadsheet_id,
+            range="OVERVIEW!C9:C",
+            valueRenderOption='FORMULA'
+        ))
 
     def get_row(self, ref):
         return int(ref[1]) - 1
@@ -139,7 +157,7 @@ class GoogleSheets(commands.Cog):
     def get_column(self, ref):
         return ord(ref[0].lower()) - 97
 
-    def get_puzzle_overview_row(self):
+    async def get_puzzle_overview_row(self, hunt_sheets: HuntSheets):
         body = {
             'dataFilters': [
                 {
@@ -156,10 +174,11 @@ class GoogleSheets(commands.Cog):
             ],
             "includeGridData": True
         }
-        response = get_sheet().getByDataFilter(
-            spreadsheetId=self.get_spreadsheet_id(),
+        spreadsheet_id = hunt_sheets.spreadsheet_id
+        response = await transport.sheets(spreadsheet_id, lambda sheets: sheets.getByDataFilter(
+            spreadsheetId=spreadsheet_id,
             body=body
-        ).execute()
+        ))
         row_number = 4
         for row in response['sheets'][0]['data'][0]['rowData']:
             try:
@@ -171,7 +190,8 @@ class GoogleSheets(commands.Cog):
             except KeyError:
                 pass
 
-    async def update_puzzle_info(self, puzzle: PuzzleData, update_tab_name = False, name = None, page_id = None):
+    async def update_puzzle_info(self, hunt_sheets: HuntSheets, puzzle: PuzzleData, update_tab_name = False, name = None,
+                                 page_id = None):
 
         puzzle_name = name or puzzle.name
 
@@ -187,14 +207,14 @@ class GoogleSheets(commands.Cog):
                              self.get_column(config.puzzle_cell_name), self.FORMULA_INPUT, new_sheet_id),
         ]
         if update_tab_name:
-            unique_name = self.get_unique_tab_name(puzzle_name)
+            unique_name = await self.get_unique_tab_name(puzzle_name, hunt_sheets.target(puzzle.archived))
             requests.append(self.set_sheet_name(unique_name, puzzle.google_page_id))
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates, puzzle.archived)
+        await self.batch_update(hunt_sheets, updates, puzzle.archived)
 
-    async def enter_solution(self):
+    async def enter_solution(self, hunt_sheets: HuntSheets):
         body={
             'requests': [
                 {
@@ -221,7 +241,7 @@ class GoogleSheets(commands.Cog):
                 }
             ]
         }
-        await self.batch_update(body)
+        await self.batch_update(hunt_sheets, body)
 
     def update_cell(self, value, start_row, start_column, type=STRING_INPUT, sheet_id=None):
         if sheet_id is None:
@@ -264,8 +284,8 @@ class GoogleSheets(commands.Cog):
                 }
         return body
 
-    def move_sheet_to_end(self, sheet_id = None):
-        sheets = self.sheet_list().get('sheets',[])
+    async def move_sheet_to_end(self, spreadsheet_id, sheet_id = None):
+        sheets = (await self.sheet_list(spreadsheet_id)).get('sheets',[])
         new_index = len(sheets) - 1
         body = {
                     'updateSheetProperties': {
@@ -305,9 +325,9 @@ class GoogleSheets(commands.Cog):
                 }
         return body
 
-    async def add_new_sheet(self, name, index=INITIAL_OFFSET, sheet_type=PUZZLE_SHEET):
-        sheet_id = self.get_page_id_by_name(sheet_type)
-        name = self.get_unique_tab_name(name)
+    async def add_new_sheet(self, hunt_sheets: HuntSheets, name, index=INITIAL_OFFSET, sheet_type=PUZZLE_SHEET):
+        sheet_id = await self.get_page_id_by_name(hunt_sheets, sheet_type)
+        name = await self.get_unique_tab_name(name, hunt_sheets.spreadsheet_id)
         body = {
             'requests': [
                 {
@@ -340,17 +360,18 @@ class GoogleSheets(commands.Cog):
 
             ]
         }
-        new_sheet = await self.batch_update(body)
+        new_sheet = await self.batch_update(hunt_sheets, body)
         new_sheet_id = new_sheet['replies'][1]['duplicateSheet']['properties']['sheetId']
         # self.get_puzzle_data().google_page_id = new_sheet_id
         # self.set_sheet_hidden(False)
         return new_sheet_id
 
-    async def add_new_puzzle_sheet(self, puzzle: PuzzleData, index = INITIAL_OFFSET):
+    async def add_new_puzzle_sheet(self, hunt_sheets: HuntSheets, puzzle: PuzzleData, index = INITIAL_OFFSET):
+        name = await self.get_unique_tab_name(puzzle.name, hunt_sheets.spreadsheet_id)
         if puzzle.metapuzzle == 1:
-            puzzle.google_page_id = await self.add_new_sheet(self.get_unique_tab_name(puzzle.name), index, self.METAPUZZLE_SHEET)
+            puzzle.google_page_id = await self.add_new_sheet(hunt_sheets, name, index, self.METAPUZZLE_SHEET)
         else:
-            puzzle.google_page_id = await self.add_new_sheet(self.get_unique_tab_name(puzzle.name), index)
+            puzzle.google_page_id = await self.add_new_sheet(hunt_sheets, name, index)
 
     # async def add_new_overview_sheet(self, index):
     #     overview_name = "OVERVIEW - " + self.get_puzzle_data().name
@@ -437,7 +458,7 @@ class GoogleSheets(commands.Cog):
     #         else:
     #             return False
 
-    async def delete_sheet(self, page_id = None, archive = False):
+    async def delete_sheet(self, hunt_sheets: HuntSheets, page_id = None, archive = False):
         body = {
             'requests': [
                 {
@@ -447,13 +468,13 @@ class GoogleSheets(commands.Cog):
                 }
             ]
         }
-        await self.batch_update(body, archive)
+        await self.batch_update(hunt_sheets, body, archive)
 
-    async def update_puzzle(self, puzzle_data,update_name = False):
-        await self.update_puzzle_info(puzzle_data, update_name)
+    async def update_puzzle(self, hunt_sheets: HuntSheets, puzzle_data,update_name = False):
+        await self.update_puzzle_info(hunt_sheets, puzzle_data, update_name)
 
-    async def delete_round_spreadsheet(self, round_data: RoundData ):
-        await self.delete_sheet(round_data.google_page_id)
+    async def delete_round_spreadsheet(self, hunt_sheets: HuntSheets, round_data: RoundData ):
+        await self.delete_sheet(hunt_sheets, round_data.google_page_id)
 
     # async def mark_deleted_puzzle_spreadsheet(self, puzzle_data: PuzzleData, hunt_round: RoundData):
     #     self.set_puzzle_data(puzzle_data)
@@ -468,7 +489,7 @@ class GoogleSheets(commands.Cog):
     #     }
     #     await self.batch_update(updates, puzzle_data.archived)
 
-    async def delete_puzzle_spreadsheet(self, puzzle_data: PuzzleData):
+    async def delete_puzzle_spreadsheet(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData):
         # self.set_overview_page_id(hunt_round.google_page_id)
         # requests = [self.remove_puzzle_from_overview()]
         # if requests[0]:
@@ -476,42 +497,39 @@ class GoogleSheets(commands.Cog):
         #         'requests': requests
         #     }
         #     self.batch_update(updates)
-        await self.delete_sheet(puzzle_data.google_page_id, puzzle_data.archived)
+        await self.delete_sheet(hunt_sheets, puzzle_data.google_page_id, puzzle_data.archived)
 
-    async def move_puzzle_spreadsheet(self, to_archive, page, tab_name):
-        spreadsheet_to = self.get_archive_spreadsheet_id() if to_archive else self.get_spreadsheet_id()
-        spreadsheet_from = self.get_spreadsheet_id() if to_archive else self.get_archive_spreadsheet_id()
-        copy_req = get_sheet().sheets().copyTo(
+    async def move_puzzle_spreadsheet(self, hunt_sheets: HuntSheets, to_archive, page, tab_name):
+        spreadsheet_to = hunt_sheets.target(to_archive)
+        spreadsheet_from = hunt_sheets.target(not to_archive)
+        copied = await transport.sheets(spreadsheet_from, lambda sheets: sheets.sheets().copyTo(
             spreadsheetId=spreadsheet_from,
             sheetId=page,
             body={"destinationSpreadsheetId": spreadsheet_to}
-        )
-        copied = await asyncio.to_thread(copy_req.execute)
+        ))
         new_sheet_id = copied['sheetId']
-        await self.delete_sheet(page, not to_archive)
-        unique_title = self.get_unique_tab_name(tab_name, spreadsheet_to)
-        bu_req = get_sheet().batchUpdate(
-            spreadsheetId=spreadsheet_to,
-            body={
-                "requests": [
-                    self.set_sheet_name(unique_title, new_sheet_id),
-                ]
-            },
-        )
-        await asyncio.to_thread(bu_req.execute)
+        self.sheet_properties.add(spreadsheet_to, copied)
+        await self.delete_sheet(hunt_sheets, page, not to_archive)
+        unique_title = await self.get_unique_tab_name(tab_name, spreadsheet_to)
+        await self.batch_update_spreadsheet(spreadsheet_to, {
+            "requests": [
+                self.set_sheet_name(unique_title, new_sheet_id),
+            ]
+        })
         return new_sheet_id
 
-    async def restore_puzzle_spreadsheet(self, puzzle_data: PuzzleData, archive_spreadsheet = None):
+    async def restore_puzzle_spreadsheet(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData):
         if puzzle_data.archived:
             puzzle_data.archived = False
-            puzzle_data.google_page_id = await self.move_puzzle_spreadsheet(False, puzzle_data.google_page_id,
+            puzzle_data.google_page_id = await self.move_puzzle_spreadsheet(hunt_sheets, False, puzzle_data.google_page_id,
                                                                             puzzle_data.name)
         requests = []
         for sheet in puzzle_data.additional_sheets:
             if len(sheet.google_page_id) > 0:
-                if self.get_archive_spreadsheet_id() and puzzle_data.solved:
-                    current_name = self.get_page_name_by_id(sheet.google_page_id, self.get_archive_spreadsheet_id())
-                    sheet.google_page_id = await self.move_puzzle_spreadsheet(False, sheet.google_page_id, current_name)
+                if hunt_sheets.archive_spreadsheet_id and puzzle_data.solved:
+                    current_name = await self.get_page_name_by_id(sheet.google_page_id, hunt_sheets.archive_spreadsheet_id)
+                    sheet.google_page_id = await self.move_puzzle_spreadsheet(hunt_sheets, False, sheet.google_page_id,
+                                                                              current_name)
                 requests.extend([self.update_cell("", self.get_row(config.puzzle_cell_solution),
                                              self.get_column(config.puzzle_cell_solution), self.STRING_INPUT,
                                              sheet.google_page_id),
@@ -534,17 +552,17 @@ class GoogleSheets(commands.Cog):
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates)
+        await self.batch_update(hunt_sheets, updates)
 
 
-    async def update_solution(self, puzzle_data: PuzzleData):
+    async def update_solution(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData):
         requests = [self.update_cell(puzzle_data.solution, self.get_row(config.puzzle_cell_solution),
                                      self.get_column(config.puzzle_cell_solution), self.STRING_INPUT, puzzle_data.google_page_id)
                     ]
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates, puzzle_data.archived)
+        await self.batch_update(hunt_sheets, updates, puzzle_data.archived)
         # sheet_requests = []
         # for sheet in puzzle_data.additional_sheets:
         #     if len(sheet.google_page_id) > 0:
@@ -556,11 +574,11 @@ class GoogleSheets(commands.Cog):
         # }
         # await self.batch_update(updates, puzzle_data.solved)
 
-    async def archive_puzzle_spreadsheet(self, puzzle_data: PuzzleData):
+    async def archive_puzzle_spreadsheet(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData):
         requests = []
         requests.extend([self.update_cell(puzzle_data.solution, self.get_row(config.puzzle_cell_solution), self.get_column(config.puzzle_cell_solution), self.STRING_INPUT, puzzle_data.google_page_id),
             self.update_cell("Solved", self.get_row(config.puzzle_cell_progress), self.get_column(config.puzzle_cell_progress), self.STRING_INPUT, puzzle_data.google_page_id),
-            self.move_sheet_to_end(puzzle_data.google_page_id),
+            await self.move_sheet_to_end(hunt_sheets.spreadsheet_id, puzzle_data.google_page_id),
             self.change_tab_colour('green', puzzle_data.google_page_id)])
         # updates = {
         #     'requests': requests
@@ -574,18 +592,20 @@ class GoogleSheets(commands.Cog):
                             self.update_cell("Solved", self.get_row(config.puzzle_cell_progress),
                                              self.get_column(config.puzzle_cell_progress), self.STRING_INPUT,
                                              sheet.google_page_id),
-                            self.move_sheet_to_end(sheet.google_page_id),
+                            await self.move_sheet_to_end(hunt_sheets.spreadsheet_id, sheet.google_page_id),
                             self.change_tab_colour('green', sheet.google_page_id)])
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates)
+        await self.batch_update(hunt_sheets, updates)
         for sheet in puzzle_data.additional_sheets:
-            if self.get_archive_spreadsheet_id():
-                current_name = self.get_page_name_by_id(sheet.google_page_id)
-                sheet.google_page_id = await self.move_puzzle_spreadsheet(True, sheet.google_page_id, current_name)
-        if puzzle_data.is_metapuzzle() is False and self.get_archive_spreadsheet_id():
-            puzzle_data.google_page_id = await self.move_puzzle_spreadsheet(True, puzzle_data.google_page_id, puzzle_data.name)
+            if hunt_sheets.archive_spreadsheet_id:
+                current_name = await self.get_page_name_by_id(sheet.google_page_id, hunt_sheets.spreadsheet_id)
+                sheet.google_page_id = await self.move_puzzle_spreadsheet(hunt_sheets, True, sheet.google_page_id,
+                                                                          current_name)
+        if puzzle_data.is_metapuzzle() is False and hunt_sheets.archive_spreadsheet_id:
+            puzzle_data.google_page_id = await self.move_puzzle_spreadsheet(hunt_sheets, True, puzzle_data.google_page_id,
+                                                                            puzzle_data.name)
             puzzle_data.archived = True
             return
         else:
@@ -599,10 +619,10 @@ class GoogleSheets(commands.Cog):
         body = {
             'name': hunt_name
         }
-        new_file = get_drive().files().copy(fileId=config.master_spreadsheet, body=body).execute()
+        new_file = await transport.drive(lambda drive: drive.files().copy(fileId=config.master_spreadsheet, body=body))
         new_file_id = new_file['id']
         # get_drive().files().update(fileId=new_file_id, body=body).execute()
-        get_drive().permissions().create(fileId=new_file_id, body=permission).execute()
+        await transport.drive(lambda drive: drive.permissions().create(fileId=new_file_id, body=permission))
         return new_file_id
 
     async def create_hunt_archive_spreadsheet(self, hunt_name):
@@ -610,13 +630,12 @@ class GoogleSheets(commands.Cog):
             'type': 'anyone',
             'role': 'writer'
         }
-        new_file = get_drive().files().create(body={
+        new_file = await transport.drive(lambda drive: drive.files().create(body={
             "name": hunt_name + " Archive",
             "mimeType": "application/vnd.google-apps.spreadsheet",
-        }).execute()
+        }))
         new_file_id = new_file['id']
-        get_drive().permissions().create(fileId=new_file_id, body=permission).execute()
-        self.set_archive_spreadsheet_id(new_file_id)
+        await transport.drive(lambda drive: drive.permissions().create(fileId=new_file_id, body=permission))
         return new_file_id
 
     # async def create_round_overview_spreadsheet(self, round_data: RoundData, hunt: HuntData):
@@ -631,28 +650,29 @@ class GoogleSheets(commands.Cog):
     #     }
     #     await self.batch_update(updates)
 
-    async def create_puzzle_spreadsheet(self, puzzle_data: PuzzleData):
+    async def create_puzzle_spreadsheet(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData):
         """Creates new puzzle spreadsheet and adds puzzle data to the overview spreadsheet."""
         # self.set_puzzle_data(puzzle_data)
         # self.overview_page_id = hunt_round.google_page_id
         # puzzle_index = hunt.num_rounds + self.INITIAL_OFFSET
         puzzle_index = self.INITIAL_OFFSET
-        await self.add_new_puzzle_sheet(puzzle_data, puzzle_index)
+        await self.add_new_puzzle_sheet(hunt_sheets, puzzle_data, puzzle_index)
         # self.copy_puzzle_info(hunt_round.num_puzzles + 3)
-        await self.update_puzzle_info(puzzle_data)
+        await self.update_puzzle_info(hunt_sheets, puzzle_data)
         # self.update_puzzle_info(hunt_round.num_puzzles + 3)
 
-    async def create_additional_spreadsheet(self, puzzle_data: PuzzleData, name = None, puzzle = False):
-        index = self.get_puzzle_sheet_index(puzzle_data)
+    async def create_additional_spreadsheet(self, hunt_sheets: HuntSheets, puzzle_data: PuzzleData, name = None,
+                                            puzzle = False):
+        index = await self.get_puzzle_sheet_index(hunt_sheets, puzzle_data)
         if name:
             sheet_name = f"{name} ({puzzle_data.name})"
         else:
             sheet_name = f"Extra Sheet for {puzzle_data.name}"
-        sheet_id = await self.add_new_sheet(sheet_name, index+1)
-        await self.update_puzzle_info( puzzle_data, False,name,sheet_id)
+        sheet_id = await self.add_new_sheet(hunt_sheets, sheet_name, index+1)
+        await self.update_puzzle_info(hunt_sheets, puzzle_data, False,name,sheet_id)
         return sheet_id
 
-    async def add_metapuzzle_data(self, puzzle: PuzzleData, round_puzzles: List[PuzzleData]):
+    async def add_metapuzzle_data(self, hunt_sheets: HuntSheets, puzzle: PuzzleData, round_puzzles: List[PuzzleData]):
         # self.overview_page_id = hunt_round.google_page_id
         # overview_name = self.get_page_name_by_id(self.overview_page_id)
         requests = [self.update_cell("Puzzle titles",4,0,self.STRING_INPUT,puzzle.google_page_id),
@@ -678,9 +698,9 @@ class GoogleSheets(commands.Cog):
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates, puzzle.archived)
+        await self.batch_update(hunt_sheets, updates, puzzle.archived)
 
-    async def add_metametapuzzle_data(self, puzzle: PuzzleData, round_puzzles: List[PuzzleData]):
+    async def add_metametapuzzle_data(self, hunt_sheets: HuntSheets, puzzle: PuzzleData, round_puzzles: List[PuzzleData]):
         # self.overview_page_id = hunt_round.google_page_id
         # overview_name = self.get_page_name_by_id(self.overview_page_id)
         requests = [self.update_cell("Puzzle Round",4,0,self.STRING_INPUT,puzzle.google_page_id),
@@ -696,7 +716,7 @@ class GoogleSheets(commands.Cog):
                 continue
 
             if round_puzzle.tags[0] if round_puzzle.tags else None is not None:
-                round = RoundJsonDb.get_by_attr(id=round_puzzle.tags[0])
+                round = await RoundJsonDb.get_by_attr(id=round_puzzle.tags[0])
                 if round.meta_code == "RETAWR" or round.meta_code == "LAOFNO":
                     continue
                 round_name = round.name
@@ -721,7 +741,7 @@ class GoogleSheets(commands.Cog):
         updates = {
             'requests': requests
         }
-        await self.batch_update(updates, puzzle.archived)
+        await self.batch_update(hunt_sheets, updates, puzzle.archived)
 
 async def setup(bot):
     # Comment this out if google-drive-related package are not installed!
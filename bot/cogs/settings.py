@@ -27,7 +27,7 @@ class Settings(commands.Cog):
         g = GuildSettings()
         g.guild_id = guild.id
         g.guild_name = guild.name
-        _ = GuildSettingsDb.commit(g)
+        _ = await GuildSettingsDb.commit(g)
 
 
     @commands.has_permissions(manage_guild=True)
@@ -5,7 +5,9 @@ from datetime import datetime
 import discord
 from discord.ext import commands
 
-from bot import utils
+from bot import utils, store
+from bot.utils import gsheets
+from bot.utils.locks import puzzle_locks
 
 PY_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
 
@@ -88,6 +90,62 @@ class Utility(commands.Cog):
         embed.set_footer(text=":ladder: :dog:", icon_url=self.bot.user.avatar)
         await ctx.send(embed=embed)
 
+    @commands.command()
+    @commands.has_any_role('Moderator', 'mod', 'admin')
+    async def db_stats(self, ctx):
+        """*(admin) Shows database connection pool, cache, command context, lock, meta refresh and Google API statistics*
+        **Example**: `{prefix}db_stats`"""
+        embed = discord.Embed(title="Database")
+        if store.pool is not None:
+            metrics = store.pool.metrics()
+            embed.add_field(
+                name="Connection Pool",
+                value="```py\n" + "\n".join(f"{key}: {value}" for key, value in metrics.items()) + "```",
+                inline=False,
+            )
+        else:
+            embed.description = f"No connection pool in use for `{utils.config.storage}` storage."
+        embed.add_field(
+            name="Identity Map",
+            value="```py\n" + "\n".join(f"{key}: {value}" for key, value in store.identity_map.metrics().items()) + "```",
+            inline=False,
+        )
+        embed.add_field(
+            name="Command Contexts",
+            value="```py\n" + "\n".join(f"{key}: {value}" for key, value in store.command_contexts.metrics().items()) + "```",
+            inline=False,
+        )
+        embed.add_field(
+            name="Puzzle Locks",
+            value="```py\n" + "\n".join(f"{key}: {value}" for key, value in puzzle_locks.metrics().items()) + "```",
+            inline=False,
+        )
+        gsheet_cog = self.bot.get_cog("GoogleSheets")
+        if gsheet_cog is not None:
+            embed.add_field(
+                name="Google API",
+                value="```py\n" + "\n".join(f"{key}: {value}" for key, value in gsheets.clients.metrics().items()) + "```",
+                inline=False,
+            )
+            embed.add_field(
+                name="Sheet Tab Cache",
+                value="```py\n" + "\n".join(f"{key}: {value}" for key, value in gsheet_cog.sheet_properties.metrics().items()) + "```",
+                inline=False,
+            )
+            embed.add_field(
+                name="Sheet Writes",
+                value="```py\n" + "\n".join(f"{key}: {value}" for key, value in gsheet_cog.writes.metrics().items()) + "```",
+                inline=False,
+            )
+        puzzles = self.bot.get_cog("Puzzles")
+        if puzzles is not None:
+            embed.add_field(
+                name="Meta Sheet Refresher",
+                value="```py\n" + "\n".join(f"{key}: {value}" for key, value in puzzles.meta_refresher.metrics().items()) + "```",
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
     @commands.command(aliases=["socials", "links", "support"])
     async def invite(self, ctx):
         """*Shows invite link and other socials for the bot*
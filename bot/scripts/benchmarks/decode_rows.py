@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare decoding database rows into PuzzleData the old way and the new way
+
+python -m bot.scripts.benchmarks.decode_rows --rows 10000
+
+"before" is the reflective import_dict the data classes used to have, on a
+plain dataclass with a per-instance __dict__; "after" is the generated
+decoder on the slotted PuzzleData.  Memory is what tracemalloc sees still
+allocated once all the rows have been decoded and kept.
+"""
+import argparse
+import dataclasses
+import datetime
+import time
+import tracemalloc
+
+from bot.store import PuzzleData
+
+# The same fields as PuzzleData, without __slots__
+LegacyPuzzleData = dataclasses.make_dataclass(
+    "LegacyPuzzleData",
+    [(f.name, f.type, dataclasses.field(default=f.default, default_factory=f.default_factory))
+     for f in dataclasses.fields(PuzzleData)],
+)
+
+
+def legacy_import_dict(puzzle_data: dict):
+    puz = LegacyPuzzleData()
+    for attr, value in puz.__dict__.items():
+        if attr.endswith("_time"):
+            db_date = puzzle_data.get(attr, None)
+            if db_date is not None:
+                utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
+                setattr(puz, attr, utc_date)
+        elif attr in puzzle_data:
+            setattr(puz, attr, puzzle_data.get(attr))
+    # _BaseData.mark_clean as it was, a dict per object
+    puz._clean = {f.name: list(getattr(puz, f.name)) if isinstance(getattr(puz, f.name), list) else getattr(puz, f.name)
+                  for f in dataclasses.fields(puz)}
+    return puz
+
+
+def make_rows(count):
+    start = datetime.datetime(2026, 1, 16, 18, 0)
+    return [{"id": i, "name": f"Puzzle {i}", "hunt_id": 1, "channel_id": 10 ** 17 + i,
+             "channel_mention": f"<#{10 ** 17 + i}>", "channel_name": f"puzzle-{i}", "voice_channel_id": 0,
+             "url": f"https://example.com/puzzle/{i}", "google_page_id": str(i), "metapuzzle": 0, "metameta": 0,
+             "status": "in progress", "solved": 0, "archived": 0, "solution": None, "priority": "medium",
+             "puzzle_type": "", "start_time": start,
+             "solve_time": None, "archive_time": None}
+            for i in range(count)]
+
+
+def measure(decode, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row in rows:
+            decode(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    kept = [decode(row) for row in rows]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return best, allocated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    results = {
+        "before": measure(legacy_import_dict, rows, args.repeat),
+        "after": measure(PuzzleData.import_dict, rows, args.repeat),
+    }
+    print(f"{'':8}{'time':>12}{'per row':>12}{'memory':>12}")
+    for label, (elapsed, allocated) in results.items():
+        print(f"{label:8}{elapsed * 1000:>10.1f}ms{elapsed / args.rows * 1e6:>10.2f}us{allocated / 2 ** 20:>10.1f}MB")
+    (before_time, before_memory), (after_time, after_memory) = results["before"], results["after"]
+    print(f"{before_time / after_time:.1f}x faster, {1 - after_memory / before_memory:.0%} less memory")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measure how long the event loop is stalled while many `!s` / `!p` commands hit
+the store at the same time.
+
+python -m bot.scripts.benchmarks.event_loop_lag --commands 40 --latency 20
+
+The store is simulated: every call blocks its thread for --latency ms, the same
+as one MySQL round trip would.  "blocking" calls the store directly from the
+handlers, like the cogs used to; "executor" awaits the same store through
+AsyncStore.  Lag is how late a 10ms heartbeat ticker wakes up.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.store.async_store import AsyncStore
+
+TICK = 0.01
+
+# Store calls made by one command, roughly following _solve_impl and puzzle/create_puzzle
+SOLVE_CALLS = ["get_by_attr", "get_by_attr", "get_by_attr", "commit", "get_by_attr", "get_all_from_round",
+               "get_by_attr", "commit"]
+PUZZLE_CALLS = ["get_by_attr", "get_by_attr", "check_duplicates_in_hunt", "get_by_attr", "commit",
+                "get_by_attr", "get_all_from_round", "get_by_attr", "commit"]
+
+
+class SlowStore:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __getattr__(self, name):
+        def query(*args, **kwargs):
+            time.sleep(self.latency)
+        return query
+
+
+async def blocking_command(store, calls):
+    for call in calls:
+        getattr(store, call)()
+        await asyncio.sleep(0)  # a discord API call between queries
+
+
+async def executor_command(store, calls):
+    for call in calls:
+        await getattr(store, call)()
+        await asyncio.sleep(0)
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run(mode, commands, latency, workers):
+    store = SlowStore(latency)
+    if mode == "executor":
+        store = AsyncStore(store, ThreadPoolExecutor(max_workers=workers))
+        command = executor_command
+    else:
+        command = blocking_command
+
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*[command(store, SOLVE_CALLS if i % 2 else PUZZLE_CALLS) for i in range(commands)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    return elapsed, lags
+
+
+def report(mode, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{mode:<10} wall {elapsed:7.2f}s  loop lag p50 {statistics.median(lags_ms):8.1f}ms  "
+          f"p99 {p99:8.1f}ms  max {lags_ms[-1]:8.1f}ms  ticks {len(lags)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=40, help="Number of concurrent commands")
+    parser.add_argument("--latency", type=float, default=20, help="Milliseconds per store round trip")
+    parser.add_argument("--workers", type=int, default=1, help="Store executor threads")
+    args = parser.parse_args()
+
+    for mode in ("blocking", "executor"):
+        elapsed, lags = asyncio.run(run(mode, args.commands, args.latency / 1000, args.workers))
+        report(mode, elapsed, lags)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Compare encoding and decoding puzzles with each JSON codec
+
+python -m bot.scripts.benchmarks.json_codec --puzzles 2000
+
+Each puzzle has tags, times and an additional sheet, as the file store
+writes them.  "encode" is `codec.encode(puzzle, indent=4)` and
+"decode" reads that text back into a PuzzleData.
+"""
+import argparse
+import datetime
+import time
+
+from bot.store import AdditionalSheetData, PuzzleData
+from bot.store.codec import CODECS
+
+
+def make_puzzles(count):
+    start = datetime.datetime(2026, 1, 16, 18, 0, tzinfo=datetime.timezone.utc)
+    puzzles = []
+    for i in range(count):
+        puzzle = PuzzleData(f"Puzzle {i}", hunt_id=1, channel_id=10 ** 17 + i, channel_mention=f"<#{10 ** 17 + i}>",
+                            url=f"https://example.com/puzzle/{i}", google_page_id=str(i), status="in progress",
+                            tags=[1, 2], start_time=start,
+                            solve_time=start + datetime.timedelta(minutes=i))
+        puzzle.additional_sheets.append(AdditionalSheetData(google_page_id=f"extra {i}", puzzle_id=i))
+        puzzles.append(puzzle)
+    return puzzles
+
+
+def best_of(repeat, func, items):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puzzles", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    puzzles = make_puzzles(args.puzzles)
+    texts = [puzzle.to_json(indent=4) for puzzle in puzzles]
+    print(f"{'':18}{'encode':>12}{'decode':>12}")
+    for name, codec_class in CODECS.items():
+        codec = codec_class()
+        assert [codec.encode(puzzle, indent=4) for puzzle in puzzles] == texts
+        encode = best_of(args.repeat, lambda puzzle: codec.encode(puzzle, indent=4), puzzles)
+        decode = best_of(args.repeat, lambda text: codec.decode(PuzzleData, text), texts)
+        print(f"{name:18}{encode * 1000:>10.1f}ms{decode * 1000:>10.1f}ms")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Bring the MySQL (or SQLite) schema up to date
+
+python -m bot.scripts.database.migrate           # apply pending migrations
+python -m bot.scripts.database.migrate --status  # only report
+"""
+import argparse
+import logging
+
+from bot import store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--status", action="store_true", help="Show schema version and missing indexes, change nothing")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if store.pool is None:
+        raise SystemExit("Migrations only apply to mysql and sqlite storage")
+    schema = store.SchemaDb.store
+    with store.pool.checkout():
+        print(f"Schema version: {schema.current_version()}")
+        if args.status:
+            for migration in schema.pending():
+                print(f"Pending: {migration.VERSION} {migration.DESCRIPTION}")
+        else:
+            for version in schema.migrate():
+                print(f"Applied: {version}")
+        for table, name, columns in schema.missing_indexes():
+            print(f"Missing index: {name} on {table} ({', '.join(columns)})")
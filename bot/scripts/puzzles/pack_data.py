@@ -3,7 +3,7 @@
 import argparse
 import json
 
-from bot.utils.puzzles_data import PuzzleJsonDb
+from bot.store import PuzzleJsonDb
 
 if __name__ == "__main__":
-    print(json.dumps(PuzzleJsonDb.aggregate_json(), indent=4))
\ No newline at end of file
+    print(json.dumps(PuzzleJsonDb.store.aggregate_json(), indent=4))
\ No newline at end of file
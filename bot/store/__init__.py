@@ -1,14 +1,24 @@
 import os
-import mysql.connector
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from .puzzle_settings import GuildSettings, HuntSettings, _GuildSettingsDb
-from .puzzle_data import PuzzleData, _PuzzleJsonDb, MissingPuzzleError, AdditionalSheetData
+from .puzzle_data import PuzzleData, _PuzzleJsonDb, MissingPuzzleError, AdditionalSheetData, NoteData
 from .round_data import RoundData, _RoundJsonDb, MissingRoundError
 from .hunt_data import HuntData, _HuntJsonDb, MissingHuntError
+from .job_data import JobData
 from .fs import FilePuzzleJsonDb, FileGuildSettingsDb
-from .mysqldb import MySQLPuzzleJsonDb, MySQLGuildSettingsDb, MySQLRoundJsonDb, MySQLHuntJsonDb, MySQLAdditionalSheetsDb
+from .mysqldb import MySQLPuzzleJsonDb, MySQLGuildSettingsDb, MySQLRoundJsonDb, MySQLHuntJsonDb, MySQLAdditionalSheetsDb, \
+    MySQLNotesDb, MySQLJobsDb
+from .async_store import AsyncStore
+from .mysql_pool import MySQLConnectionPool
+from .channel_index import ChannelIndex, ChannelContext
+from .identity_map import IdentityMap
+from .command_context import CommandContext, CommandContexts, LAZY_FIELDS, uses_context
+from .migrations import SchemaDb as MySQLSchemaDb
+from .sqlite import SQLiteDatabase, SQLiteSchemaDb
+from .codec import JsonCodec, make_codec
 
 from bot.utils import config
 
@@ -17,69 +27,48 @@ if "LADDER_SPOT_DATA_DIR" in os.environ:
     # TODO: move to config.json??
     DATA_DIR = Path(os.environ["LADDER_SPOT_DATA_DIR"])
 
-class MySQLReconnector:
-    def __init__(self, **cfg):
-        self._cfg = cfg
-        self._conn = None
-        self._connect()
+# JSON encoding for the file store and the commands that show stored data
+codec = make_codec(config.json_codec)
+# Channel id -> hunt / round / puzzle lookups for command dispatch, kept up to
+# date by the SQL stores as they commit and delete
+channel_index = ChannelIndex()
+# One object per hunt / round / puzzle row, shared by every command
+identity_map = IdentityMap()
+# What each running command is working on, by message id
+command_contexts = CommandContexts()
 
-    def _connect(self):
-        self._conn = mysql.connector.connect(**self._cfg)
-        # keep your existing behaviour
-        self._conn.autocommit = True
-
-    def _ensure(self):
-        try:
-            # Will reconnect automatically if dropped
-            self._conn.ping(reconnect=True, attempts=2, delay=1)
-        except Exception:
-            try:
-                self._conn.close()
-            except Exception:
-                pass
-            self._conn = mysql.connector.connect(**self._cfg)
-            self._conn.autocommit = True
-
-    def cursor(self, *args, **kwargs):
-        self._ensure()
-        return self._conn.cursor(*args, **kwargs)
-
-    def commit(self):
-        # even with autocommit=True, your code calls commit()
-        self._ensure()
-        return self._conn.commit()
-
-    def rollback(self):
-        self._ensure()
-        return self._conn.rollback()
-
-    def close(self):
-        try:
-            return self._conn.close()
-        except Exception:
-            return None
-
-    def __getattr__(self, name):
-        """
-        Forward everything else (e.g., .cmd_query, .database, etc.)
-        to the underlying mysql.connector connection.
-        """
-        return getattr(self._conn, name)
+# All store calls are awaited from the cogs and run on this executor so that a
+# slow query never blocks the event loop.  With MySQL each call checks out its
+# own pooled connection, so there is one worker per connection in the pool;
+# with SQLite each worker has its own connection to the file.
+pool = None
 
 if config.storage == 'fs':
-    PuzzleJsonDb = FilePuzzleJsonDb(dir_path=DATA_DIR)
-    GuildSettingsDb = FileGuildSettingsDb(dir_path=DATA_DIR)
-elif config.storage == 'mysql':
-    mydb = MySQLReconnector(
-        host="localhost",
-        user=config.mysql_username,
-        password=config.mysql_password,
-        database=config.database,
-        charset="utf8mb4",
-    )
-    mydb.autocommit = True
-    PuzzleJsonDb = MySQLPuzzleJsonDb(mydb=mydb)
-    GuildSettingsDb = MySQLGuildSettingsDb(dir_path=DATA_DIR, mydb=mydb)
-    RoundJsonDb = MySQLRoundJsonDb(mydb=mydb)
-    HuntJsonDb = MySQLHuntJsonDb(mydb=mydb)
-    SheetsJsonDb = MySQLAdditionalSheetsDb(mydb=mydb)
\ No newline at end of file
+    STORE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+    PuzzleJsonDb = AsyncStore(FilePuzzleJsonDb(dir_path=DATA_DIR, codec=codec), STORE_EXECUTOR)
+    GuildSettingsDb = AsyncStore(FileGuildSettingsDb(dir_path=DATA_DIR, codec=codec), STORE_EXECUTOR)
+elif config.storage in ('mysql', 'sqlite'):
+    if config.storage == 'mysql':
+        pool = MySQLConnectionPool(
+            size=config.mysql_pool_size,
+            idle_check=config.mysql_idle_check,
+            host="localhost",
+            user=config.mysql_username,
+            password=config.mysql_password,
+            database=config.database,
+            charset="utf8mb4",
+        )
+        schema_db = MySQLSchemaDb(mydb=pool)
+    else:
+        # The MySQL stores run unchanged on a SQLite file
+        pool = SQLiteDatabase(config.sqlite_path or DATA_DIR / "bot.sqlite3", size=config.sqlite_workers)
+        schema_db = SQLiteSchemaDb(mydb=pool)
+    STORE_EXECUTOR = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="store")
+    PuzzleJsonDb = AsyncStore(MySQLPuzzleJsonDb(mydb=pool, index=channel_index, cache=identity_map), STORE_EXECUTOR, pool.checkout)
+    GuildSettingsDb = AsyncStore(MySQLGuildSettingsDb(dir_path=DATA_DIR, mydb=pool), STORE_EXECUTOR, pool.checkout)
+    RoundJsonDb = AsyncStore(MySQLRoundJsonDb(mydb=pool, index=channel_index, cache=identity_map), STORE_EXECUTOR, pool.checkout)
+    HuntJsonDb = AsyncStore(MySQLHuntJsonDb(mydb=pool, index=channel_index, cache=identity_map), STORE_EXECUTOR, pool.checkout)
+    SheetsJsonDb = AsyncStore(MySQLAdditionalSheetsDb(mydb=pool), STORE_EXECUTOR, pool.checkout)
+    NotesDb = AsyncStore(MySQLNotesDb(mydb=pool), STORE_EXECUTOR, pool.checkout)
+    JobsDb = AsyncStore(MySQLJobsDb(mydb=pool), STORE_EXECUTOR, pool.checkout)
+    SchemaDb = AsyncStore(schema_db, STORE_EXECUTOR, pool.checkout)
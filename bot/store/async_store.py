@@ -0,0 +1,54 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStore:
+    """Awaitable front for one of the synchronous store objects
+
+    The MySQL and file stores do blocking I/O, so calling them straight from a
+    cog handler stalls the event loop (and with it the gateway heartbeat and
+    every other guild's commands) for the whole round trip.  Every method looked
+    up on an AsyncStore is instead run on the given executor and awaited, e.g.
+
+        puzzle = await PuzzleJsonDb.get_by_attr(channel_id=ctx.channel.id)
+
+    Plain attributes (e.g. `dir_path`) are passed through unchanged, and the
+    wrapped object is still available as `store` for scripts that want to make
+    blocking calls directly.
+
+    If `scope` is given, it is called to get a context manager which is held
+    around every call on the executor thread, e.g. a connection pool checkout.
+    """
+
+    def __init__(self, store, executor: Executor, scope: Optional[Callable] = None):
+        self.store = store
+        self.executor = executor
+        self.scope = scope
+
+    def _call(self, method, args, kwargs):
+        if self.scope is None:
+            return method(*args, **kwargs)
+        with self.scope():
+            return method(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def run_in_executor(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._call, attr, args, kwargs)
+
+        # Only look the method up once, later calls skip __getattr__ entirely
+        setattr(self, name, run_in_executor)
+        return run_in_executor
+
+    def __repr__(self):
+        return f"AsyncStore({self.store!r})"
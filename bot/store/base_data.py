@@ -1,23 +1,143 @@
-from dataclasses import dataclass, field
-from dataclasses_json import dataclass_json
 import datetime
-import logging
 import json
-from typing import List, Optional
+from dataclasses import MISSING, fields
+import logging
+from typing import List
 
 logger = logging.getLogger(__name__)
 
-@dataclass_json
-@dataclass
+
+def slotted(cls):
+    """Rebuild a dataclass with `__slots__` for its fields, like `dataclass(slots=True)` on Python 3.10+
+
+    Apply it between `@dataclass` and `@dataclass_json`.  Objects then have
+    no per-instance `__dict__`, which matters when thousands of puzzles are
+    loaded, and assigning to a misspelt attribute raises an AttributeError.
+    Methods must not use zero-argument `super()`, as it would refer to the
+    original class.
+    """
+    names = tuple(f.name for f in fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = names
+    for name in names + ("__dict__", "__weakref__"):
+        # Defaults live on in the generated __init__
+        cls_dict.pop(name, None)
+    new_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
+
+
+def compile_decoder(cls):
+    """Function building a `cls` object from a database row, generated from its fields
+
+    The field list, which fields hold times or JSON, and the defaults for
+    columns missing from the row are all worked out once here, rather than
+    by reflecting over every attribute of every row.  Times come back from
+    the database as naive UTC.  The object is returned already marked clean.
+    """
+    namespace = {"cls": cls, "new": object.__new__, "loads": json.loads, "utc": datetime.timezone.utc}
+    lines = ["def decode(row):", "    obj = new(cls)"]
+    clean = []
+    for f in fields(cls):
+        name = f.name
+        if f.default_factory is not MISSING:
+            namespace[f"default_{name}"] = f.default_factory
+            default = f"default_{name}()"
+        else:
+            namespace[f"default_{name}"] = None if f.default is MISSING else f.default
+            default = f"default_{name}"
+        if name in cls.JSON_FIELDS:
+            lines.append(f"    value = row.get({name!r})")
+            lines.append(f"    obj.{name} = {default} if value is None else loads(value)")
+        elif name.endswith("_time"):
+            lines.append(f"    value = row.get({name!r})")
+            lines.append(f"    obj.{name} = {default} if value is None else value.replace(tzinfo=utc)")
+        else:
+            lines.append(f"    obj.{name} = row[{name!r}] if {name!r} in row else {default}")
+        # Lists (notes, tags) and dicts (job payloads) are changed in place, so keep a copy
+        if f.default_factory in (list, dict):
+            clean.append(f"{f.default_factory.__name__}(obj.{name})")
+        else:
+            clean.append(f"obj.{name}")
+    lines.append("    obj._clean = (" + ", ".join(clean) + ",)")
+    lines.append("    return obj")
+    exec("\n".join(lines), namespace)
+    return namespace["decode"]
+
+
 class _BaseData:
-    def add_data_from_dict(self, data: dict):
-        for attr, value in self.__dict__.items():
-            if attr == "notes":
-                setattr(puz, attr, json.loads(puzzle_data.get(attr, None)))
-            elif attr.endswith("_time"):
-                db_date = puzzle_data.get(attr,None)
-                if db_date is not None:
-                    utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
-                    setattr(puz,attr,utc_date)
-            else:
-                setattr(puz, attr, puzzle_data.get(attr, None))
\ No newline at end of file
+    """Mixin for the stored dataclasses that tracks which fields have changed
+
+    The stores call `mark_clean()` once an object has been loaded or saved,
+    which remembers the value of every field.  `dirty_fields()` then lists the
+    fields changed since, so a commit can skip untouched objects and only
+    write the changed columns.  An object that has never been marked clean
+    (e.g. one just created by a command) counts every field as dirty.
+
+    `import_dict()` builds an object from a database row with a decoder
+    generated by `compile_decoder` the first time it is used for a class.
+    Columns named in `JSON_FIELDS` hold JSON text.
+    """
+    __slots__ = ("_clean",)
+    JSON_FIELDS = ()
+
+    @classmethod
+    def import_dict(cls, row: dict):
+        decoder = cls.__dict__.get("_decoder")
+        if decoder is None:
+            decoder = compile_decoder(cls)
+            cls._decoder = decoder
+        return decoder(row)
+
+    def mark_clean(self):
+        snapshot = []
+        for f in fields(self):
+            value = getattr(self, f.name)
+            # Lists (notes, tags) and dicts (job payloads) are changed in place, so keep a copy
+            if isinstance(value, (list, dict)):
+                value = type(value)(value)
+            snapshot.append(value)
+        # A tuple in field order is a good deal smaller than a dict per object
+        self._clean = tuple(snapshot)
+
+    def copy(self):
+        """A copy that can be changed without touching this object, dirty tracking included
+
+        Lists and dicts are copied, as are the stored objects in lists (a
+        puzzle's additional sheets).
+        """
+        clone = object.__new__(type(self))
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, list):
+                value = [item.copy() if isinstance(item, _BaseData) else item for item in value]
+            elif isinstance(value, dict):
+                value = dict(value)
+            setattr(clone, f.name, value)
+        clean = getattr(self, "_clean", None)
+        if clean is not None:
+            # Never changed in place, mark_clean replaces it
+            clone._clean = clean
+        return clone
+
+    def dirty_fields(self) -> List[str]:
+        clean = getattr(self, "_clean", None)
+        if clean is None:
+            return [f.name for f in fields(self)]
+        return [f.name for f, value in zip(fields(self), clean) if getattr(self, f.name) != value]
+
+    def is_dirty(self) -> bool:
+        clean = getattr(self, "_clean", None)
+        if clean is None:
+            return True
+        return any(getattr(self, f.name) != value for f, value in zip(fields(self), clean))
+
+    def clean_value(self, name, default=None):
+        """Value of a field as it was when last marked clean"""
+        clean = getattr(self, "_clean", None)
+        if clean is None:
+            return default
+        for f, value in zip(fields(self), clean):
+            if f.name == name:
+                return value
+        return default
@@ -0,0 +1,191 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .hunt_data import HuntData
+from .puzzle_data import PuzzleData
+from .round_data import RoundData
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChannelContext:
+    """What a channel is, and the ids of the hunt, round and puzzle it belongs to (0 if none)"""
+    channel_type: str = "Guild"
+    hunt_id: int = 0
+    round_id: int = 0
+    puzzle_id: int = 0
+
+
+@dataclass
+class _RoundEntry:
+    hunt_id: int
+    category_id: int
+    meta_id: int
+    type: str
+
+
+class ChannelIndex:
+    """In-memory map from discord channel and category ids to hunts, rounds and puzzles
+
+    Replaces the `get_channel_type` UNION and the follow up `get_by_attr`
+    lookups that used to run before every command.  The whole index is loaded
+    once at startup from `GuildSettingsDb.get_channel_index_rows()`, and the
+    MySQL stores keep it up to date by calling `add` / `discard` whenever a
+    hunt, round or puzzle is committed or deleted.
+
+    An id the index has never heard of is looked up in the database once with
+    `GuildSettingsDb.get_channel_rows()`; if it turns out not to belong to any
+    hunt, round or puzzle (e.g. a general chat channel) that is remembered too,
+    so it does not hit the database again.
+
+    Store calls run on the executor threads while commands resolve on the
+    event loop, so all access goes through a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[int, Tuple[str, int]] = {}  # channel / category id -> (table, entity id)
+        self._hunts: Dict[int, Tuple[int, int]] = {}  # hunt id -> (channel_id, category_id)
+        self._rounds: Dict[int, _RoundEntry] = {}
+        self._puzzles: Dict[int, Tuple[int, int]] = {}  # puzzle id -> (hunt_id, channel_id)
+        self._meta_rounds: Dict[int, int] = {}  # meta puzzle id -> round id
+        self._missing = set()
+
+    def load(self, hunts: Iterable[dict], rounds: Iterable[dict], puzzles: Iterable[dict], looked_up=()):
+        """Add rows from the hunts, rounds and puzzles tables
+
+        Any id in `looked_up` that is still unknown afterwards is cached as
+        not belonging to the bot.
+        """
+        with self._lock:
+            for row in hunts:
+                self._add_hunt(row['id'], row['channel_id'], row['category_id'])
+            for row in rounds:
+                self._add_round(row['id'], _RoundEntry(row['hunt_id'], row['category_id'], row['meta_id'], row['type']))
+            for row in puzzles:
+                self._add_puzzle(row['id'], row['hunt_id'], row['channel_id'])
+            for channel_id in looked_up:
+                if channel_id not in self._ids:
+                    self._missing.add(channel_id)
+
+    def unknown(self, *channel_ids) -> list:
+        """Ids that need looking up in the database before `resolve` can be trusted"""
+        with self._lock:
+            return [channel_id for channel_id in channel_ids
+                    if channel_id and channel_id not in self._ids and channel_id not in self._missing]
+
+    def resolve(self, channel_id, category_id=None) -> ChannelContext:
+        """Work out the channel type and entity ids for a command sent in `channel_id`
+
+        Follows the rules `cog_before_invoke` used with the database: a hunt's
+        own channel gives the hunt, a round category gives the round (and its
+        metapuzzle), and a puzzle channel gives the puzzle plus the round it is
+        the meta of, or else the round of the category it sits in.  Round
+        channels report the round's type (Round, Metapuzzle, ...).
+        """
+        with self._lock:
+            context = ChannelContext()
+            entry = self._ids.get(channel_id) or self._ids.get(category_id)
+            if entry is None:
+                return context
+            table, entity_id = entry
+            if table == "hunts":
+                context.channel_type = "Hunt"
+                if self._hunts[entity_id][0] == channel_id:
+                    context.hunt_id = entity_id
+            elif table == "rounds":
+                context.channel_type = "Group"
+                round_id = self._round_in_category(category_id)
+                if round_id:
+                    round_entry = self._rounds[round_id]
+                    context.channel_type = round_entry.type
+                    context.round_id = round_id
+                    context.hunt_id = round_entry.hunt_id
+                    context.puzzle_id = round_entry.meta_id or 0
+            elif table == "puzzles":
+                context.channel_type = "Puzzle"
+                context.puzzle_id = entity_id
+                context.hunt_id = self._puzzles[entity_id][0]
+                round_id = self._meta_rounds.get(entity_id)
+                if round_id:
+                    context.channel_type = self._rounds[round_id].type
+                else:
+                    round_id = self._round_in_category(category_id)
+                context.round_id = round_id or 0
+            return context
+
+    def add(self, data):
+        """Update the index after a hunt, round or puzzle has been committed"""
+        with self._lock:
+            if isinstance(data, PuzzleData):
+                self._add_puzzle(data.id, data.hunt_id, data.channel_id)
+            elif isinstance(data, RoundData):
+                self._add_round(data.id, _RoundEntry(data.hunt_id, data.category_id, data.meta_id, data.type))
+            elif isinstance(data, HuntData):
+                self._add_hunt(data.id, data.channel_id, data.category_id)
+
+    def discard(self, table, entity_id):
+        """Remove a deleted hunt, round or puzzle, `table` being the store's TABLE_NAME"""
+        with self._lock:
+            if table == "puzzles":
+                self._discard_puzzle(entity_id)
+            elif table == "rounds":
+                self._discard_round(entity_id)
+            elif table == "hunts":
+                self._discard_hunt(entity_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _round_in_category(self, category_id) -> Optional[int]:
+        entry = self._ids.get(category_id)
+        if entry and entry[0] == "rounds":
+            return entry[1]
+        return None
+
+    def _map(self, channel_id, table, entity_id):
+        if channel_id:
+            self._ids[channel_id] = (table, entity_id)
+            self._missing.discard(channel_id)
+
+    def _unmap(self, channel_id, table, entity_id):
+        if self._ids.get(channel_id) == (table, entity_id):
+            del self._ids[channel_id]
+
+    def _add_hunt(self, hunt_id, channel_id, category_id):
+        self._discard_hunt(hunt_id)
+        self._hunts[hunt_id] = (channel_id, category_id)
+        self._map(category_id, "hunts", hunt_id)
+        self._map(channel_id, "hunts", hunt_id)
+
+    def _discard_hunt(self, hunt_id):
+        channel_id, category_id = self._hunts.pop(hunt_id, (0, 0))
+        self._unmap(channel_id, "hunts", hunt_id)
+        self._unmap(category_id, "hunts", hunt_id)
+
+    def _add_round(self, round_id, entry: _RoundEntry):
+        self._discard_round(round_id)
+        self._rounds[round_id] = entry
+        self._map(entry.category_id, "rounds", round_id)
+        if entry.meta_id:
+            self._meta_rounds[entry.meta_id] = round_id
+
+    def _discard_round(self, round_id):
+        entry = self._rounds.pop(round_id, None)
+        if entry is None:
+            return
+        self._unmap(entry.category_id, "rounds", round_id)
+        if entry.meta_id and self._meta_rounds.get(entry.meta_id) == round_id:
+            del self._meta_rounds[entry.meta_id]
+
+    def _add_puzzle(self, puzzle_id, hunt_id, channel_id):
+        self._discard_puzzle(puzzle_id)
+        self._puzzles[puzzle_id] = (hunt_id, channel_id)
+        self._map(channel_id, "puzzles", puzzle_id)
+
+    def _discard_puzzle(self, puzzle_id):
+        _, channel_id = self._puzzles.pop(puzzle_id, (0, 0))
+        self._unmap(channel_id, "puzzles", puzzle_id)
@@ -0,0 +1,149 @@
+"""
+JSON encoding of the stored data classes
+
+`dataclasses_json`'s `to_json` / `from_json` work out how to handle every
+field from its type hints on each call, which is slow for the file store and
+the debug commands that dump whole puzzles.  The stores and cogs go through a
+codec instead, picked with `"json_codec"` in config.json:
+
+- `FastJsonCodec` ("fast", the default) inspects each class once and keeps
+  a schema of how to handle each field
+- `DataclassesJsonCodec` ("dataclasses_json") calls dataclasses_json as before
+
+Both produce the same JSON, so files written by one are read by the other.
+As with dataclasses_json, times are written as POSIX timestamps; the fast
+codec reads them back as UTC datetimes.
+"""
+import dataclasses
+import datetime
+import json
+import threading
+import typing
+from typing import Dict, List, Tuple
+
+# How a field is converted, see FastJsonCodec._schema
+_PLAIN, _PRIMITIVE, _DATETIME, _LIST, _DATACLASS, _DATACLASS_LIST = range(6)
+
+
+class JsonCodec:
+    """Converts the stored data classes to and from JSON"""
+
+    def to_dict(self, obj) -> dict:
+        raise NotImplementedError
+
+    def from_dict(self, cls, data: dict):
+        raise NotImplementedError
+
+    def encode(self, obj, indent=None) -> str:
+        return json.dumps(self.to_dict(obj), indent=indent)
+
+    def decode(self, cls, text: str):
+        return self.from_dict(cls, json.loads(text))
+
+
+class DataclassesJsonCodec(JsonCodec):
+    """The dataclasses_json methods the data classes already have"""
+
+    def to_dict(self, obj) -> dict:
+        return obj.to_dict(encode_json=True)
+
+    def from_dict(self, cls, data: dict):
+        return cls.from_dict(data)
+
+    def encode(self, obj, indent=None) -> str:
+        return obj.to_json(indent=indent)
+
+    def decode(self, cls, text: str):
+        return cls.from_json(text)
+
+
+class FastJsonCodec(JsonCodec):
+    """Schema driven codec, the schema for each class is built on first use"""
+
+    def __init__(self):
+        self._schemas: Dict[type, List[Tuple[str, int, object]]] = {}
+        self._lock = threading.Lock()
+
+    def _schema(self, cls) -> List[Tuple[str, int, object]]:
+        schema = self._schemas.get(cls)
+        if schema is not None:
+            return schema
+        hints = typing.get_type_hints(cls)
+        schema = []
+        for f in dataclasses.fields(cls):
+            field_type = hints[f.name]
+            args = [arg for arg in typing.get_args(field_type) if arg is not type(None)]
+            if typing.get_origin(field_type) is typing.Union and len(args) == 1:
+                # Optional[X]
+                field_type = args[0]
+            origin = typing.get_origin(field_type)
+            if field_type is datetime.datetime:
+                schema.append((f.name, _DATETIME, None))
+            elif dataclasses.is_dataclass(field_type):
+                schema.append((f.name, _DATACLASS, field_type))
+            elif origin in (list, List):
+                item_type = (typing.get_args(field_type) or (None,))[0]
+                if dataclasses.is_dataclass(item_type):
+                    schema.append((f.name, _DATACLASS_LIST, item_type))
+                else:
+                    schema.append((f.name, _LIST, None))
+            elif field_type in (int, float, str, bool):
+                schema.append((f.name, _PRIMITIVE, field_type))
+            else:
+                schema.append((f.name, _PLAIN, None))
+        with self._lock:
+            self._schemas[cls] = schema
+        return schema
+
+    def to_dict(self, obj) -> dict:
+        data = {}
+        for name, kind, sub_type in self._schema(type(obj)):
+            value = getattr(obj, name)
+            if value is None or kind in (_PLAIN, _PRIMITIVE):
+                data[name] = value
+            elif kind == _DATETIME:
+                data[name] = value.timestamp()
+            elif kind == _LIST:
+                data[name] = list(value)
+            elif kind == _DATACLASS:
+                data[name] = self.to_dict(value)
+            else:
+                data[name] = [self.to_dict(item) for item in value]
+        return data
+
+    def from_dict(self, cls, data: dict):
+        kwargs = {}
+        for name, kind, sub_type in self._schema(cls):
+            if name not in data:
+                continue
+            value = data[name]
+            if value is None or kind == _PLAIN:
+                kwargs[name] = value
+            elif kind == _PRIMITIVE:
+                # dataclasses_json coerces these too, e.g. a 0/1 into a bool
+                kwargs[name] = value if isinstance(value, sub_type) else sub_type(value)
+            elif kind == _DATETIME:
+                if isinstance(value, datetime.datetime):
+                    kwargs[name] = value
+                else:
+                    kwargs[name] = datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+            elif kind == _LIST:
+                kwargs[name] = list(value)
+            elif kind == _DATACLASS:
+                kwargs[name] = self.from_dict(sub_type, value)
+            else:
+                kwargs[name] = [self.from_dict(sub_type, item) for item in value]
+        return cls(**kwargs)
+
+
+CODECS = {
+    "fast": FastJsonCodec,
+    "dataclasses_json": DataclassesJsonCodec,
+}
+
+
+def make_codec(name="fast") -> JsonCodec:
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown json_codec {name!r}, expected one of {', '.join(CODECS)}")
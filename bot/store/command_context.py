@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from .channel_index import ChannelContext
+
+logger = logging.getLogger(__name__)
+
+# Loaded on demand, the rest of a context is known up front
+LAZY_FIELDS = ("hunt", "hunt_round", "puzzle", "guild_data")
+
+
+def uses_context(*names):
+    """Declare which of the hunt, hunt_round, puzzle and guild_data a command reads
+
+    Only those are loaded before the command runs; anything else it asks
+    for raises.  Commands without a declaration get all of them.  Calls to
+    the Google Sheets cog take the hunt's spreadsheets, so commands using it
+    should declare the hunt.
+    """
+    unknown = set(names) - set(LAZY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown context fields {sorted(unknown)}, expected some of {', '.join(LAZY_FIELDS)}")
+
+    def decorator(func):
+        func.context_needs = names
+        return func
+    return decorator
+
+
+class CommandContext:
+    """The hunt, round and puzzle a command is running against, loaded as they are asked for
+
+    The channel type and ids come from the channel index up front.  Each of
+    `LAZY_FIELDS` is loaded by its loader the first time it is awaited, e.g.
+    `await context.puzzle()`, and kept for the rest of the command.  `peek`
+    gives the value without loading, for the cog's synchronous getters.
+    """
+
+    def __init__(self, channel: ChannelContext, loaders: Dict[str, Callable[[], Awaitable]],
+                 needs: Iterable[str] = LAZY_FIELDS, **values):
+        self.channel = channel
+        self.needs = tuple(needs)
+        self.opened = time.monotonic()
+        self._loaders = loaders
+        self._values = dict(values, channel_type=channel.channel_type)
+
+    async def get(self, name):
+        if name not in self._values:
+            self._values[name] = await self._loaders[name]()
+        return self._values[name]
+
+    async def load(self):
+        """Load everything the command declared it needs"""
+        for name in self.needs:
+            await self.get(name)
+
+    async def hunt(self):
+        return await self.get("hunt")
+
+    async def hunt_round(self):
+        return await self.get("hunt_round")
+
+    async def puzzle(self):
+        return await self.get("puzzle")
+
+    async def guild_data(self):
+        return await self.get("guild_data")
+
+    def peek(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise RuntimeError(f"{name} is not loaded for this command, declare it with @uses_context") from None
+
+    def set(self, name, value):
+        self._values[name] = value
+
+    def loaded(self, name):
+        """The value if it has been loaded, else None"""
+        return self._values.get(name)
+
+
+class CommandContexts:
+    """Contexts of the commands currently running, by message id
+
+    Every context opened must be closed, whichever way its command ends;
+    `metrics()` shows how many are open and the age of the oldest, so one
+    that leaks stands out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contexts: Dict[int, CommandContext] = {}
+        self.opened = 0
+        self.closed = 0
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def open(self, key, context: CommandContext) -> CommandContext:
+        with self._lock:
+            if key in self._contexts:
+                logger.warning(f"Replacing command context {key} that was never closed")
+            else:
+                self.opened += 1
+            self._contexts[key] = context
+        return context
+
+    def close(self, key) -> Optional[CommandContext]:
+        with self._lock:
+            context = self._contexts.pop(key, None)
+            if context is not None:
+                self.closed += 1
+        return context
+
+    def get(self, key) -> Optional[CommandContext]:
+        return self._contexts.get(key)
+
+    def __getitem__(self, key) -> CommandContext:
+        return self._contexts[key]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            oldest = max((now - context.opened for context in self._contexts.values()), default=0)
+            return {
+                "live": len(self._contexts),
+                "opened": self.opened,
+                "closed": self.closed,
+                "oldest_seconds": round(oldest, 1),
+            }
@@ -2,23 +2,95 @@ import datetime
 import errno
 import json
 import logging
+import os
+import tempfile
+import threading
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 
 import pytz
-from .puzzle_data import _PuzzleJsonDb, PuzzleData
+from .puzzle_data import _PuzzleJsonDb, PuzzleData, MissingPuzzleError
 from .puzzle_settings import _GuildSettingsDb, GuildSettings
+from .codec import JsonCodec, FastJsonCodec
 
 logger = logging.getLogger(__name__)
+
+
+def atomic_write(path: Path, text: str):
+    """Replace `path` with `text`, so a crash leaves either the old or the new file, never half of one"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            fp.write(text)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class FilePuzzleJsonDb(_PuzzleJsonDb):
-    def __init__(self, dir_path: Path):
+    """Puzzles stored as JSON files under `guild/hunt/round/puzzle.json`
+
+    Every file is read once, the first time the store is used, into an
+    in-memory manifest of path -> puzzle, so lookups never touch the disk.
+    Commits update the manifest straight away and queue the file write; a
+    writer thread flushes the queue `flush_delay` seconds later, so a puzzle
+    committed several times in quick succession is only written once.  Files
+    are written with `atomic_write`.  Call `flush()` to write out anything
+    queued, e.g. before shutting down.  Files are read and written with `codec`.
+
+    The manifest holds the puzzles as last committed.  Lookups return copies
+    and commits store a copy, so a change a command has not committed is
+    never seen by other commands, nor written by a flush.
+    """
+
+    def __init__(self, dir_path: Path, flush_delay=1.0, codec: Optional[JsonCodec] = None):
         self.dir_path = dir_path
+        self.codec = codec or FastJsonCodec()
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # one flush writing files at a time, so the newest write lands last
+        self._manifest: Optional[Dict[Path, PuzzleData]] = None  # relative path -> puzzle
+        self._paths: Dict[int, Path] = {}  # channel id -> relative path
+        self._hunt_guilds: Dict[int, int] = {}  # hunt id -> guild id, from where its puzzles are
+        self._pending: Dict[Path, Optional[PuzzleData]] = {}  # relative path -> puzzle to write, None to delete
+        self._timer: Optional[threading.Timer] = None
+        self.writes = 0
+
+    def load(self):
+        """Read every puzzle file into the manifest, if that has not been done yet"""
+        with self._lock:
+            if self._manifest is not None:
+                return
+            self._manifest = {}
+            for path in self.dir_path.glob("*/*/*/*.json"):
+                relpath = path.relative_to(self.dir_path)
+                try:
+                    with path.open() as fp:
+                        puzzle_data = self.codec.decode(PuzzleData, fp.read())
+                    guild_id = int(relpath.parts[0])
+                except Exception:
+                    logger.exception(f"Unable to load puzzle data from {path}")
+                    continue
+                puzzle_data.mark_clean()
+                self._manifest[relpath] = puzzle_data
+                self._paths[puzzle_data.channel_id] = relpath
+                self._hunt_guilds[puzzle_data.hunt_id] = guild_id
+            logger.info(f"Loaded {len(self._manifest)} puzzles from {self.dir_path}")
 
     def puzzle_path(self, puzzle, round_id=None, hunt_id=None, guild_id=None) -> Path:
-        """Store puzzle metadata to the path `guild/category/puzzle.json`
+        """Store puzzle metadata to the path `guild/hunt/round/puzzle.json`
 
         Use unique ASCII ids (e.g. the discord id snowflakes) for each part of the
-        path, to avoid potential shenanigans with unicode handling.
+        path, to avoid potential shenanigans with unicode handling.  For a
+        PuzzleData the round is its first tag, and the guild is the one its
+        hunt's other puzzles are stored under unless `guild_id` is passed.
 
         Note:
             For convenience, with the Google Drive cog, the relative path
@@ -27,9 +99,13 @@ class FilePuzzleJsonDb(_PuzzleJsonDb):
         """
         if isinstance(puzzle, PuzzleData):
             puzzle_id = puzzle.channel_id
-            round_id = puzzle.round_id
-            guild_id = puzzle.guild_id
+            round_id = puzzle.tags[0] if puzzle.tags else 0
             hunt_id = puzzle.hunt_id
+            if guild_id is None:
+                self.load()
+                guild_id = self._hunt_guilds.get(hunt_id)
+            if guild_id is None:
+                raise ValueError(f"guild_id not passed for puzzle {puzzle.name} in a new hunt {hunt_id}")
         elif isinstance(puzzle, (int, str)):
             puzzle_id = puzzle
             if round_id is None or guild_id is None or hunt_id is None:
@@ -39,41 +115,79 @@ class FilePuzzleJsonDb(_PuzzleJsonDb):
         # TODO: Database would be better here .. who wants to sort through puzzle metadata by these ids?
         return (self.dir_path / str(guild_id) / str(hunt_id) / str(round_id) / str(puzzle_id)).with_suffix(".json")
 
-    def commit(self, puzzle_data):
-        """Update puzzle metadata file"""
-        puzzle_path = self.puzzle_path(puzzle_data)
-        puzzle_path.parent.parent.mkdir(exist_ok=True)
-        puzzle_path.parent.mkdir(exist_ok=True)
-        with puzzle_path.open("w") as fp:
-            fp.write(puzzle_data.to_json(indent=4))
+    def commit(self, puzzle_data, guild_id=None):
+        """Update puzzle metadata, the file is written by the next flush"""
+        self.load()
+        with self._lock:
+            relpath = self.puzzle_path(puzzle_data, guild_id=guild_id).relative_to(self.dir_path)
+            old_relpath = self._paths.get(puzzle_data.channel_id)
+            if old_relpath is not None and old_relpath != relpath:
+                # Moved to another round
+                self._manifest.pop(old_relpath, None)
+                self._pending[old_relpath] = None
+            puzzle_data.mark_clean()
+            stored = puzzle_data.copy()
+            self._manifest[relpath] = stored
+            self._paths[puzzle_data.channel_id] = relpath
+            self._hunt_guilds[puzzle_data.hunt_id] = int(relpath.parts[0])
+            self._pending[relpath] = stored
+            self._schedule_flush()
 
     def delete(self, puzzle_data):
-        puzzle_path = self.puzzle_path(puzzle_data)
-        try:
-            puzzle_path.unlink()
-        except IOError:
-            pass
+        self.load()
+        with self._lock:
+            relpath = self._paths.pop(puzzle_data.channel_id, None)
+            if relpath is None:
+                return
+            self._manifest.pop(relpath, None)
+            self._pending[relpath] = None
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.name = "fs-store-flush"
+            self._timer.start()
+
+    def flush(self):
+        """Write every queued puzzle file now"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, {}
+                # Copies taken by commit, which nothing changes, serialised under the lock for a consistent set
+                texts = {relpath: None if puzzle_data is None else self.codec.encode(puzzle_data, indent=4)
+                         for relpath, puzzle_data in pending.items()}
+            for relpath, text in texts.items():
+                path = self.dir_path / relpath
+                try:
+                    if text is None:
+                        path.unlink()
+                    else:
+                        atomic_write(path, text)
+                        self.writes += 1
+                except FileNotFoundError:
+                    pass
+                except Exception:
+                    logger.exception(f"Unable to write puzzle data to {path}")
 
     def get(self, guild_id, puzzle_id, round_id, hunt_id) -> PuzzleData:
-        try:
-            with self.puzzle_path(puzzle_id, hunt_id=hunt_id, round_id=round_id, guild_id=guild_id).open() as fp:
-                return PuzzleData.from_json(fp.read())
-        except (IOError, OSError) as exc:
-            # can also just catch FileNotFoundError
-            if exc.errno == errno.ENOENT:
-                raise MissingPuzzleError(f"Unable to find puzzle {puzzle_id} for {round_id}")
-            raise
+        self.load()
+        relpath = self.puzzle_path(puzzle_id, hunt_id=hunt_id, round_id=round_id, guild_id=guild_id).relative_to(self.dir_path)
+        with self._lock:
+            puzzle_data = self._manifest.get(relpath)
+        if puzzle_data is None:
+            raise MissingPuzzleError(f"Unable to find puzzle {puzzle_id} for {round_id}")
+        return puzzle_data.copy()
 
     def get_all(self, guild_id, hunt_id="*") -> List[PuzzleData]:
-        paths = self.dir_path.rglob(f"{guild_id}/{hunt_id}/*/*.json")
-        puzzle_datas = []
-        for path in paths:
-            try:
-                with path.open() as fp:
-                    puzzle_datas.append(PuzzleData.from_json(fp.read()))
-            except Exception:
-                logger.exception(f"Unable to load puzzle data from {path}")
-        return PuzzleData.sort_by_round_start(puzzle_datas)
+        self.load()
+        with self._lock:
+            puzzle_datas = [puzzle_data.copy() for relpath, puzzle_data in self._manifest.items()
+                            if relpath.parts[0] == str(guild_id) and hunt_id in ("*", relpath.parts[1], puzzle_data.hunt_id)]
+        return PuzzleData.sort_by_puzzle_start(puzzle_datas)
 
     def get_solved_puzzles_to_archive(self, guild_id, now=None, include_meta=False, minutes=1) -> List[PuzzleData]:
         """Returns list of all solved but unarchived puzzles"""
@@ -98,25 +212,25 @@ class FilePuzzleJsonDb(_PuzzleJsonDb):
         """Aggregate all puzzle metadata into a single JSON object, for convenience
 
         Might be handy with a JSON viewer such as `IPython.display.JSON`.
+        Built from the manifest, so it includes commits not yet flushed.
         """
-        paths = self.dir_path.rglob(f"*/*.json")
-        result = {}
-        for path in paths:
-            relpath = path.relative_to(self.dir_path)
-            with path.open() as fp:
-                result[str(relpath)] = json.load(fp)
-        return result
+        self.load()
+        with self._lock:
+            items = sorted(self._manifest.items())
+        return {str(relpath): self.codec.to_dict(puzzle_data) for relpath, puzzle_data in items}
 
 class FileGuildSettingsDb():
-    def __init__(self, dir_path: Path):
+    def __init__(self, dir_path: Path, codec: Optional[JsonCodec] = None):
         self.dir_path = dir_path
+        self.codec = codec or FastJsonCodec()
         self.cached_settings = {}
 
     def get(self, guild_id: int) -> GuildSettings:
         settings_path = self.dir_path / str(guild_id) / "settings.json"
         if settings_path.exists():
             with settings_path.open() as fp:
-                settings = GuildSettings.from_json(fp.read())
+                settings = self.codec.decode(GuildSettings, fp.read())
+            settings.mark_clean()
         else:
             # Populate empty settings file
             settings = GuildSettings(guild_id=guild_id)
@@ -132,8 +246,6 @@ class FileGuildSettingsDb():
 
     def commit(self, settings: GuildSettings):
         settings_path = self.dir_path / str(settings.guild_id) / "settings.json"
-        settings_path.parent.parent.mkdir(exist_ok=True)
-        settings_path.parent.mkdir(exist_ok=True)
-        with settings_path.open("w") as fp:
-            fp.write(settings.to_json(indent=4))
+        atomic_write(settings_path, self.codec.encode(settings, indent=4))
+        settings.mark_clean()
         self.cached_settings[settings.guild_id] = settings
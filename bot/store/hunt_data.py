@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
+from .base_data import _BaseData, slotted
 import datetime
 import logging
 import json
@@ -12,11 +13,12 @@ class MissingHuntError(RuntimeError):
     pass
 
 @dataclass_json
+@slotted
 @dataclass
-class HuntData:
+class HuntData(_BaseData):
     name: str = ""
     id: int = 0
-    uid: str = ""
+    uid: Optional[str] = None
     category_id: int = 0
     channel_id: int = 0
     guild_id: int = 0
@@ -38,22 +40,6 @@ class HuntData:
     def __hash__(self):
         return self.id
     @classmethod
-    def import_dict(cls, hunt_data: dict):
-        r = HuntData()
-        for attr, value in r.__dict__.items():
-            if attr == "notes":
-                setattr(r, attr, json.loads(hunt_data.get(attr, None)))
-            elif attr.endswith("_time"):
-                db_date = hunt_data.get(attr,None)
-                if db_date is not None:
-                    utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
-                    setattr(r,attr,utc_date)
-            else:
-                setattr(r, attr, hunt_data.get(attr, None))
-
-        return r
-
-    @classmethod
     def sort_by_round_start(cls, rounds: list) -> list:
         """Return list of PuzzleData objects sorted by start of round time
 
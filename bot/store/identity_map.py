@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMap:
+    """Process-wide LRU cache of loaded hunts, rounds and puzzles
+
+    Every row the MySQL stores load is passed through `adopt()`, so later
+    lookups by `id`, `channel_id`, `category_id` or `meta_code` can skip the
+    database.  Commits write through with `put()` once they have succeeded
+    and deletes call `discard()`.
+
+    The map only ever holds committed state.  It keeps its own copy of each
+    object and hands every caller a fresh copy, so a change a command has
+    made but not committed, or whose commit failed, is never seen by other
+    commands or written out by their commits.
+
+    Objects are kept in least recently used order and the oldest are evicted
+    once there are more than `maxsize`.  `hits` / `misses` count the lookups
+    that were / were not answered from memory.
+    """
+
+    KEYS = ("id", "channel_id", "category_id", "meta_code")
+
+    def __init__(self, maxsize=2000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._objects: "OrderedDict[Tuple[str, int], object]" = OrderedDict()
+        self._keys: Dict[Tuple[str, str, object], int] = {}  # (table, attr, value) -> id
+        self._object_keys: Dict[Tuple[str, int], list] = {}  # (table, id) -> its entries in _keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, table, attr, value):
+        """Copy of the cached object whose `attr` is `value`, or None"""
+        with self._lock:
+            if attr == "id":
+                object_id = value
+            else:
+                object_id = self._keys.get((table, attr, value))
+            data = self._objects.get((table, object_id))
+            # The key may be stale if the attribute was changed since it was cached
+            if data is None or getattr(data, attr, None) != value:
+                self.misses += 1
+                return None
+            self._objects.move_to_end((table, object_id))
+            self.hits += 1
+            return data.copy()
+
+    def peek(self, table, object_id):
+        """Copy of the cached object by id, without counting towards the hit rate"""
+        with self._lock:
+            data = self._objects.get((table, object_id))
+            return None if data is None else data.copy()
+
+    def adopt(self, table, data):
+        """Object to hand out for a freshly loaded row
+
+        A copy of `data` is cached, unless the row is cached already, and
+        `data` itself is returned.
+        """
+        with self._lock:
+            if (table, data.id) in self._objects:
+                self._objects.move_to_end((table, data.id))
+            else:
+                self._store(table, data.copy())
+            return data
+
+    def put(self, table, data):
+        """Cache a copy of `data` after it has been committed, replacing any older copy"""
+        with self._lock:
+            self._store(table, data.copy())
+
+    def discard(self, table, object_id):
+        with self._lock:
+            self._drop(table, object_id)
+
+    def discard_if(self, table, predicate: Callable):
+        """Drop every cached object in `table` that `predicate` is true for"""
+        with self._lock:
+            for _, object_id in [key for key, data in self._objects.items() if key[0] == table and predicate(data)]:
+                self._drop(table, object_id)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+            self._keys.clear()
+            self._object_keys.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._objects),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": f"{self.hits / lookups:.1%}" if lookups else "n/a",
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._objects)
+
+    def _store(self, table, data):
+        if not data.id:
+            return
+        self._drop(table, data.id)
+        self._objects[(table, data.id)] = data
+        keys = []
+        for attr in self.KEYS[1:]:
+            value = getattr(data, attr, None)
+            if value:
+                self._keys[(table, attr, value)] = data.id
+                keys.append((table, attr, value))
+        self._object_keys[(table, data.id)] = keys
+        while len(self._objects) > self.maxsize:
+            (old_table, old_id), _ = self._objects.popitem(last=False)
+            self._drop_keys(old_table, old_id)
+            self.evictions += 1
+
+    def _drop(self, table, object_id):
+        if self._objects.pop((table, object_id), None) is not None:
+            self._drop_keys(table, object_id)
+
+    def _drop_keys(self, table, object_id):
+        for key in self._object_keys.pop((table, object_id), []):
+            if self._keys.get(key) == object_id:
+                del self._keys[key]
@@ -0,0 +1,34 @@
+from dataclasses import dataclass, field
+from .base_data import _BaseData, slotted
+import datetime
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@slotted
+@dataclass
+class JobData(_BaseData):
+    """A side effect of a command (a sheet update, channel move, ...) queued to run in the background
+
+    `kind` names the handler and `payload` holds its arguments, as JSON in
+    the `jobs` table so queued jobs survive a restart.  Jobs for one puzzle
+    channel run in order of id, see JobQueue.sequence.
+    """
+    id: int = 0
+    hunt_id: int = 0
+    kind: str = ""
+    payload: dict = field(default_factory=dict)
+    status: str = "pending"  # pending, running, done or failed
+    attempts: int = 0
+    last_error: str = ""
+    run_time: Optional[datetime.datetime] = None  # not before this, when retrying
+    created_time: Optional[datetime.datetime] = None
+    finish_time: Optional[datetime.datetime] = None
+
+    JSON_FIELDS = ("payload",)
+
+    def __str__(self):
+        arguments = ", ".join(f"{key}={value}" for key, value in self.payload.items())
+        return f"#{self.id} {self.kind}({arguments})"
@@ -0,0 +1,174 @@
+"""
+Versioned schema migrations for the MySQL store
+
+Each migration is a module in this package named `vNNNN_description.py` with
+a `VERSION` number, a one line `DESCRIPTION` and an `upgrade(cursor)`
+function.  Applied versions are recorded in the `schema_version` table, so
+`SchemaDb.migrate()` only runs the ones a database has not seen yet:
+
+python -m bot.scripts.database.migrate           # apply pending migrations
+python -m bot.scripts.database.migrate --status  # show version, pending migrations and missing indexes
+
+Migrations should be safe to run against the hand-built databases that
+predate them, so tables are created with IF NOT EXISTS and indexes are added
+with `ensure_index`, which does nothing if an index already covers the columns.
+A migration that moves data as well puts that step in `copy_data(cursor)`,
+in SQL SQLite accepts too, so the SQLite schema can run it.
+"""
+import importlib
+import logging
+import pkgutil
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Indexes the store queries rely on, as (table, name, columns).  An existing
+# index whose leading columns match counts, whatever it is called.
+EXPECTED_INDEXES = [
+    # get_by_attr(channel_id=...), get_channel_type
+    ("puzzles", "ix_puzzles_channel_id", ("channel_id",)),
+    # check_duplicates_in_hunt, get_all_from_hunt
+    ("puzzles", "ix_puzzles_hunt_id_name", ("hunt_id", "name")),
+    # get_solved_puzzles_to_archive
+    ("puzzles", "ix_puzzles_archive_candidates", ("hunt_id", "solved", "archive_time", "solve_time")),
+    # hydrating tags by puzzle, and the tag diff on commit
+    ("tags", "ix_tags_puzzle_id_round_id", ("puzzle_id", "round_id")),
+    # get_all_from_round, deleting a round's tags
+    ("tags", "ix_tags_round_id_puzzle_id", ("round_id", "puzzle_id")),
+    # get_by_attr(category_id=...), get_channel_type
+    ("rounds", "ix_rounds_category_id", ("category_id",)),
+    # get_by_attr(meta_code=...), commit_with_uid('meta_code')
+    ("rounds", "uq_rounds_meta_code", ("meta_code",)),
+    # get_by_attr(meta_id=...)
+    ("rounds", "ix_rounds_meta_id", ("meta_id",)),
+    # check_duplicates_in_hunt, get_all(hunt_id)
+    ("rounds", "ix_rounds_hunt_id_name", ("hunt_id", "name")),
+    # get_by_attr(channel_id=...), get_channel_type
+    ("hunts", "ix_hunts_channel_id", ("channel_id",)),
+    # get_channel_type
+    ("hunts", "ix_hunts_category_id", ("category_id",)),
+    # commit_with_uid('uid')
+    ("hunts", "uq_hunts_uid", ("uid",)),
+    # check_duplicates(name)
+    ("hunts", "ix_hunts_name", ("name",)),
+    # hydrating additional sheets by puzzle
+    ("additional_sheets", "ix_additional_sheets_puzzle_id", ("puzzle_id",)),
+    # NotesDb.get_by_puzzle
+    ("puzzle_notes", "ix_puzzle_notes_puzzle_id", ("puzzle_id",)),
+    # JobsDb.get_pending, counts
+    ("jobs", "ix_jobs_status_id", ("status", "id")),
+    # GuildSettingsDb.get
+    ("guilds", "ix_guilds_guild_id", ("guild_id",)),
+]
+
+
+def load_migrations() -> list:
+    """All migration modules in this package, oldest first"""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if module_info.name.startswith("v"):
+            migrations.append(importlib.import_module(f"{__name__}.{module_info.name}"))
+    return sorted(migrations, key=lambda migration: migration.VERSION)
+
+
+def table_indexes(cursor, table, unique_only=False) -> dict:
+    """Index name -> tuple of columns for a table in the current database"""
+    cursor.execute("SELECT index_name AS index_name, column_name AS column_name FROM information_schema.statistics "
+                   "WHERE table_schema = DATABASE() AND table_name = %s "
+                   f"{'AND non_unique = 0 ' if unique_only else ''}"
+                   "ORDER BY index_name, seq_in_index", (table,))
+    indexes = {}
+    for row in cursor.fetchall():
+        index_name, column_name = (row['index_name'], row['column_name']) if isinstance(row, dict) else row
+        indexes.setdefault(index_name, ())
+        indexes[index_name] += (column_name,)
+    return indexes
+
+
+def has_index(indexes: dict, columns) -> bool:
+    columns = tuple(columns)
+    return any(existing[:len(columns)] == columns for existing in indexes.values())
+
+
+def ensure_index(cursor, table, name, columns, unique=False) -> bool:
+    """Create an index unless one already covers `columns`, returns True if one was created
+
+    With `unique`, only an existing unique index on exactly these columns counts.
+    """
+    if unique:
+        if tuple(columns) in table_indexes(cursor, table, unique_only=True).values():
+            return False
+    elif has_index(table_indexes(cursor, table), columns):
+        return False
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX `{name}` ON `{table}` ({column_list})")
+    logger.info(f"Created index {name} on {table} ({column_list})")
+    return True
+
+
+def drop_index(cursor, table, name) -> bool:
+    """Drop an index by name if it exists, returns True if one was dropped"""
+    if name not in table_indexes(cursor, table):
+        return False
+    cursor.execute(f"DROP INDEX `{name}` ON `{table}`")
+    logger.info(f"Dropped index {name} on {table}")
+    return True
+
+
+class SchemaDb:
+    """Applies migrations and checks indexes, through the same pool as the other stores"""
+
+    def __init__(self, mydb):
+        self.mydb = mydb
+
+    def current_version(self) -> int:
+        cursor = self.mydb.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS `schema_version` ("
+                       "`version` INT NOT NULL PRIMARY KEY, "
+                       "`description` VARCHAR(255) NOT NULL DEFAULT '', "
+                       "`applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] or 0
+
+    def pending(self) -> list:
+        version = self.current_version()
+        return [migration for migration in load_migrations() if migration.VERSION > version]
+
+    def migrate(self) -> List[int]:
+        """Apply every pending migration in order, returns the versions applied"""
+        applied = []
+        for migration in self.pending():
+            logger.info(f"Applying migration {migration.VERSION}: {migration.DESCRIPTION}")
+            cursor = self.mydb.cursor(dictionary=True)
+            migration.upgrade(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                           (migration.VERSION, migration.DESCRIPTION))
+            cursor.close()
+            self.mydb.commit()
+            applied.append(migration.VERSION)
+        return applied
+
+    def missing_indexes(self) -> List[Tuple[str, str, tuple]]:
+        cursor = self.mydb.cursor(dictionary=True)
+        indexes = {}
+        missing = []
+        for table, name, columns in EXPECTED_INDEXES:
+            if table not in indexes:
+                indexes[table] = table_indexes(cursor, table)
+            if not has_index(indexes[table], columns):
+                missing.append((table, name, columns))
+        cursor.close()
+        return missing
+
+    def check(self):
+        """Warn about pending migrations and missing indexes, run when the bot starts"""
+        pending = self.pending()
+        if pending:
+            logger.warning(f"Database is missing migrations {[migration.VERSION for migration in pending]}, "
+                           f"run `python -m bot.scripts.database.migrate`")
+        missing = self.missing_indexes()
+        for table, name, columns in missing:
+            logger.warning(f"Missing index {name} on {table} ({', '.join(columns)}), lookups on it scan the table")
+        return pending, missing
@@ -0,0 +1,122 @@
+"""
+Tables used by mysqldb.py, with indexes for the store lookups
+
+The production database was built by hand before this existed, so every
+table is created only if missing and indexes are only added where there is
+not one covering the same columns already.
+"""
+from bot.store.migrations import ensure_index
+
+VERSION = 1
+DESCRIPTION = "Initial schema and lookup indexes"
+
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+TABLES = {
+    "guilds": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `guild_id` BIGINT UNSIGNED NOT NULL,
+        `guild_name` VARCHAR(100) NULL,
+        `website_url` VARCHAR(255) NULL,
+        `discord_bot_channel` VARCHAR(100) NULL,
+        `discord_bot_emoji` VARCHAR(100) NULL,
+        `discord_use_voice_channels` TINYINT(1) NULL DEFAULT 0,
+        `drive_parent_id` VARCHAR(255) NULL,
+        `drive_resources_id` VARCHAR(255) NULL
+    """,
+    "hunts": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `name` VARCHAR(255) NOT NULL DEFAULT '',
+        `uid` VARCHAR(6) NULL,
+        `category_id` BIGINT UNSIGNED NULL,
+        `channel_id` BIGINT UNSIGNED NULL,
+        `guild_id` BIGINT UNSIGNED NULL,
+        `google_sheet_id` VARCHAR(255) NULL,
+        `archive_google_sheet_id` VARCHAR(255) NULL,
+        `url` VARCHAR(512) NULL,
+        `url_sep` VARCHAR(8) NULL DEFAULT '-',
+        `puzzle_prefix` VARCHAR(64) NULL,
+        `parallel_hunt` TINYINT(1) NULL DEFAULT 0,
+        `role_id` BIGINT UNSIGNED NULL,
+        `num_rounds` INT NULL DEFAULT 0,
+        `start_timestamp` BIGINT NULL DEFAULT 0,
+        `username` VARCHAR(255) NULL,
+        `password` VARCHAR(255) NULL,
+        `start_time` DATETIME NULL,
+        `solve_time` DATETIME NULL,
+        `archive_time` DATETIME NULL
+    """,
+    "rounds": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `name` VARCHAR(255) NOT NULL DEFAULT '',
+        `hunt_id` INT NULL,
+        `category_id` BIGINT UNSIGNED NULL,
+        `meta_id` INT NULL,
+        `meta_code` VARCHAR(6) NULL,
+        `type` VARCHAR(32) NULL,
+        `start_time` DATETIME NULL,
+        `solve_time` DATETIME NULL,
+        `archive_time` DATETIME NULL
+    """,
+    "puzzles": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `name` VARCHAR(255) NOT NULL DEFAULT '',
+        `hunt_id` INT NULL,
+        `channel_id` BIGINT UNSIGNED NULL,
+        `channel_mention` VARCHAR(64) NULL,
+        `channel_name` VARCHAR(100) NULL,
+        `voice_channel_id` BIGINT UNSIGNED NULL,
+        `url` VARCHAR(512) NULL,
+        `google_page_id` VARCHAR(255) NULL,
+        `metapuzzle` TINYINT(1) NULL DEFAULT 0,
+        `metameta` TINYINT(1) NULL DEFAULT 0,
+        `status` VARCHAR(32) NULL,
+        `solved` TINYINT(1) NULL DEFAULT 0,
+        `archived` TINYINT(1) NULL DEFAULT 0,
+        `solution` VARCHAR(255) NULL,
+        `priority` VARCHAR(32) NULL,
+        `puzzle_type` VARCHAR(64) NULL,
+        `notes` TEXT NULL,
+        `start_time` DATETIME NULL,
+        `solve_time` DATETIME NULL,
+        `archive_time` DATETIME NULL
+    """,
+    "tags": """
+        `puzzle_id` INT NOT NULL,
+        `round_id` INT NOT NULL,
+        PRIMARY KEY (`puzzle_id`, `round_id`)
+    """,
+    "additional_sheets": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `google_page_id` VARCHAR(255) NULL,
+        `puzzle_id` INT NULL,
+        `puzzle` TINYINT(1) NULL DEFAULT 0,
+        `puzzle_name` VARCHAR(255) NULL,
+        `solution` VARCHAR(255) NULL,
+        `solved` TINYINT(1) NULL DEFAULT 0
+    """,
+}
+
+INDEXES = [
+    ("puzzles", "ix_puzzles_channel_id", ("channel_id",)),
+    ("puzzles", "ix_puzzles_hunt_id_name", ("hunt_id", "name")),
+    ("tags", "ix_tags_puzzle_id_round_id", ("puzzle_id", "round_id")),
+    ("tags", "ix_tags_round_id_puzzle_id", ("round_id", "puzzle_id")),
+    ("rounds", "ix_rounds_category_id", ("category_id",)),
+    ("rounds", "ix_rounds_meta_code", ("meta_code",)),
+    ("rounds", "ix_rounds_meta_id", ("meta_id",)),
+    ("rounds", "ix_rounds_hunt_id_name", ("hunt_id", "name")),
+    ("hunts", "ix_hunts_channel_id", ("channel_id",)),
+    ("hunts", "ix_hunts_category_id", ("category_id",)),
+    ("hunts", "ix_hunts_uid", ("uid",)),
+    ("hunts", "ix_hunts_name", ("name",)),
+    ("additional_sheets", "ix_additional_sheets_puzzle_id", ("puzzle_id",)),
+    ("guilds", "ix_guilds_guild_id", ("guild_id",)),
+]
+
+
+def upgrade(cursor):
+    for table, columns in TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS `{table}` ({columns}) {TABLE_OPTIONS}")
+    for table, name, columns in INDEXES:
+        ensure_index(cursor, table, name, columns)
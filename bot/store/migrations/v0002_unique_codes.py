@@ -0,0 +1,20 @@
+"""
+Make rounds.meta_code and hunts.uid unique
+
+commit_with_uid relies on the unique index to reserve a new code, rather
+than checking for duplicates before every attempt.  Rounds and hunts that
+never got a code are set to NULL, which a unique index allows any number of.
+"""
+from bot.store.migrations import drop_index, ensure_index
+
+VERSION = 2
+DESCRIPTION = "Unique rounds.meta_code and hunts.uid"
+
+
+def upgrade(cursor):
+    cursor.execute("UPDATE rounds SET meta_code = NULL WHERE meta_code IN ('', '0')")
+    cursor.execute("UPDATE hunts SET uid = NULL WHERE uid = ''")
+    ensure_index(cursor, "rounds", "uq_rounds_meta_code", ("meta_code",), unique=True)
+    drop_index(cursor, "rounds", "ix_rounds_meta_code")
+    ensure_index(cursor, "hunts", "uq_hunts_uid", ("uid",), unique=True)
+    drop_index(cursor, "hunts", "ix_hunts_uid")
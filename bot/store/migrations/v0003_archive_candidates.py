@@ -0,0 +1,14 @@
+"""
+Index for finding solved puzzles that still need archiving
+
+get_solved_puzzles_to_archive filters on these columns in the query, so the
+archive loop only reads the handful of candidate rows in each hunt.
+"""
+from bot.store.migrations import ensure_index
+
+VERSION = 3
+DESCRIPTION = "Index puzzles by hunt, solved, archive_time and solve_time"
+
+
+def upgrade(cursor):
+    ensure_index(cursor, "puzzles", "ix_puzzles_archive_candidates", ("hunt_id", "solved", "archive_time", "solve_time"))
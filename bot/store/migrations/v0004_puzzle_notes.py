@@ -0,0 +1,57 @@
+"""
+Notes as rows in their own table
+
+Notes used to be a JSON list in `puzzles.notes`, so every `!note` rewrote
+the whole list.  Each note is now a row, added and deleted on its own and
+only read by the commands that show notes.  The existing lists are copied
+over; `puzzles.notes` is left in place but no longer written.
+"""
+import json
+
+from bot.store.migrations import ensure_index
+
+VERSION = 4
+DESCRIPTION = "Move puzzle notes into the puzzle_notes table"
+
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+TABLES = {
+    "puzzle_notes": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `puzzle_id` INT NOT NULL,
+        `text` TEXT NULL,
+        `author` VARCHAR(100) NULL,
+        `jump_url` VARCHAR(255) NULL,
+        `created_time` DATETIME NULL
+    """,
+}
+
+
+def split_note(note: str):
+    """(text, jump_url) from a note in the old `text - jump_url` form"""
+    text, sep, jump_url = note.rpartition(" - ")
+    if sep and jump_url.startswith("https://"):
+        return text, jump_url
+    return note, ""
+
+
+def copy_data(cursor):
+    """Copy the notes lists from `puzzles.notes` into `puzzle_notes`, oldest note first"""
+    cursor.execute("SELECT id, notes FROM puzzles WHERE notes IS NOT NULL AND notes NOT IN ('', '[]')")
+    note_rows = []
+    for row in cursor.fetchall():
+        try:
+            notes = json.loads(row['notes'])
+        except ValueError:
+            continue
+        for note in notes:
+            note_rows.append((row['id'],) + split_note(str(note)))
+    if note_rows:
+        cursor.executemany("INSERT INTO puzzle_notes (puzzle_id, text, jump_url) VALUES (%s, %s, %s)", note_rows)
+
+
+def upgrade(cursor):
+    for table, columns in TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS `{table}` ({columns}) {TABLE_OPTIONS}")
+    ensure_index(cursor, "puzzle_notes", "ix_puzzle_notes_puzzle_id", ("puzzle_id",))
+    copy_data(cursor)
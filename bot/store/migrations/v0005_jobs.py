@@ -0,0 +1,34 @@
+"""
+Queue of background jobs
+
+Commands commit their changes and reply straight away, and queue their slow
+side effects (sheet updates, channel moves, pinned message edits) here for
+the job workers, so they survive a restart.
+"""
+from bot.store.migrations import ensure_index
+
+VERSION = 5
+DESCRIPTION = "Add the jobs table"
+
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+TABLES = {
+    "jobs": """
+        `id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `hunt_id` INT NOT NULL DEFAULT 0,
+        `kind` VARCHAR(64) NOT NULL,
+        `payload` TEXT NULL,
+        `status` VARCHAR(16) NOT NULL DEFAULT 'pending',
+        `attempts` INT NOT NULL DEFAULT 0,
+        `last_error` TEXT NULL,
+        `run_time` DATETIME NULL,
+        `created_time` DATETIME NULL,
+        `finish_time` DATETIME NULL
+    """,
+}
+
+
+def upgrade(cursor):
+    for table, columns in TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS `{table}` ({columns}) {TABLE_OPTIONS}")
+    ensure_index(cursor, "jobs", "ix_jobs_status_id", ("status", "id"))
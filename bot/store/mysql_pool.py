@@ -0,0 +1,215 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+class MySQLConnectionPool:
+    """Bounded pool of MySQL connections shared by the MySQL*Db stores
+
+    A store call checks a connection out for its whole duration with
+    `checkout()`; while it is held, `cursor()`, `commit()` and `rollback()`
+    act on that connection, so the stores keep using `self.mydb` exactly as
+    they did with a single connection.  Checkouts are per thread and re-entrant,
+    which lets a store method call other store methods.
+
+    `transaction()` groups the store calls made inside it into a single
+    transaction on the checked out connection.
+
+    Rather than pinging before every cursor, a connection is only pinged when
+    it comes out of the pool after sitting idle for longer than `idle_check`
+    seconds, and it is thrown away if a query on it fails with a connection
+    error.
+    """
+
+    def __init__(self, size=5, idle_check=30, timeout=10, **cfg):
+        self._cfg = cfg
+        self.size = size
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self._cfg)
+        conn.autocommit = True
+        return conn
+
+    def _acquire(self):
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._open < self.size
+                if create:
+                    self._open += 1
+                else:
+                    self.waits += 1
+            if create:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            try:
+                conn, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeoutError(f"No MySQL connection free after {self.timeout}s (pool size {self.size})")
+
+        if time.monotonic() - last_used > self.idle_check:
+            conn = self._check(conn)
+        return conn
+
+    def _check(self, conn):
+        """Make sure a connection that has been idle for a while is still alive"""
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except errors.Error:
+            logger.info("Idle MySQL connection dropped, reconnecting")
+            with self._lock:
+                self.reconnects += 1
+            try:
+                conn.reconnect(attempts=2, delay=1)
+                conn.autocommit = True
+                return conn
+            except errors.Error:
+                self._discard(conn)
+                raise
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _release(self, conn):
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def checkout(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            # Nested store call on the same thread, reuse the connection
+            yield conn
+            return
+
+        conn = self._acquire()
+        with self._lock:
+            self.checkouts += 1
+        self._local.conn = conn
+        try:
+            yield conn
+        except (errors.OperationalError, errors.InterfaceError):
+            self._local.conn = None
+            self._discard(conn)
+            raise
+        except Exception:
+            self._local.conn = None
+            self._release(conn)
+            raise
+        else:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the block as one transaction on this thread's connection
+
+        Re-entrant: a nested transaction() joins the outer one.  While it is
+        open `commit()` does nothing, so store methods that commit after each
+        statement become part of the enclosing unit of work, and callbacks
+        registered with `after_commit` / `after_rollback` are held until the
+        outcome is known.
+        """
+        with self.checkout() as conn:
+            if getattr(self._local, "transaction", None) is not None:
+                yield conn
+                return
+            conn.start_transaction()
+            callbacks = self._local.transaction = ([], [])
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                self._local.transaction = None
+                try:
+                    conn.rollback()
+                except errors.Error:
+                    logger.exception("Rollback failed")
+                for callback in callbacks[1]:
+                    callback()
+                raise
+            self._local.transaction = None
+            for callback in callbacks[0]:
+                callback()
+
+    def after_commit(self, callback):
+        """Call `callback` once the current transaction commits, or straight away outside one"""
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is None:
+            callback()
+        else:
+            transaction[0].append(callback)
+
+    def after_rollback(self, callback):
+        """Call `callback` if the current transaction is rolled back"""
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is not None:
+            transaction[1].append(callback)
+
+    def _current(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            raise RuntimeError("No MySQL connection checked out, wrap the call in pool.checkout()")
+        return conn
+
+    def cursor(self, *args, **kwargs):
+        return self._current().cursor(*args, **kwargs)
+
+    def commit(self):
+        conn = self._current()
+        if getattr(self._local, "transaction", None) is not None:
+            # Committed when the enclosing transaction() ends
+            return
+        return conn.commit()
+
+    def rollback(self):
+        return self._current().rollback()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "reconnects": self.reconnects,
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
@@ -7,12 +7,15 @@ import logging
 from pathlib import Path
 from typing import List
 import re
+from dataclasses import fields
 
 import pytz
-from .puzzle_data import _PuzzleJsonDb, PuzzleData, MissingPuzzleError, AdditionalSheetData
+from mysql.connector import errors, errorcode
+from .puzzle_data import _PuzzleJsonDb, PuzzleData, MissingPuzzleError, AdditionalSheetData, NoteData
 from .round_data import _RoundJsonDb, RoundData, MissingRoundError
 from .hunt_data import _HuntJsonDb, HuntData, MissingHuntError
 from .puzzle_settings import _GuildSettingsDb, GuildSettings
+from .job_data import JobData
 
 logger = logging.getLogger(__name__)
 
@@ -26,28 +29,77 @@ def discord_channel_slug(name):
 
 class _MySQLBaseDb:
     TABLE_NAME = None
+    DATA_CLASS = None
     SPECIAL_ATTR = []
     mydb = None
+    index = None
+    cache = None
 
-    def __init__(self, mydb):
+    def __init__(self, mydb, index=None, cache=None):
         self.mydb = mydb
+        self.index = index
+        self.cache = cache
+
+    def _cached(self, keyword, value):
+        """Object from the identity map, or None if it has to be loaded"""
+        if self.cache is None or keyword not in self.cache.KEYS:
+            return None
+        return self.cache.get(self.TABLE_NAME, keyword, value)
+
+    def _adopt(self, data):
+        """Route a freshly loaded object through the identity map"""
+        if self.cache is None:
+            return data
+        return self.cache.adopt(self.TABLE_NAME, data)
+
+    def construct_many(self, rows) -> list:
+        return [self._adopt(self.DATA_CLASS.import_dict(row)) for row in rows]
+
+    def get_many(self, **kwargs) -> list:
+        """Retrieve every object matching a list of values in one query, e.g. get_many(channel_ids=[...])
+
+        The keyword is the column name made plural.  Only first sent attribute
+        processed, objects already in the identity map are not queried for.
+        """
+        keyword, values = kwargs.popitem()
+        column = keyword[:-1] if keyword.endswith("s") else keyword
+        found = []
+        missing = []
+        for value in dict.fromkeys(values):
+            cached = self._cached(column, value)
+            if cached is not None:
+                found.append(cached)
+            else:
+                missing.append(value)
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            cursor = self.mydb.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM `{self.TABLE_NAME}` WHERE `{column}` IN ({placeholders})", tuple(missing))
+            rows = cursor.fetchall()
+            cursor.close()
+            found.extend(self.construct_many(rows))
+        return found
+
+    def _column_value(self, value):
+        if type(value) in (list, dict):
+            # Sorted, so equal payloads are equal text, see MySQLJobsDb.enqueue
+            return json.dumps(value, sort_keys=True)
+        return value
 
     def commit(self, object_to_commit):
+        """Insert a new object, or update only the columns changed since it was loaded"""
+        database_id = object_to_commit.id
+        if database_id > 0:
+            field_list = [attr for attr in object_to_commit.dirty_fields()
+                          if attr not in self.SPECIAL_ATTR and attr != "id"]
+            if not field_list:
+                object_to_commit.mark_clean()
+                return
+        else:
+            field_list = [f.name for f in fields(object_to_commit)
+                          if f.name not in self.SPECIAL_ATTR and f.name != "id"]
+        data = tuple(self._column_value(getattr(object_to_commit, attr)) for attr in field_list)
         cursor = self.mydb.cursor()
-        data = ()
-        field_list = []
-        database_id = 0
-        for attr, value in object_to_commit.__dict__.items():
-            if attr in self.SPECIAL_ATTR:
-                continue
-            if attr == "id":
-                database_id = value
-            else:
-                if type(value) is list:
-                    data += (json.dumps(value),)
-                else:
-                    data += (value,)
-                field_list.append(attr)
         if database_id > 0:
             update_stmt = f"UPDATE `{self.TABLE_NAME}` SET "
             for field in field_list:
@@ -69,6 +121,56 @@ class _MySQLBaseDb:
             object_to_commit.id = cursor.lastrowid
         cursor.close()
         self.mydb.commit()
+        if database_id == 0:
+            self.mydb.after_rollback(lambda: setattr(object_to_commit, "id", 0))
+        self.mydb.after_commit(lambda: self._committed(object_to_commit))
+
+    def commit_many(self, objects):
+        """Commit several objects in one transaction
+
+        Changed rows are written with one multi-row UPDATE per set of changed
+        columns, rather than one per object.  New objects still need their
+        own INSERT to get their ids back.
+        """
+        if not objects:
+            return
+        updates = {}
+        with self.mydb.transaction():
+            for object_to_commit in objects:
+                if object_to_commit.id == 0:
+                    self.commit(object_to_commit)
+                    continue
+                field_list = tuple(attr for attr in object_to_commit.dirty_fields()
+                                   if attr not in self.SPECIAL_ATTR and attr != "id")
+                updates.setdefault(field_list, []).append(object_to_commit)
+            cursor = self.mydb.cursor()
+            for field_list, group in updates.items():
+                if field_list:
+                    cursor.execute(*self._bulk_update(field_list, group))
+                for object_to_commit in group:
+                    self.mydb.after_commit(lambda object_to_commit=object_to_commit: self._committed(object_to_commit))
+            cursor.close()
+            self.mydb.commit()
+
+    def _bulk_update(self, field_list, group):
+        """UPDATE setting `field_list` on every object in `group`, as (statement, data)"""
+        sets = []
+        data = ()
+        for field in field_list:
+            sets.append(f"`{field}` = CASE `id` " + "WHEN %s THEN %s " * len(group) + "END")
+            for object_to_commit in group:
+                data += (object_to_commit.id, self._column_value(getattr(object_to_commit, field)))
+        ids = tuple(object_to_commit.id for object_to_commit in group)
+        update_stmt = (f"UPDATE `{self.TABLE_NAME}` SET {', '.join(sets)} "
+                       f"WHERE `id` IN ({', '.join(['%s'] * len(ids))})")
+        return update_stmt, data + ids
+
+    def _committed(self, object_to_commit):
+        object_to_commit.mark_clean()
+        if self.index is not None:
+            self.index.add(object_to_commit)
+        if self.cache is not None:
+            self.cache.put(self.TABLE_NAME, object_to_commit)
 
     def delete(self, delete_id):
         """Delete single puzzle from database by database id"""
@@ -76,9 +178,28 @@ class _MySQLBaseDb:
         cursor.execute(f"DELETE FROM `{self.TABLE_NAME}` WHERE id = %s", (delete_id,))
         deleted_rows = cursor.rowcount
         cursor.close()
+        if self.index is not None:
+            self.index.discard(self.TABLE_NAME, delete_id)
+        if self.cache is not None:
+            self.cache.discard(self.TABLE_NAME, delete_id)
         # if deleted_rows != 1:S
         #     raise MissingDataError(f"Unable to find puzzle {puzzle_id} for {round_id}")
 
+    def delete_many(self, delete_ids):
+        """Delete several rows by database id in one statement"""
+        delete_ids = tuple(delete_ids)
+        if not delete_ids:
+            return
+        cursor = self.mydb.cursor()
+        cursor.execute(f"DELETE FROM `{self.TABLE_NAME}` WHERE id IN ({', '.join(['%s'] * len(delete_ids))})",
+                       delete_ids)
+        cursor.close()
+        for delete_id in delete_ids:
+            if self.index is not None:
+                self.index.discard(self.TABLE_NAME, delete_id)
+            if self.cache is not None:
+                self.cache.discard(self.TABLE_NAME, delete_id)
+
     def check_duplicates(self, value, field = 'name'):
         """Ensures no duplicate name by default but can check any field if passed"""
         cursor = self.mydb.cursor(dictionary=True)
@@ -87,34 +208,77 @@ class _MySQLBaseDb:
         cursor.close()
         return found
 
-    def generate_uid(self, field = 'id', chars = 6, input = None):
+    def _uid_seed(self, chars, input):
         code = ""
         if input is not None:
             split_input = input.split()
             for word in split_input:
                 if word[:2].isascii():
                     code += word[:2].upper()
-            code = code[:6]
+            code = code[:chars]
 
         while len(code) < chars:
             code += random.choice(string.ascii_letters).upper()
+        return code
 
+    def _uid_candidates(self, code, chars):
+        """Codes to try in turn: the seed, then new last letters, then new last two and three letters"""
+        yield code
         loop_count = 0
-
-        while self.check_duplicates(code, field):
+        while True:
             loop_count += 1
             if loop_count < 26:
-                code = code[:5] + random.choice(string.ascii_letters).upper()
+                keep = chars - 1
             elif loop_count < 512:
-                code = code[:4]
-                while len(code) < 6:
-                    code += random.choice(string.ascii_letters).upper()
+                keep = chars - 2
             else:
-                code = code[:3]
-                while len(code) < 6:
-                    code += random.choice(string.ascii_letters).upper()
+                keep = chars - 3
+            code = code[:keep]
+            while len(code) < chars:
+                code += random.choice(string.ascii_letters).upper()
+            yield code
+
+    def _taken_uids(self, field, prefix) -> set:
+        """Every existing code in `field` starting with `prefix`, i.e. all the candidates could clash with"""
+        # An explicit escape character, as SQLite has no default one
+        pattern = prefix.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+        cursor = self.mydb.cursor()
+        cursor.execute(f"SELECT `{field}` FROM `{self.TABLE_NAME}` WHERE `{field}` LIKE %s ESCAPE '!'", (pattern,))
+        taken = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        return taken
 
-        return code
+    def generate_uid(self, field = 'id', chars = 6, input = None):
+        """Unused code for `field`, checked against the existing codes in one query
+
+        The code is not reserved, use commit_with_uid to set it on an object
+        and save it without racing another command for the same code.
+        """
+        code = self._uid_seed(chars, input)
+        taken = self._taken_uids(field, code[:chars - 3])
+        return next(candidate for candidate in self._uid_candidates(code, chars) if candidate not in taken)
+
+    def commit_with_uid(self, object_to_commit, field, chars = 6, input = None, attempts = 5):
+        """Set an unused code in `field` and commit, returning the code
+
+        Candidates are generated locally against one query for the existing
+        codes sharing their prefix.  The unique index on `field` does the
+        reservation: if another command takes the same code first the commit
+        fails with a duplicate key and the next candidate is tried.
+        """
+        code = self._uid_seed(chars, input)
+        taken = self._taken_uids(field, code[:chars - 3])
+        candidates = (candidate for candidate in self._uid_candidates(code, chars) if candidate not in taken)
+        for attempt in range(attempts):
+            setattr(object_to_commit, field, next(candidates))
+            try:
+                self.commit(object_to_commit)
+                return getattr(object_to_commit, field)
+            except errors.IntegrityError as err:
+                if err.errno != errorcode.ER_DUP_ENTRY or attempt == attempts - 1:
+                    raise
+                logger.info(f"{self.TABLE_NAME}.{field} {getattr(object_to_commit, field)} taken, trying another")
+                taken.add(getattr(object_to_commit, field))
 
     def check_duplicates_in_hunt(self, name, hunt_data: HuntData) -> bool:
         cursor = self.mydb.cursor(dictionary=True)
@@ -125,21 +289,26 @@ class _MySQLBaseDb:
 
 class MySQLHuntJsonDb(_MySQLBaseDb):
     TABLE_NAME = 'hunts'
+    DATA_CLASS = HuntData
     def get_by_attr(self,**kwargs):
         """Retrieve Hunt by attribute.  Only first sent attribute processed"""
         keyword, value = kwargs.popitem()
         if keyword:
+            cached = self._cached(keyword, value)
+            if cached is not None:
+                return cached
             cursor = self.mydb.cursor(dictionary = True)
             cursor.execute(f"SELECT * FROM `{self.TABLE_NAME}` WHERE `{keyword}` = %s", (value,))
             row = cursor.fetchone()
             if row:
-                return HuntData.import_dict(row)
+                return self._adopt(HuntData.import_dict(row))
             else:
                 print(f"Unable to find hunt for {keyword} - {value}")
                 return None
 
 class MySQLRoundJsonDb(_MySQLBaseDb):
     TABLE_NAME = 'rounds'
+    DATA_CLASS = RoundData
     def get_lowest_code_in_hunt(self, hunt_id):
         """Retrieve lower code from database return 0 if none set"""
         cursor = self.mydb.cursor(dictionary=True)
@@ -171,11 +340,14 @@ class MySQLRoundJsonDb(_MySQLBaseDb):
         """Retrieve Round by attribute.  Only first sent attribute processed"""
         keyword, value = kwargs.popitem()
         if keyword:
+            cached = self._cached(keyword, value)
+            if cached is not None:
+                return cached
             cursor = self.mydb.cursor(dictionary = True)
             cursor.execute(f"SELECT * FROM `{self.TABLE_NAME}` WHERE `{keyword}` = %s", (value,))
             row = cursor.fetchone()
             if row:
-                return RoundData.import_dict(row)
+                return self._adopt(RoundData.import_dict(row))
             else:
                 print(f"Unable to find Round for {keyword} - {value}")
                 return None
@@ -187,7 +359,7 @@ class MySQLRoundJsonDb(_MySQLBaseDb):
         cursor.execute("SELECT * FROM rounds WHERE hunt_id = %s", (hunt_id,))
         rows = cursor.fetchall()
         for row in rows:
-            round_datas.append(RoundData.import_dict(row))
+            round_datas.append(self._adopt(RoundData.import_dict(row)))
         cursor.close()
         return round_datas
         # return RoundData.sort_by_round_start(round_datas) TODO - ideally return by round start time
@@ -197,10 +369,30 @@ class MySQLRoundJsonDb(_MySQLBaseDb):
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute(f"DELETE FROM tags WHERE round_id = %s", (round_id,))
         cursor.close()
+        if self.cache is not None:
+            # Their tags changed underneath them
+            self.cache.discard_if("puzzles", lambda puzzle: round_id in puzzle.tags)
+
+    def delete_many(self, round_ids):
+        round_ids = tuple(round_ids)
+        if not round_ids:
+            return
+        super(MySQLRoundJsonDb, self).delete_many(round_ids)
+        cursor = self.mydb.cursor()
+        cursor.execute(f"DELETE FROM tags WHERE round_id IN ({', '.join(['%s'] * len(round_ids))})", round_ids)
+        cursor.close()
+        if self.cache is not None:
+            self.cache.discard_if("puzzles", lambda puzzle: any(round_id in puzzle.tags for round_id in round_ids))
 
 class MySQLAdditionalSheetsDb(_MySQLBaseDb):
     TABLE_NAME = 'additional_sheets'
 
+    def construct_many(self, rows) -> List[AdditionalSheetData]:
+        return [self.construct_sheet(row) for row in rows]
+
+    def construct_sheet(self, row) -> AdditionalSheetData:
+        return AdditionalSheetData.import_dict(row)
+
     def get_by_puzzle(self, puzzle_id):
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute(f"SELECT * FROM additional_sheets WHERE puzzle_id = %s ", (puzzle_id,))
@@ -208,15 +400,125 @@ class MySQLAdditionalSheetsDb(_MySQLBaseDb):
         cursor.close()
         return rows
 
+class MySQLNotesDb(_MySQLBaseDb):
+    """Puzzle notes, one row each, so adding or erasing a note touches only that row"""
+    TABLE_NAME = 'puzzle_notes'
+    DATA_CLASS = NoteData
+
+    def get_by_puzzle(self, puzzle_id) -> List[NoteData]:
+        """Notes on a puzzle, oldest first"""
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM puzzle_notes WHERE puzzle_id = %s ORDER BY id", (puzzle_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return self.construct_many(rows)
+
+    def commit(self, note):
+        if note.id == 0 and note.created_time is None:
+            note.created_time = datetime.datetime.now(tz=pytz.UTC)
+        super(MySQLNotesDb, self).commit(note)
+
+class MySQLJobsDb(_MySQLBaseDb):
+    """The background job queue, see bot/utils/jobs.py"""
+    TABLE_NAME = 'jobs'
+    DATA_CLASS = JobData
+
+    def enqueue(self, job) -> JobData:
+        """Add a job, unless the same job is already waiting to run, returns the queued job"""
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM jobs WHERE status = 'pending' AND hunt_id = %s AND kind = %s AND payload = %s "
+                       "ORDER BY id LIMIT 1", (job.hunt_id, job.kind, self._column_value(job.payload)))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is not None:
+            return self.DATA_CLASS.import_dict(row)
+        job.created_time = datetime.datetime.now(tz=pytz.UTC)
+        self.commit(job)
+        return job
+
+    def get_pending(self, limit=500) -> List[JobData]:
+        """Jobs waiting to run, oldest first"""
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT %s", (limit,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return self.construct_many(rows)
+
+    def get_recent(self, status, limit=10) -> List[JobData]:
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM jobs WHERE status = %s ORDER BY id DESC LIMIT %s", (status, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+        return self.construct_many(rows)
+
+    def counts(self) -> dict:
+        """Number of jobs by status"""
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status")
+        counts = {row['status']: row['jobs'] for row in cursor.fetchall()}
+        cursor.close()
+        return counts
+
+    def reset_running(self) -> int:
+        """Put jobs left running by a previous process back in the queue, returns how many"""
+        cursor = self.mydb.cursor()
+        cursor.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        reset = cursor.rowcount
+        cursor.close()
+        return reset
+
+    def delete_finished(self, before) -> int:
+        """Delete jobs that finished before a time, returns how many"""
+        cursor = self.mydb.cursor()
+        cursor.execute("DELETE FROM jobs WHERE status = 'done' AND finish_time < %s", (before,))
+        deleted = cursor.rowcount
+        cursor.close()
+        return deleted
+
 class MySQLPuzzleJsonDb(_MySQLBaseDb):
     TABLE_NAME = 'puzzles'
     SPECIAL_ATTR = ['tags', 'additional_sheets']
 
+    def __init__(self, mydb, index=None, cache=None):
+        super(MySQLPuzzleJsonDb, self).__init__(mydb, index=index, cache=cache)
+        self.sheets = MySQLAdditionalSheetsDb(mydb)
+
     def construct_puzzle(self, row):
-        puzzle = PuzzleData.import_dict(row)
-        self.get_tags(puzzle)
-        self.get_additional_sheets(puzzle)
-        return puzzle
+        return self.construct_puzzles([row])[0]
+
+    def construct_puzzles(self, rows) -> List[PuzzleData]:
+        """Build puzzles from rows, loading the tags and additional sheets for all of them in two queries
+
+        Puzzles already in the identity map are copied from it.
+        """
+        results = {}
+        puzzles = {}
+        for row in rows:
+            if row['id'] in results:
+                continue
+            cached = self.cache.peek(self.TABLE_NAME, row['id']) if self.cache is not None else None
+            if cached is None:
+                cached = puzzles[row['id']] = PuzzleData.import_dict(row)
+            results[row['id']] = cached
+        if not puzzles:
+            return list(results.values())
+        puzzle_ids = tuple(puzzles)
+        placeholders = ", ".join(["%s"] * len(puzzle_ids))
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute(f"SELECT puzzle_id, round_id FROM tags WHERE puzzle_id IN ({placeholders})", puzzle_ids)
+        for row in cursor.fetchall():
+            puzzles[row['puzzle_id']].tags.append(row['round_id'])
+        cursor.execute(f"SELECT * FROM additional_sheets WHERE puzzle_id IN ({placeholders})", puzzle_ids)
+        for row in cursor.fetchall():
+            puzzles[row['puzzle_id']].additional_sheets.append(self.sheets.construct_sheet(row))
+        cursor.close()
+        for puzzle in puzzles.values():
+            puzzle.mark_clean()
+            results[puzzle.id] = self._adopt(puzzle)
+        return list(results.values())
+
+    def construct_many(self, rows) -> List[PuzzleData]:
+        return self.construct_puzzles(rows)
 
     def get(self, guild_id, puzzle_id, round_id, hunt_id) -> PuzzleData:
         """Retrieve single puzzle from database"""
@@ -232,6 +534,9 @@ class MySQLPuzzleJsonDb(_MySQLBaseDb):
         """Retrieve puzzle by attribute.  Only first sent attribute processed"""
         keyword, value = kwargs.popitem()
         if keyword:
+            cached = self._cached(keyword, value)
+            if cached is not None:
+                return cached
             cursor = self.mydb.cursor(dictionary = True)
             cursor.execute(f"SELECT * FROM `{self.TABLE_NAME}` WHERE `{keyword}` = %s", (value,))
             row = cursor.fetchone()
@@ -243,58 +548,57 @@ class MySQLPuzzleJsonDb(_MySQLBaseDb):
 
     def get_all(self, guild_id, hunt_id="*") -> List[PuzzleData]:
         """Retrieve all puzzles from database"""
-        puzzle_datas = []
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute("SELECT puzzles.* FROM puzzles "
                        "LEFT JOIN hunts ON puzzles.hunt_id = hunts.id "
                        "WHERE hunts.guild_id = %s", (guild_id,))
         rows = cursor.fetchall()
-        for row in rows:
-            puzzle_datas.append(self.construct_puzzle(row))
         cursor.close()
-        return PuzzleData.sort_by_puzzle_start(puzzle_datas)
+        return PuzzleData.sort_by_puzzle_start(self.construct_puzzles(rows))
 
     def get_all_from_hunt(self, hunt_id) -> List[PuzzleData]:
         """Retrieve all puzzles from database"""
-        puzzle_datas = []
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute("SELECT puzzles.* FROM puzzles "
                        "WHERE hunt_id = %s", (hunt_id,))
         rows = cursor.fetchall()
-        for row in rows:
-            puzzle_datas.append(self.construct_puzzle(row))
         cursor.close()
-        return puzzle_datas
+        return self.construct_puzzles(rows)
 
     def get_all_from_round(self, round_id) -> List[PuzzleData]:
         """Retrieve all puzzles from database"""
-        puzzle_datas = []
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute("SELECT puzzles.* FROM puzzles LEFT JOIN tags ON puzzles.id = tags.puzzle_id WHERE tags.round_id = %s", (round_id,))
         rows = cursor.fetchall()
-        for row in rows:
-            puzzle_datas.append(self.construct_puzzle(row))
         cursor.close()
-        return PuzzleData.sort_by_puzzle_start(puzzle_datas)
+        return PuzzleData.sort_by_puzzle_start(self.construct_puzzles(rows))
 
     def get_solved_puzzles_to_archive(self, guild_id, now=None, include_meta=False, minutes=1) -> List[PuzzleData]:
-        """Returns list of all solved but unarchived puzzles"""
-        all_puzzles = self.get_all(guild_id)
+        """Returns list of all solved but unarchived puzzles, solved more than `minutes` ago
+
+        `guild_id` is the guilds row id, as stored in hunts.guild_id.  The filtering is done in the query, on the (hunt_id, solved,
+        archive_time, solve_time) index, so only the candidates are loaded.
+        """
         now = now or datetime.datetime.now(tz=pytz.UTC)
-        puzzles_to_archive = []
-        for puzzle in all_puzzles:
-            if puzzle.archive_time is not None:
-                # already archived
-                continue
-            if puzzle.name == "meta" and not include_meta:
-                # we usually do not want to archive meta channels, only do manually
-                continue
-            if puzzle.solved and puzzle.solve_time is not None:
-                # found a solved puzzle
-                if now - puzzle.solve_time > datetime.timedelta(minutes=minutes):
-                    # enough time has passed, archive the channel
-                    puzzles_to_archive.append(puzzle)
-        return puzzles_to_archive
+        # DATETIME columns hold naive UTC
+        cutoff = (now - datetime.timedelta(minutes=minutes)).astimezone(pytz.UTC).replace(tzinfo=None)
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute(self.archive_candidates_stmt(include_meta), (guild_id, cutoff))
+        rows = cursor.fetchall()
+        cursor.close()
+        return self.construct_puzzles(rows)
+
+    @staticmethod
+    def archive_candidates_stmt(include_meta=False) -> str:
+        """The get_solved_puzzles_to_archive query, parameters (guild row id, solve time cutoff)"""
+        stmt = ("SELECT puzzles.* FROM puzzles "
+                "JOIN hunts ON puzzles.hunt_id = hunts.id "
+                "WHERE hunts.guild_id = %s AND puzzles.solved = 1 "
+                "AND puzzles.archive_time IS NULL AND puzzles.solve_time < %s")
+        if not include_meta:
+            # we usually do not want to archive meta channels, only do manually
+            stmt += " AND puzzles.name <> 'meta'"
+        return stmt
 
     def check_duplicates_in_hunt(self, name, hunt_id) -> bool:
         cursor = self.mydb.cursor(dictionary = True)
@@ -304,58 +608,81 @@ class MySQLPuzzleJsonDb(_MySQLBaseDb):
         cursor.close()
         return found
 
-    def get_tags(self, puzzle):
-        cursor = self.mydb.cursor(dictionary=True)
-        select_stmt = f"SELECT tags.round_id FROM tags WHERE puzzle_id = {puzzle.id}"
-        cursor.execute(select_stmt)
-        rows = cursor.fetchall()
-        for row in rows:
-            puzzle.tags.append(row['round_id'])
-        cursor.close()
-
-    def get_additional_sheets(self, puzzle):
-        cursor = self.mydb.cursor(dictionary=True)
-        select_stmt = f"SELECT * FROM additional_sheets WHERE puzzle_id = {puzzle.id}"
-        cursor.execute(select_stmt)
-        rows = cursor.fetchall()
-        for row in rows:
-            sheet = AdditionalSheetData()
-            for attr, value in sheet.__dict__.items():
-                setattr(sheet, attr, row.get(attr, None))
-            puzzle.additional_sheets.append(sheet)
-        cursor.close()
-
     def commit(self, puzzle):
-        super(MySQLPuzzleJsonDb, self).commit(puzzle)
+        """Save the puzzle row, its tags and its additional sheets in one transaction
+
+        Tags are diffed against the ones loaded with the puzzle rather than
+        re-read, and only new or changed sheets are written.
+        """
+        tag_changes = self._tag_changes([puzzle])
+        with self.mydb.transaction():
+            super(MySQLPuzzleJsonDb, self).commit(puzzle)
+            self._write_tags(tag_changes)
+            for sheet in self._dirty_sheets([puzzle]):
+                self.sheets.commit(sheet)
+
+    def commit_many(self, puzzles):
+        """Save several puzzles, their tags and sheets in one transaction
+
+        The puzzle rows go through the base class's multi-row UPDATE, the tag
+        changes for all of them are one DELETE and one INSERT, and the sheets
+        are committed together.  New puzzles are committed one by one.
+        """
+        new_puzzles = [puzzle for puzzle in puzzles if puzzle.id == 0]
+        puzzles = [puzzle for puzzle in puzzles if puzzle.id != 0]
+        tag_changes = self._tag_changes(puzzles)
+        with self.mydb.transaction():
+            for puzzle in new_puzzles:
+                self.commit(puzzle)
+            super(MySQLPuzzleJsonDb, self).commit_many(puzzles)
+            self._write_tags(tag_changes)
+            self.sheets.commit_many(self._dirty_sheets(puzzles))
+
+    def _tag_changes(self, puzzles):
+        """(puzzle, tags as loaded) for each puzzle whose tags have changed, taken before committing"""
+        return [(puzzle, puzzle.clean_value("tags", [])) for puzzle in puzzles if "tags" in puzzle.dirty_fields()]
+
+    def _write_tags(self, tag_changes):
+        tags_to_remove = [(puzzle.id, tag) for puzzle, database_tags in tag_changes
+                          for tag in set(database_tags) - set(puzzle.tags)]
+        tags_to_add = [(tag, puzzle.id) for puzzle, database_tags in tag_changes
+                       for tag in set(puzzle.tags) - set(database_tags)]
+        if not tags_to_remove and not tags_to_add:
+            return
         cursor = self.mydb.cursor(dictionary=True)
-        select_stmt = f"SELECT round_id FROM tags WHERE puzzle_id = {puzzle.id}"
-        cursor.execute(select_stmt)
-        rows = cursor.fetchall()
-        database_tags = []
-        for row in rows:
-            database_tags.append(row['round_id'])
-        tags_to_remove = set(database_tags) - set(puzzle.tags)
         if len(tags_to_remove) > 0:
-            delete_stmt = f"DELETE FROM tags WHERE round_id IN ("
-            delete_stmt += f"{','.join(map(str,tags_to_remove))}"
-            delete_stmt += f") AND puzzle_id = {puzzle.id}"
-            cursor.execute(delete_stmt)
-        tags_to_add = set(puzzle.tags) - set(database_tags)
+            placeholders = ", ".join(["(%s, %s)"] * len(tags_to_remove))
+            cursor.execute(f"DELETE FROM tags WHERE (puzzle_id, round_id) IN ({placeholders})",
+                           tuple(value for pair in tags_to_remove for value in pair))
         if len(tags_to_add) > 0:
-            insert_stmt = f"INSERT INTO tags (round_id, puzzle_id) VALUES "
-            for tag in tags_to_add:
-                insert_stmt += f"({tag}, {puzzle.id}),"
-            insert_stmt = insert_stmt.rstrip(", ")
-            cursor.execute(insert_stmt)
-        cursor.close()
-        cursor = self.mydb.cursor(dictionary=True)
+            cursor.executemany("INSERT INTO tags (round_id, puzzle_id) VALUES (%s, %s)", tags_to_add)
         cursor.close()
-        self.mydb.commit()
+
+    def _dirty_sheets(self, puzzles) -> List[AdditionalSheetData]:
+        sheets = []
+        for puzzle in puzzles:
+            for sheet in puzzle.additional_sheets:
+                sheet.puzzle_id = puzzle.id
+                if sheet.is_dirty():
+                    sheets.append(sheet)
+        return sheets
 
     def delete(self, puzzle_id):
         super(MySQLPuzzleJsonDb, self).delete(puzzle_id)
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute(f"DELETE FROM tags WHERE puzzle_id = %s", (puzzle_id,))
+        cursor.execute(f"DELETE FROM puzzle_notes WHERE puzzle_id = %s", (puzzle_id,))
+        cursor.close()
+
+    def delete_many(self, puzzle_ids):
+        puzzle_ids = tuple(puzzle_ids)
+        if not puzzle_ids:
+            return
+        super(MySQLPuzzleJsonDb, self).delete_many(puzzle_ids)
+        cursor = self.mydb.cursor()
+        placeholders = ", ".join(["%s"] * len(puzzle_ids))
+        cursor.execute(f"DELETE FROM tags WHERE puzzle_id IN ({placeholders})", puzzle_ids)
+        cursor.execute(f"DELETE FROM puzzle_notes WHERE puzzle_id IN ({placeholders})", puzzle_ids)
         cursor.close()
 
 class MySQLGuildSettingsDb():
@@ -380,6 +707,39 @@ class MySQLGuildSettingsDb():
             channel_type = row['channel_type']
         return channel_type
 
+    def get_channel_index_rows(self):
+        """Rows for ChannelIndex.load, covering every hunt, round and puzzle"""
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT id, channel_id, category_id FROM hunts")
+        hunts = cursor.fetchall()
+        cursor.execute("SELECT id, hunt_id, category_id, meta_id, type FROM rounds")
+        rounds = cursor.fetchall()
+        cursor.execute("SELECT id, hunt_id, channel_id FROM puzzles")
+        puzzles = cursor.fetchall()
+        cursor.close()
+        return hunts, rounds, puzzles
+
+    def get_channel_rows(self, channel_ids):
+        """Rows for ChannelIndex.load for the hunts, rounds and puzzles using any of these channel ids"""
+        placeholders = ", ".join(["%s"] * len(channel_ids))
+        channel_ids = tuple(channel_ids)
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute("SELECT id, channel_id, category_id FROM hunts "
+                       f"WHERE channel_id IN ({placeholders}) OR category_id IN ({placeholders})",
+                       channel_ids + channel_ids)
+        hunts = cursor.fetchall()
+        cursor.execute("SELECT id, hunt_id, channel_id FROM puzzles "
+                       f"WHERE channel_id IN ({placeholders})", channel_ids)
+        puzzles = cursor.fetchall()
+        puzzle_ids = tuple(row['id'] for row in puzzles) or (0,)
+        cursor.execute("SELECT id, hunt_id, category_id, meta_id, type FROM rounds "
+                       f"WHERE category_id IN ({placeholders}) "
+                       f"OR meta_id IN ({', '.join(['%s'] * len(puzzle_ids))})",
+                       channel_ids + puzzle_ids)
+        rounds = cursor.fetchall()
+        cursor.close()
+        return hunts, rounds, puzzles
+
     def get(self, guild_id: int) -> GuildSettings:
         cursor = self.mydb.cursor(dictionary=True)
         cursor.execute("SELECT * FROM guilds WHERE guild_id = %s", (guild_id,))
@@ -392,27 +752,32 @@ class MySQLGuildSettingsDb():
         if guild_id in self.cached_settings:
             return self.cached_settings[guild_id]
         settings = self.get(guild_id)
-        self.cached_settings[guild_id] = settings
+        if settings is not None:
+            self.cached_settings[guild_id] = settings
         return settings
 
     def commit(self, settings: GuildSettings):
+        self.cached_settings[settings.guild_id] = settings
+        if settings.id > 0:
+            field_list = [attr for attr in settings.dirty_fields() if attr != "id"]
+            if field_list:
+                cursor = self.mydb.cursor()
+                update_stmt = "UPDATE `guilds` SET " + ", ".join(f"`{field}` = %s" for field in field_list) + " WHERE id=%s"
+                cursor.execute(update_stmt, tuple(getattr(settings, field) for field in field_list) + (settings.id,))
+                cursor.close()
+                self.mydb.commit()
+            settings.mark_clean()
+            return
         cursor = self.mydb.cursor()
         data = (settings.guild_id, settings.guild_name, settings.website_url,
                 settings.discord_bot_channel, settings.discord_bot_emoji, settings.discord_use_voice_channels,
                 settings.drive_parent_id, settings.drive_resources_id)
-        if settings.id > 0:
-            update_stmt = ("UPDATE `guilds` SET `guild_id`=%s,`guild_name`=%s, `website_url`=%s,"
-                           "`discord_bot_channel`=%s,`discord_bot_emoji`=%s,`discord_use_voice_channels`=%s,"
-                           "`drive_parent_id`=%s,`drive_resources_id`=%s "
-                           "WHERE id=%s")
-            data = data + (settings.id,)
-            cursor.execute(update_stmt, data)
-        else:
-            insert_stmt = ("INSERT INTO `guilds`(`guild_id`, `guild_name`, `website_url`,"
-                           "`discord_bot_channel`, `discord_bot_emoji`, `discord_use_voice_channels`, "
-                           "`drive_parent_id`, `drive_resources_id`) "
-                           "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)")
-            cursor.execute(insert_stmt, data)
-            settings.id = cursor.lastrowid
+        insert_stmt = ("INSERT INTO `guilds`(`guild_id`, `guild_name`, `website_url`,"
+                       "`discord_bot_channel`, `discord_bot_emoji`, `discord_use_voice_channels`, "
+                       "`drive_parent_id`, `drive_resources_id`) "
+                       "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)")
+        cursor.execute(insert_stmt, data)
+        settings.id = cursor.lastrowid
         cursor.close()
-        self.mydb.commit()
\ No newline at end of file
+        self.mydb.commit()
+        settings.mark_clean()
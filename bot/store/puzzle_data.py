@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
+from .base_data import _BaseData, slotted
 import datetime
 import logging
 import json
@@ -11,8 +12,9 @@ logger = logging.getLogger(__name__)
 class MissingPuzzleError(RuntimeError):
     pass
 
+@slotted
 @dataclass
-class AdditionalSheetData:
+class AdditionalSheetData(_BaseData):
     id: int = 0
     google_page_id: str = ""
     puzzle_id: int = 0
@@ -21,9 +23,25 @@ class AdditionalSheetData:
     solution: str = ""
     solved: bool = False
 
+@slotted
+@dataclass
+class NoteData(_BaseData):
+    """A note left on a puzzle with `!note`, one row each in `puzzle_notes`"""
+    id: int = 0
+    puzzle_id: int = 0
+    text: str = ""
+    author: str = ""
+    jump_url: str = ""
+    created_time: Optional[datetime.datetime] = None
+
+    def __str__(self):
+        # As notes were shown when they were kept in the puzzle row
+        return f"{self.text} - {self.jump_url}" if self.jump_url else self.text
+
 @dataclass_json
+@slotted
 @dataclass
-class PuzzleData:
+class PuzzleData(_BaseData):
     name: str = ""
     id: int = 0
     hunt_id: int = 0
@@ -42,28 +60,11 @@ class PuzzleData:
     solution: str = None
     priority: str = ""
     puzzle_type: str = ""
-    notes: List[str] = field(default_factory=list)
     start_time: Optional[datetime.datetime] = None
     solve_time: Optional[datetime.datetime] = None
     archive_time: Optional[datetime.datetime] = None
     tags: List[int] = field(default_factory=list)
 
-    @classmethod
-    def import_dict(cls, puzzle_data: dict):
-        puz = PuzzleData()
-        for attr, value in puz.__dict__.items():
-            if attr == "notes":
-                setattr(puz, attr, json.loads(puzzle_data.get(attr, None)))
-            elif attr.endswith("_time"):
-                db_date = puzzle_data.get(attr,None)
-                if db_date is not None:
-                    utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
-                    setattr(puz,attr,utc_date)
-            elif attr in puzzle_data:
-                setattr(puz, attr, puzzle_data.get(attr))
-
-        return puz
-
     @classmethod
     def sort_by_round_start(cls, puzzles: list) -> list:
         """Return list of PuzzleData objects sorted by start of round time
@@ -88,9 +89,10 @@ class PuzzleData:
     def sort_by_puzzle_start(cls, puzzles: list) -> list:
         """Return list of PuzzleData objects sorted by puzzle start time
 
-        Sorts puzzles by start_time.
+        Sorts puzzles by start_time, those without one last.
         """
-        return sorted(puzzles, key=lambda p: p.start_time)
+        earliest = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        return sorted(puzzles, key=lambda p: (p.start_time is None, p.start_time or earliest))
 
     @classmethod
     def sort_by_round_id(cls, puzzles: list) -> list:
@@ -100,6 +102,9 @@ class PuzzleData:
         """
         return sorted(puzzles, key=lambda p: p.round_id)
 
+    def is_dirty(self) -> bool:
+        return _BaseData.is_dirty(self) or any(sheet.is_dirty() for sheet in self.additional_sheets)
+
     def is_metapuzzle(self) -> bool:
         return self.metapuzzle == 1
 
@@ -3,6 +3,7 @@ from google.cloud import datastore
 from typing import Dict, List
 import datetime
 from dataclasses_json import dataclass_json
+from .base_data import _BaseData, slotted
 
 
 @dataclass_json
@@ -48,8 +49,9 @@ class HuntSettings:
 
 
 @dataclass_json
+@slotted
 @dataclass
-class GuildSettings:
+class GuildSettings(_BaseData):
     guild_id: int = 0
     id: int = 0
     guild_name: str = ""
@@ -60,22 +62,6 @@ class GuildSettings:
     drive_parent_id: str = ""
     drive_resources_id: str = ""    # Document with resources links, etc
 
-    @classmethod
-    def import_dict(cls, settings: dict):
-        r = GuildSettings()
-        for attr, value in r.__dict__.items():
-            if attr == "notes":
-                setattr(r, attr, json.loads(settings.get(attr, None)))
-            elif attr.endswith("_time"):
-                db_date = settings.get(attr,None)
-                if db_date is not None:
-                    utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
-                    setattr(r,attr,utc_date)
-            else:
-                setattr(r, attr, settings.get(attr, None))
-
-        return r
-
     def to_entity(self, client: datastore.Client):
         key = client.key('Guild', self.guild_id)
         entity = datastore.Entity(key)
@@ -90,7 +76,7 @@ class GuildSettings:
 
     @classmethod
     def from_entity(cls, entity: datastore.Entity):
-        guild = GuildSettings
+        guild = GuildSettings()
 
         guild.guild_id = entity.key.id_or_name
         guild.guild_name = entity['guild_name']
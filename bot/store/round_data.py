@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
+from .base_data import _BaseData, slotted
 import datetime
 import logging
 import json
@@ -12,35 +13,20 @@ class MissingRoundError(RuntimeError):
     pass
 
 @dataclass_json
+@slotted
 @dataclass
-class RoundData:
+class RoundData(_BaseData):
     name: str = ""
     id: int = 0
     hunt_id: int = 0
     category_id: int = 0  # round = category channel
     meta_id: int = 0
-    meta_code: int = 0
+    meta_code: Optional[str] = None
     type: str = ""
     start_time: Optional[datetime.datetime] = None
     solve_time: Optional[datetime.datetime] = None
     archive_time: Optional[datetime.datetime] = None
 
-    @classmethod
-    def import_dict(cls, round_data: dict):
-        r = RoundData()
-        for attr, value in r.__dict__.items():
-            if attr == "notes":
-                setattr(r, attr, json.loads(round_data.get(attr, None)))
-            elif attr.endswith("_time"):
-                db_date = round_data.get(attr,None)
-                if db_date is not None:
-                    utc_date = db_date.replace(tzinfo=datetime.timezone.utc)
-                    setattr(r,attr,utc_date)
-            else:
-                setattr(r, attr, round_data.get(attr, None))
-
-        return r
-
     @classmethod
     def sort_by_round_start(cls, rounds: list) -> list:
         """Return list of PuzzleData objects sorted by start of round time
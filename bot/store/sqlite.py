@@ -0,0 +1,284 @@
+"""
+Embedded SQLite storage, for `"storage": "sqlite"` in config.json
+
+The MySQL*Db stores only talk to their database through `cursor()`,
+`commit()`, `transaction()` and the after commit / rollback hooks, so rather
+than a second set of stores this module provides `SQLiteDatabase`, which
+offers the same calls as `MySQLConnectionPool` on top of a local SQLite file,
+and `SQLiteSchemaDb`, which creates the tables and indexes the stores expect.
+"""
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Tuple
+
+from mysql.connector import errors, errorcode
+
+from .migrations import EXPECTED_INDEXES, has_index, load_migrations
+
+logger = logging.getLogger(__name__)
+
+
+def _adapt_datetime(value: datetime.datetime) -> str:
+    # Stored as naive UTC, the same as the MySQL DATETIME columns
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.isoformat(" ")
+
+
+def _convert_datetime(value: bytes) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime.datetime, _adapt_datetime)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+
+
+def _dict_row(cursor, row) -> dict:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that takes mysql.connector style `%s` parameters
+
+    Unique constraint failures are raised as mysql.connector IntegrityErrors
+    with ER_DUP_ENTRY, which is what `commit_with_uid` retries on.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, dictionary=False):
+        self._cursor = conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def _translate(self, stmt):
+        return stmt.replace("%s", "?")
+
+    def execute(self, stmt, params=()):
+        try:
+            self._cursor.execute(self._translate(stmt), params)
+        except sqlite3.IntegrityError as err:
+            raise self._integrity_error(err) from err
+
+    def executemany(self, stmt, seq_params):
+        try:
+            self._cursor.executemany(self._translate(stmt), seq_params)
+        except sqlite3.IntegrityError as err:
+            raise self._integrity_error(err) from err
+
+    def _integrity_error(self, err):
+        errno = errorcode.ER_DUP_ENTRY if str(err).startswith("UNIQUE") else None
+        return errors.IntegrityError(msg=str(err), errno=errno)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteDatabase:
+    """A SQLite file, used by the stores in place of MySQLConnectionPool
+
+    Each store executor thread gets its own connection, opened on first use.
+    The file is put in WAL mode so reads carry on while another thread writes,
+    and connections wait up to `timeout` seconds for a write lock.  Outside
+    `transaction()` every statement commits straight away, as with the
+    autocommit MySQL connections.
+    """
+
+    def __init__(self, path, size=4, timeout=10):
+        self.path = str(path)
+        self.size = size
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self.checkouts = 0
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _current(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def checkout(self):
+        with self._lock:
+            self.checkouts += 1
+        yield self._current()
+
+    @contextmanager
+    def transaction(self):
+        """Run the block as one transaction, see MySQLConnectionPool.transaction"""
+        conn = self._current()
+        if getattr(self._local, "transaction", None) is not None:
+            yield conn
+            return
+        # Take the write lock up front, so the transaction cannot fail half way
+        # through because another thread started writing first
+        conn.execute("BEGIN IMMEDIATE")
+        callbacks = self._local.transaction = ([], [])
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            self._local.transaction = None
+            conn.execute("ROLLBACK")
+            for callback in callbacks[1]:
+                callback()
+            raise
+        self._local.transaction = None
+        for callback in callbacks[0]:
+            callback()
+
+    def after_commit(self, callback):
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is None:
+            callback()
+        else:
+            transaction[0].append(callback)
+
+    def after_rollback(self, callback):
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is not None:
+            transaction[1].append(callback)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._current(), dictionary=dictionary)
+
+    def commit(self):
+        # Statements outside a transaction are already committed
+        pass
+
+    def rollback(self):
+        conn = self._current()
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "connections": len(self._connections),
+                "checkouts": self.checkouts,
+            }
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+def sqlite_columns(columns: str) -> str:
+    """Column definitions from a MySQL migration, in SQLite's dialect"""
+    columns = columns.replace("INT NOT NULL AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    return re.sub(r"\s+UNSIGNED", "", columns)
+
+
+class SQLiteSchemaDb:
+    """Creates the tables and indexes for SQLite storage
+
+    The tables are the `TABLES` declared by the MySQL migrations, and the
+    indexes are EXPECTED_INDEXES, unique where the name starts with `uq_`.
+    A SQLite file is only ever built by this, so there is no hand-built schema
+    to upgrade: `migrate()` creates whatever is missing, runs the `copy_data`
+    step of any pending migration that has one, and records the latest
+    version.  `check()` migrates too, so a new file is ready as soon as
+    the bot starts.
+    """
+
+    def __init__(self, mydb):
+        self.mydb = mydb
+
+    def current_version(self) -> int:
+        cursor = self.mydb.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS `schema_version` ("
+                       "`version` INTEGER NOT NULL PRIMARY KEY, "
+                       "`description` VARCHAR(255) NOT NULL DEFAULT '', "
+                       "`applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] or 0
+
+    def pending(self) -> list:
+        version = self.current_version()
+        return [migration for migration in load_migrations() if migration.VERSION > version]
+
+    def migrate(self) -> List[int]:
+        pending = self.pending()
+        with self.mydb.transaction():
+            cursor = self.mydb.cursor()
+            for migration in load_migrations():
+                for table, columns in getattr(migration, "TABLES", {}).items():
+                    cursor.execute(f"CREATE TABLE IF NOT EXISTS `{table}` ({sqlite_columns(columns)})")
+            for table, name, columns in EXPECTED_INDEXES:
+                column_list = ", ".join(f"`{column}`" for column in columns)
+                unique = "UNIQUE " if name.startswith("uq_") else ""
+                cursor.execute(f"CREATE {unique}INDEX IF NOT EXISTS `{name}` ON `{table}` ({column_list})")
+            for migration in pending:
+                if hasattr(migration, "copy_data"):
+                    data_cursor = self.mydb.cursor(dictionary=True)
+                    migration.copy_data(data_cursor)
+                    data_cursor.close()
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                               (migration.VERSION, migration.DESCRIPTION))
+            cursor.close()
+        return [migration.VERSION for migration in pending]
+
+    def table_indexes(self, table) -> dict:
+        cursor = self.mydb.cursor(dictionary=True)
+        cursor.execute(f"PRAGMA index_list(`{table}`)")
+        names = [row['name'] for row in cursor.fetchall()]
+        indexes = {}
+        for name in names:
+            cursor.execute(f"PRAGMA index_info(`{name}`)")
+            indexes[name] = tuple(row['name'] for row in sorted(cursor.fetchall(), key=lambda row: row['seqno']))
+        cursor.close()
+        return indexes
+
+    def missing_indexes(self) -> List[Tuple[str, str, tuple]]:
+        indexes = {}
+        missing = []
+        for table, name, columns in EXPECTED_INDEXES:
+            if table not in indexes:
+                indexes[table] = self.table_indexes(table)
+            if not has_index(indexes[table], columns):
+                missing.append((table, name, columns))
+        return missing
+
+    def check(self):
+        applied = self.migrate()
+        if applied:
+            logger.info(f"Created SQLite schema up to version {applied[-1]}")
+        missing = self.missing_indexes()
+        for table, name, columns in missing:
+            logger.warning(f"Missing index {name} on {table} ({', '.join(columns)}), lookups on it scan the table")
+        return [], missing
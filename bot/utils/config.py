@@ -32,7 +32,17 @@ class Config:
         if self.storage == "mysql":
             self.mysql_username = self.config.get("mysql_username", None)
             self.mysql_password = self.config.get("mysql_password", None)
+            self.mysql_pool_size = self.config.get("mysql_pool_size", 5)
+            self.mysql_idle_check = self.config.get("mysql_idle_check", 30)
+        if self.storage == "sqlite":
+            self.sqlite_path = self.config.get("sqlite_path", None)
+            self.sqlite_workers = self.config.get("sqlite_workers", 4)
         self.puzzle_addons_path = self.config.get("puzzle_addons_path", None)
+        self.json_codec = self.config.get("json_codec", "fast")
+        self.meta_refresh_seconds = self.config.get("meta_refresh_seconds", 5)
+        self.google_workers = self.config.get("google_workers", 8)
+        self.google_calls_per_spreadsheet = self.config.get("google_calls_per_spreadsheet", 2)
+        self.sheet_write_batch_seconds = self.config.get("sheet_write_batch_seconds", 0.5)
         if not self.database:
             self.database = self.config.get("database", default_config.get("database"))
         self.debug = self.config.get("debug", default_config.get("debug"))
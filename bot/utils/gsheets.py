@@ -1,56 +1,212 @@
-import os.path
+import asyncio
+import datetime
 import json
+import os.path
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
 
 from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from bot.utils import config
+from bot.utils.locks import Histogram
 
 # The ID and range of a sample spreadsheet.
 SPREADSHEET_ID = "1f-W4VglELO-7yQoozPStdp8Jp9aLgHoVvR1rhpaFJ-o"
 
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+class _TimedHttpRequest(HttpRequest):
+    """HttpRequest that makes sure the token is fresh and records how long each call takes"""
+
+    def execute(self, http=None, num_retries=0):
+        clients.credentials()
+        start = time.monotonic()
+        try:
+            return super().execute(http=http, num_retries=num_retries)
+        finally:
+            clients.observe(self.methodId, time.monotonic() - start)
+
+
+class GoogleClients:
+    """The Google Sheets and Drive API clients, shared by the whole process
+
+    Credentials are read from `secrets_file` once, and the access token is
+    refreshed `REFRESH_MARGIN` before it expires rather than by the request
+    that finds it expired.  Discovery documents are parsed once, and each
+    thread keeps its own clients (httplib2 connections are not thread safe),
+    which reuse their HTTP connections between calls.  `metrics()` gives
+    call latency by API method.
+    """
+    REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+    def __init__(self, secrets_file="google_secrets.json"):
+        self.secrets_file = secrets_file
+        self._credentials = None
+        self._documents: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latency: Dict[str, Histogram] = {}
+        self.builds = 0
+        self.refreshes = 0
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = Credentials.from_service_account_file(self.secrets_file, scopes=SCOPES)
+            credentials = self._credentials
+            expiry = getattr(credentials, "expiry", None)
+            # google-auth keeps expiry as naive UTC
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if not credentials.valid or (expiry is not None and expiry - now < self.REFRESH_MARGIN):
+                credentials.refresh(Request())
+                self.refreshes += 1
+            return credentials
+
+    def _document(self, api, version) -> str:
+        key = (api, version)
+        if key not in self._documents:
+            self._documents[key] = get_static_doc(api, version)
+        return self._documents[key]
+
+    def service(self, api, version):
+        """This thread's client for an API, built the first time it is asked for"""
+        services = self._local.__dict__.setdefault("services", {})
+        key = (api, version)
+        if key not in services:
+            services[key] = build_from_document(self._document(api, version), credentials=self.credentials(),
+                                                requestBuilder=_TimedHttpRequest)
+            with self._lock:
+                self.builds += 1
+        return services[key]
+
+    def sheets(self):
+        spreadsheets = getattr(self._local, "spreadsheets", None)
+        if spreadsheets is None:
+            spreadsheets = self._local.spreadsheets = self.service("sheets", "v4").spreadsheets()
+        return spreadsheets
+
+    def drive(self):
+        return self.service("drive", "v3")
+
+    def observe(self, method, seconds):
+        with self._lock:
+            self.latency.setdefault(method, Histogram()).observe(seconds)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = {"builds": self.builds, "token_refreshes": self.refreshes}
+            for method, histogram in sorted(self.latency.items()):
+                metrics[method] = histogram.summary()
+        return metrics
+
+
+clients = GoogleClients()
+
 
 def get_sheet():
-    creds = Credentials.from_service_account_file("google_secrets.json")
-    scoped = creds.with_scopes(
-        [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-    )
+    return clients.sheets()
+
 
-    try:
-        service = build("sheets", "v4", credentials=creds)
+def get_drive():
+    return clients.drive()
 
-        # Call the Sheets API
-        sheet = service.spreadsheets()
-        return sheet
 
-    except HttpError as err:
-        print(err)
+class HuntSheets:
+    """The spreadsheets of one hunt, the main workbook and the archive for solved puzzles
 
-def get_drive():
-    creds = Credentials.from_service_account_file("google_secrets.json")
-    scoped = creds.with_scopes(
-        [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-    )
+    Passed to each GoogleSheets method rather than held by the cog, so
+    commands in different hunts running at the same time each write to
+    their own hunt's workbooks.
+    """
+    __slots__ = ("spreadsheet_id", "archive_spreadsheet_id")
+
+    def __init__(self, spreadsheet_id: Optional[str], archive_spreadsheet_id: Optional[str] = None):
+        self.spreadsheet_id = spreadsheet_id or None
+        self.archive_spreadsheet_id = archive_spreadsheet_id or None
+
+    @classmethod
+    def for_hunt(cls, hunt) -> "HuntSheets":
+        return cls(hunt.google_sheet_id, hunt.archive_google_sheet_id)
+
+    def target(self, archive=False) -> Optional[str]:
+        """The archive spreadsheet if `archive`, else the main one"""
+        return self.archive_spreadsheet_id if archive else self.spreadsheet_id
+
+    def __repr__(self):
+        return f"HuntSheets({self.spreadsheet_id!r}, {self.archive_spreadsheet_id!r})"
+
+
+class GoogleTransport:
+    """Runs Google API calls on worker threads, so they never block the event loop
+
+    The client library is synchronous, so each call is built and executed on
+    one of `workers` threads with that thread's client, e.g.
+
+        await transport.sheets(spreadsheet_id, lambda sheets: sheets.get(spreadsheetId=spreadsheet_id))
+
+    At most `per_spreadsheet` calls to one spreadsheet are in flight at once,
+    so a burst of commands on one hunt queues up rather than tripping
+    Google's per-spreadsheet limits, while other hunts carry on.
+    """
+
+    def __init__(self, workers: int = 8, per_spreadsheet: int = 2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="google")
+        self.per_spreadsheet = per_spreadsheet
+        # One per spreadsheet the bot has used, a couple per hunt
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, spreadsheet_id) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(spreadsheet_id)
+        if semaphore is None:
+            semaphore = self._semaphores[spreadsheet_id] = asyncio.Semaphore(self.per_spreadsheet)
+        return semaphore
+
+    async def prewarm(self):
+        """Build every worker thread's Sheets and Drive clients now, so no command waits for one
+
+        One task per worker, each waiting at a barrier for the others, so
+        every thread in the pool gets one.
+        """
+        workers = self.executor._max_workers
+        barrier = threading.Barrier(workers)
+
+        def warm():
+            get_sheet()
+            get_drive()
+            barrier.wait(timeout=60)
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, warm) for _ in range(workers)))
+
+    async def _run(self, make_request: Callable, service: Callable):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: make_request(service()).execute())
+
+    async def sheets(self, spreadsheet_id: Optional[str], make_request: Callable):
+        """`make_request(get_sheet()).execute()` on a worker thread, limited per spreadsheet"""
+        async with self._semaphore(spreadsheet_id):
+            return await self._run(make_request, get_sheet)
 
-    try:
-        service = build("drive", "v3", credentials=creds)
+    async def drive(self, make_request: Callable):
+        """`make_request(get_drive()).execute()` on a worker thread"""
+        return await self._run(make_request, get_drive)
 
-        # Call the Drive API
-        # drive = service.files()
 
-        return service
+transport = GoogleTransport(config.google_workers, config.google_calls_per_spreadsheet)
 
-    except HttpError as err:
-        print(err)
 
 def batch_update(body):
     get_sheet().batchUpdate(spreadsheetId=SPREADSHEET_ID, body=body).execute()
@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import pytz
+
+from bot.store.job_data import JobData
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[JobData], Awaitable[None]]
+
+
+class JobQueue:
+    """Runs queued side effects in the background, see JobData
+
+    Commands `enqueue` a job and carry on; the dispatcher hands pending jobs
+    to up to `workers` handlers at a time.  Jobs for the same puzzle channel
+    (see `sequence`) run one at a time in the order they were queued, while
+    those of other puzzles proceed in parallel, so one job waiting to retry
+    holds up only the jobs queued after it for its puzzle.
+
+    A job that raises is retried after `RETRY_SECONDS[attempt]`, then marked
+    failed once it has run `MAX_ATTEMPTS` times.  Jobs run at least once, so
+    handlers should check whether their work is already done, or `record`
+    it in the payload when it cannot be checked (a message sent).  Jobs left
+    running when the bot stopped are put back in the queue by `start()`.
+    """
+    MAX_ATTEMPTS = 5
+    RETRY_SECONDS = (5, 30, 120, 600)
+    POLL_SECONDS = 30
+
+    def __init__(self, store, workers: int = 4):
+        self.store = store
+        self.workers = workers
+        self.handlers: Dict[str, Handler] = {}
+        self.unordered: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(workers)
+        self._busy: Set[tuple] = set()
+        self._running: Set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+
+    def sequence(self, job: JobData) -> tuple:
+        """Jobs with the same sequence run in order, those of one puzzle channel or of a hunt without one"""
+        if job.kind in self.unordered:
+            return "job", job.id
+        return job.hunt_id, job.payload.get("channel_id")
+
+    def register(self, kind: str, handler: Handler, ordered: bool = True):
+        """Handle `kind` jobs, those not `ordered` run as soon as there is a worker for them"""
+        self.handlers[kind] = handler
+        if not ordered:
+            self.unordered.add(kind)
+
+    async def enqueue(self, kind: str, hunt_id: int, **payload) -> JobData:
+        """Queue a job, unless the same job is already waiting"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for {kind} jobs")
+        job = await self.store.enqueue(JobData(hunt_id=hunt_id, kind=kind, payload=payload))
+        self._wake.set()
+        return job
+
+    async def record(self, job: JobData, **progress):
+        """Save progress to the job's payload straight away, so a retry can skip what is done"""
+        job.payload.update(progress)
+        await self.store.commit(job)
+
+    async def start(self):
+        reset = await self.store.reset_running()
+        if reset:
+            logger.info(f"Requeued {reset} jobs left running")
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        # Anything cut short is requeued at the next start
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            try:
+                delay = await self.dispatch_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to fetch pending jobs")
+                delay = self.POLL_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_pending(self) -> float:
+        """Start the jobs that can run now, returns how long until another might be due"""
+        now = datetime.datetime.now(tz=pytz.UTC)
+        delay = self.POLL_SECONDS
+        seen = set()
+        for job in await self.store.get_pending():
+            sequence = self.sequence(job)
+            if sequence in seen:
+                continue
+            # Later jobs of this puzzle wait for this one, even while it waits to retry
+            seen.add(sequence)
+            if sequence in self._busy:
+                continue
+            if job.run_time is not None and job.run_time > now:
+                delay = min(delay, (job.run_time - now).total_seconds())
+                continue
+            self._busy.add(sequence)
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return delay
+
+    async def _run(self, job: JobData):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.attempts += 1
+                await self.store.commit(job)
+                start = time.monotonic()
+                try:
+                    await self.handlers[job.kind](job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    logger.exception(f"Job {job} failed, attempt {job.attempts}")
+                    self._fail(job, exc)
+                else:
+                    logger.info(f"Job {job} done in {time.monotonic() - start:.2f}s")
+                    job.status = "done"
+                    job.last_error = ""
+                    job.finish_time = datetime.datetime.now(tz=pytz.UTC)
+                    self.done += 1
+                await self.store.commit(job)
+        finally:
+            self._busy.discard(self.sequence(job))
+            self._wake.set()
+
+    def _fail(self, job: JobData, exc: Exception):
+        job.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+        if job.attempts >= self.MAX_ATTEMPTS:
+            job.status = "failed"
+            job.finish_time = datetime.datetime.now(tz=pytz.UTC)
+            self.failed += 1
+            return
+        retry = self.RETRY_SECONDS[min(job.attempts, len(self.RETRY_SECONDS)) - 1]
+        job.status = "pending"
+        job.run_time = datetime.datetime.now(tz=pytz.UTC) + datetime.timedelta(seconds=retry)
+        self.retried += 1
+
+    def metrics(self) -> dict:
+        return {
+            "running": len(self._running),
+            "done": self.done,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+class JobCommandContext:
+    """Enough of a commands.Context for the cog's command code to run a job
+
+    Replies go to the job's channel.  `message.id` is unique per job, so the
+    job's command context does not clash with those of running commands.
+    """
+
+    class _Message:
+        def __init__(self, job_id):
+            self.id = f"job-{job_id}"
+
+    def __init__(self, bot, channel, job: JobData):
+        self.bot = bot
+        self.channel = channel
+        self.guild = channel.guild
+        self.message = self._Message(job.id)
+        self.interaction = None
+        self.author = bot.user
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+    async def defer(self, *args, **kwargs):
+        pass
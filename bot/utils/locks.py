@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0)
+
+
+class Histogram:
+    """Counts of observed durations by bucket"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> str:
+        if not self.count:
+            return "none"
+        labels = [f"<={bound * 1000:g}ms" for bound in self.buckets] + [f">{self.buckets[-1] * 1000:g}ms"]
+        buckets = " ".join(f"{label}:{count}" for label, count in zip(labels, self.counts) if count)
+        return f"n={self.count} mean={self.total / self.count * 1000:.1f}ms max={self.max * 1000:.1f}ms {buckets}"
+
+
+class _Node:
+    """One lock in the hierarchy, held shared by any number of tasks or exclusively by one"""
+    __slots__ = ("condition", "readers", "writer", "depth", "waiting")
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writer: Optional[asyncio.Task] = None
+        self.depth = 0  # times the writer has re-entered
+        self.waiting = 0
+
+    def idle(self) -> bool:
+        return self.readers == 0 and self.writer is None and self.waiting == 0
+
+
+class LockManager:
+    """Hierarchical asyncio locks for hunts, rounds, puzzles and meta sheets
+
+    A lock is named by a path from the top of the hierarchy, e.g.
+    `hold(("hunt", 1), ("round", 2), ("puzzle", 3))`, which holds the last
+    level exclusively and every level above it shared.  So commands on
+    different puzzles run in parallel, while a command holding a whole round
+    exclusively waits for them to finish and keeps new ones out.  Parts with
+    an id of 0 or None are skipped.
+
+    Exclusive locks are re-entrant for the task holding them, and that task
+    can also take shared locks beneath them.  A task holding a level shared
+    must not then ask for it exclusively.
+
+    `hold(..., blocking=False)` takes the last level only if it is free right
+    now, in the same step as checking it, and yields whether it did.
+
+    Locks only exist while held or waited on, so the registry does not grow
+    with every puzzle ever touched.  Wait and hold times are recorded per
+    level, see `metrics()`.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[Tuple[str, int], _Node] = {}
+        self.wait_times: Dict[str, Histogram] = {}
+        self.hold_times: Dict[str, Histogram] = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def locked(self, level: str, lock_id) -> bool:
+        """Whether anything holds this lock, shared or exclusively"""
+        node = self._nodes.get((level, lock_id))
+        return node is not None and (node.readers > 0 or node.writer is not None)
+
+    async def _acquire(self, key, exclusive: bool, blocking: bool = True) -> bool:
+        task = asyncio.current_task()
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = _Node()
+        start = time.monotonic()
+        node.waiting += 1
+        try:
+            async with node.condition:
+                if node.writer is task:
+                    # Re-entered by the task holding it exclusively
+                    if exclusive:
+                        node.depth += 1
+                    else:
+                        node.readers += 1
+                    return True
+                if exclusive:
+                    available = lambda: node.writer is None and node.readers == 0
+                else:
+                    available = lambda: node.writer is None
+                if not blocking and not available():
+                    return False
+                await node.condition.wait_for(available)
+                if exclusive:
+                    node.writer = task
+                    node.depth = 1
+                else:
+                    node.readers += 1
+        finally:
+            node.waiting -= 1
+            self._evict(key, node)
+        self.wait_times.setdefault(key[0], Histogram()).observe(time.monotonic() - start)
+        return True
+
+    async def _release(self, key, exclusive: bool):
+        node = self._nodes[key]
+        async with node.condition:
+            if exclusive:
+                node.depth -= 1
+                if node.depth == 0:
+                    node.writer = None
+            else:
+                node.readers -= 1
+            node.condition.notify_all()
+        self._evict(key, node)
+
+    def _evict(self, key, node):
+        if node.idle() and self._nodes.get(key) is node:
+            del self._nodes[key]
+
+    @asynccontextmanager
+    async def hold(self, *path, blocking: bool = True):
+        """Hold the last lock in `path` exclusively and those above it shared, yields whether it is held
+
+        Without `blocking`, nothing is held and False is yielded if the last
+        lock is taken.
+        """
+        keys = [(level, lock_id) for level, lock_id in path if lock_id]
+        acquired = []
+        try:
+            # Always top down, so two paths cannot deadlock on each other
+            for i, key in enumerate(keys):
+                exclusive = i == len(keys) - 1
+                if not await self._acquire(key, exclusive, blocking or not exclusive):
+                    for held_key, held_exclusive in reversed(acquired):
+                        await self._release(held_key, held_exclusive)
+                    acquired = []
+                    yield False
+                    return
+                acquired.append((key, exclusive))
+            start = time.monotonic()
+            try:
+                yield True
+            finally:
+                if keys:
+                    self.hold_times.setdefault(keys[-1][0], Histogram()).observe(time.monotonic() - start)
+        finally:
+            for key, exclusive in reversed(acquired):
+                await self._release(key, exclusive)
+
+    def metrics(self) -> dict:
+        metrics = {"locks": len(self._nodes)}
+        for level, histogram in sorted(self.wait_times.items()):
+            metrics[f"{level}_wait"] = histogram.summary()
+        for level, histogram in sorted(self.hold_times.items()):
+            metrics[f"{level}_hold"] = histogram.summary()
+        return metrics
+
+
+# Shared by the cogs, so the archive loop sees the locks commands hold
+puzzle_locks = LockManager()
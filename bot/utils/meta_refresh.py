@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class MetaRefresher:
+    """Rewrites each meta sheet at most once per `window` seconds
+
+    Commands `mark` a meta as out of date instead of rewriting its tab
+    straight away.  The first mark starts a timer; marks of the same meta
+    before it fires are folded into one call of `flush(key)`, which reads
+    the round's puzzles as they are by then.  A mark arriving while the meta
+    is being written starts another window, so the last change always makes
+    it to the sheet.
+
+    Keys are whatever `flush` understands, the cog uses
+    ("meta", hunt_id, round_id) and ("metameta", hunt_id, puzzle_id), so a
+    hunt's metameta is rebuilt once however many of its rounds change.
+
+    `refresh` marks a meta and waits for the write that covers the mark,
+    raising if that write failed, so a persisted job is only done once its
+    sheet is.
+    """
+
+    def __init__(self, flush: Callable[[Hashable], Awaitable[None]], window: float = 5):
+        self.flush = flush
+        self.window = window
+        self._dirty: Set[Hashable] = set()
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, List[asyncio.Future]] = {}
+        self._closing = asyncio.Event()
+        self.requested = 0
+        self.written = 0
+        self.errors = 0
+
+    def mark(self, key: Hashable):
+        """Note that the sheet for `key` needs rewriting"""
+        self.requested += 1
+        self._dirty.add(key)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._refresh(key))
+
+    async def refresh(self, key: Hashable):
+        """Mark the sheet for `key` and wait until it has been rewritten"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        self.mark(key)
+        await waiter
+
+    async def _refresh(self, key):
+        try:
+            while key in self._dirty:
+                try:
+                    await asyncio.wait_for(self._closing.wait(), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+                await self._write(key)
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    async def _write(self, key):
+        self._dirty.discard(key)
+        waiters = self._waiters.pop(key, [])
+        error: Optional[Exception] = None
+        written = False
+        try:
+            await self.flush(key)
+            self.written += 1
+            written = True
+        except Exception as exc:
+            self.errors += 1
+            error = exc
+            logger.exception(f"Unable to refresh meta sheet {key}")
+        finally:
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if error is not None:
+                    waiter.set_exception(error)
+                elif written:
+                    waiter.set_result(None)
+                else:
+                    # Cancelled part way through the write
+                    waiter.cancel()
+
+    async def close(self):
+        """Write anything still waiting for its window, e.g. when the cog unloads"""
+        self._closing.set()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        for key in list(self._dirty):
+            await self._write(key)
+
+    def metrics(self) -> dict:
+        return {
+            "requested": self.requested,
+            "written": self.written,
+            "saved": self.requested - self.written - len(self._dirty) - self.errors,
+            "waiting": len(self._dirty),
+            "errors": self.errors,
+        }
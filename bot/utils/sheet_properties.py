@@ -0,0 +1,106 @@
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SheetPropertiesCache:
+    """The tabs of each spreadsheet (sheetId, title, index, hidden, ...) as last seen
+
+    Fetching a hunt workbook just to find a tab's name or index is slow, so
+    the `sheets.properties` of each spreadsheet are kept here and kept up to
+    date from the bot's own batchUpdate requests and replies.  A spreadsheet
+    is only fetched again after `invalidate`, which the cog calls when a
+    request fails, e.g. because someone renamed or deleted a tab by hand.
+    """
+
+    def __init__(self):
+        # Tabs of each spreadsheet, in index order
+        self._spreadsheets: Dict[str, List[dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def sheets(self, spreadsheet_id) -> Optional[List[dict]]:
+        """Tabs as `{"properties": {...}}`, the shape of the Sheets API's spreadsheet resource, or None"""
+        tabs = self._spreadsheets.get(spreadsheet_id)
+        if tabs is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [{"properties": dict(properties)} for properties in tabs]
+
+    def store(self, spreadsheet_id, sheets: List[dict]):
+        tabs = [dict(sheet["properties"]) for sheet in sheets]
+        tabs.sort(key=lambda properties: properties.get("index", 0))
+        self._spreadsheets[spreadsheet_id] = tabs
+        self._renumber(tabs)
+
+    def invalidate(self, spreadsheet_id=None):
+        if spreadsheet_id is None:
+            self._spreadsheets.clear()
+        elif self._spreadsheets.pop(spreadsheet_id, None) is None:
+            return
+        self.invalidations += 1
+
+    def add(self, spreadsheet_id, properties: dict):
+        """A tab created by the bot, e.g. the reply to copyTo or duplicateSheet"""
+        tabs = self._spreadsheets.get(spreadsheet_id)
+        if tabs is None:
+            return
+        properties = dict(properties)
+        # The API leaves out an index of 0
+        tabs.insert(min(properties.get("index", 0), len(tabs)), properties)
+        self._renumber(tabs)
+
+    def apply(self, spreadsheet_id, requests: List[dict], replies: List[dict]):
+        """Update a spreadsheet's tabs from a batchUpdate that succeeded"""
+        tabs = self._spreadsheets.get(spreadsheet_id)
+        if tabs is None:
+            return
+        replies = replies or [{}] * len(requests)
+        for request, reply in zip(requests, replies):
+            for kind in ("duplicateSheet", "addSheet"):
+                if kind in (reply or {}):
+                    self.add(spreadsheet_id, reply[kind]["properties"])
+            if "deleteSheet" in request:
+                sheet_id = request["deleteSheet"]["sheetId"]
+                tabs[:] = [properties for properties in tabs if properties.get("sheetId") != sheet_id]
+                self._renumber(tabs)
+            elif "updateSheetProperties" in request and not self._update(tabs, request["updateSheetProperties"]):
+                # A tab the bot has not seen, read the whole spreadsheet next time
+                self.invalidate(spreadsheet_id)
+                return
+
+    def _update(self, tabs: List[dict], update: dict) -> bool:
+        changes = update["properties"]
+        properties = next((tab for tab in tabs if tab.get("sheetId") == changes.get("sheetId")), None)
+        if properties is None:
+            return False
+        for field in update["fields"].split(","):
+            field = field.strip()
+            if field == "index":
+                # Indexes in a move count the tab itself, as they were before the move
+                old = tabs.index(properties)
+                new = changes.get("index", len(tabs))
+                tabs.remove(properties)
+                tabs.insert(min(new if new <= old else new - 1, len(tabs)), properties)
+                self._renumber(tabs)
+            elif field in changes and changes[field] is not None:
+                properties[field] = changes[field]
+            else:
+                properties.pop(field, None)
+        return True
+
+    @staticmethod
+    def _renumber(tabs: List[dict]):
+        for index, properties in enumerate(tabs):
+            properties["index"] = index
+
+    def metrics(self) -> dict:
+        return {
+            "spreadsheets": len(self._spreadsheets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
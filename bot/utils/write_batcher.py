@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[str, dict], Awaitable[dict]]
+
+
+class SheetsWriteBatcher:
+    """Merges the batchUpdate requests of many commands into one call per spreadsheet
+
+    `submit` queues a list of request dicts (the output of `update_cell`,
+    `change_tab_colour`, ...) for a spreadsheet and waits for them to be
+    sent.  Everything submitted for a spreadsheet within `interval` seconds
+    goes in a single batchUpdate, in the order submitted, and each caller
+    gets back the replies to its own requests, e.g. the new tab from a
+    duplicateSheet.  Only one batch per spreadsheet is in flight at a time,
+    so writes to a tab are applied in the order they were submitted.
+
+    A batchUpdate succeeds or fails as a whole, so when a merged batch
+    fails each submission in it is sent again on its own, and only the
+    caller whose requests are at fault gets the error.
+
+    `close` sends whatever is waiting straight away and lets batches already
+    being sent finish, so every `submit` returns.
+    """
+
+    def __init__(self, send: Send, interval: float = 0.5, max_requests: int = 500):
+        self.send = send
+        self.interval = interval
+        self.max_requests = max_requests
+        self._pending: Dict[str, List[Tuple[List[dict], asyncio.Future]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._closing = asyncio.Event()
+        self.submissions = 0
+        self.batches = 0
+
+    async def submit(self, spreadsheet_id: str, requests: List[dict]) -> List[dict]:
+        """Queue `requests` for the spreadsheet, returns their replies once sent"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(spreadsheet_id, []).append((list(requests), future))
+        self.submissions += 1
+        if spreadsheet_id not in self._tasks:
+            self._tasks[spreadsheet_id] = asyncio.create_task(self._flush_loop(spreadsheet_id))
+        return await future
+
+    async def _flush_loop(self, spreadsheet_id):
+        try:
+            while self._pending.get(spreadsheet_id):
+                try:
+                    await asyncio.wait_for(self._closing.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self.flush(spreadsheet_id)
+        finally:
+            if self._tasks.get(spreadsheet_id) is asyncio.current_task():
+                del self._tasks[spreadsheet_id]
+
+    async def flush(self, spreadsheet_id):
+        """Send everything waiting for the spreadsheet now"""
+        submissions = self._pending.pop(spreadsheet_id, [])
+        try:
+            batch = []
+            for submission in submissions:
+                if batch and sum(len(requests) for requests, _ in batch) + len(submission[0]) > self.max_requests:
+                    await self._send(spreadsheet_id, batch)
+                    batch = []
+                batch.append(submission)
+            if batch:
+                await self._send(spreadsheet_id, batch)
+        finally:
+            # Cancelled part way, the callers must not wait for ever
+            for _, future in submissions:
+                if not future.done():
+                    future.cancel()
+
+    async def _send(self, spreadsheet_id, batch):
+        requests = [request for submission, _ in batch for request in submission]
+        self.batches += 1
+        try:
+            response = await self.send(spreadsheet_id, {"requests": requests})
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            logger.warning(f"Batch of {len(requests)} writes to {spreadsheet_id} failed, sending them one by one")
+            for submission in batch:
+                await self._send(spreadsheet_id, [submission])
+            return
+        replies = response.get("replies") or [{} for _ in requests]
+        start = 0
+        for submission, future in batch:
+            if not future.done():
+                future.set_result(replies[start:start + len(submission)])
+            start += len(submission)
+
+    async def close(self):
+        """Send anything still waiting, e.g. when the cog unloads"""
+        self._closing.set()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        for spreadsheet_id in list(self._pending):
+            await self.flush(spreadsheet_id)
+
+    def metrics(self) -> dict:
+        return {
+            "submitted": self.submissions,
+            "batch_updates": self.batches,
+            "saved": self.submissions - self.batches,
+            "waiting": sum(len(pending) for pending in self._pending.values()),
+        }
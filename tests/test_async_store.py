@@ -0,0 +1,24 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.store.async_store import AsyncStore
+
+
+class DummyStore:
+    dir_path = "/tmp/data"
+
+    def get_by_attr(self, **kwargs):
+        return threading.current_thread().name, kwargs
+
+
+class TestAsyncStore:
+    def test_methods_run_on_executor(self):
+        store = AsyncStore(DummyStore(), ThreadPoolExecutor(max_workers=1, thread_name_prefix="store"))
+        thread_name, kwargs = asyncio.run(store.get_by_attr(channel_id=5))
+        assert thread_name.startswith("store")
+        assert kwargs == {"channel_id": 5}
+
+    def test_attributes_passed_through(self):
+        store = AsyncStore(DummyStore(), ThreadPoolExecutor(max_workers=1))
+        assert store.dir_path == "/tmp/data"
@@ -0,0 +1,31 @@
+import datetime
+
+import pytest
+
+from bot.store import HuntData, JobData, PuzzleData
+
+
+class TestImportDict:
+    def test_decoder_fills_defaults_and_converts_columns(self):
+        puzzle = PuzzleData.import_dict({"id": 1, "name": "Puzzle", "tags": [7],
+                                         "solve_time": datetime.datetime(2026, 1, 17, 12, 0)})
+        assert puzzle.solve_time.tzinfo == datetime.timezone.utc
+        assert puzzle.additional_sheets == [] and puzzle.status == ""
+        assert not puzzle.is_dirty()
+        puzzle.tags.append(8)
+        assert puzzle.dirty_fields() == ["tags"]
+        assert puzzle.clean_value("tags") == [7]
+
+    def test_dict_changed_in_place_is_dirty(self):
+        job = JobData.import_dict({"id": 1, "kind": "announce", "payload": '{"channel_id": 5}'})
+        job.payload["message_id"] = 9
+        assert job.dirty_fields() == ["payload"]
+        job.mark_clean()
+        job.payload["message_id"] = 10
+        assert job.dirty_fields() == ["payload"]
+
+    def test_objects_are_slotted(self):
+        hunt = HuntData.import_dict({"id": 1, "name": "Hunt"})
+        assert not hasattr(hunt, "__dict__")
+        with pytest.raises(AttributeError):
+            hunt.hunt_name = "Typo"
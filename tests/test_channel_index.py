@@ -0,0 +1,49 @@
+from bot.store import HuntData, PuzzleData, RoundData
+from bot.store.channel_index import ChannelIndex
+
+HUNTS = [{"id": 1, "channel_id": 10, "category_id": 11}]
+ROUNDS = [{"id": 2, "hunt_id": 1, "category_id": 20, "meta_id": 4, "type": "Metapuzzle"}]
+PUZZLES = [{"id": 3, "hunt_id": 1, "channel_id": 30}, {"id": 4, "hunt_id": 1, "channel_id": 40}]
+
+
+def loaded_index():
+    index = ChannelIndex()
+    index.load(HUNTS, ROUNDS, PUZZLES)
+    return index
+
+
+class TestChannelIndex:
+    def test_resolve_hunt_channel(self):
+        context = loaded_index().resolve(10, 11)
+        assert (context.channel_type, context.hunt_id) == ("Hunt", 1)
+
+    def test_resolve_puzzle_in_round(self):
+        context = loaded_index().resolve(30, 20)
+        assert (context.channel_type, context.hunt_id, context.round_id, context.puzzle_id) == ("Puzzle", 1, 2, 3)
+
+    def test_resolve_metapuzzle_uses_round_type(self):
+        context = loaded_index().resolve(40, 99)
+        assert (context.channel_type, context.round_id, context.puzzle_id) == ("Metapuzzle", 2, 4)
+
+    def test_resolve_round_category(self):
+        context = loaded_index().resolve(21, 20)
+        assert (context.channel_type, context.round_id, context.puzzle_id) == ("Metapuzzle", 2, 4)
+
+    def test_unknown_ids_cached_as_missing(self):
+        index = loaded_index()
+        assert index.unknown(50, 20) == [50]
+        index.load([], [], [], looked_up=[50])
+        assert index.unknown(50, 20) == []
+        assert index.resolve(50).channel_type == "Guild"
+
+    def test_commit_and_delete_keep_index_current(self):
+        index = loaded_index()
+        index.add(PuzzleData(id=5, hunt_id=1, channel_id=50))
+        assert index.resolve(50, 20).puzzle_id == 5
+        index.add(RoundData(id=2, hunt_id=1, category_id=60, meta_id=4, type="Metapuzzle"))
+        assert index.resolve(30, 20).round_id == 0
+        assert index.resolve(30, 60).round_id == 2
+        index.discard("puzzles", 5)
+        assert index.resolve(50, 60).channel_type == "Metapuzzle"
+        index.add(HuntData(id=1, channel_id=12, category_id=11))
+        assert index.resolve(10, None).channel_type == "Guild"
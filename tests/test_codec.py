@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+
+from bot.store import AdditionalSheetData, GuildSettings, HuntData, HuntSettings, PuzzleData, RoundData
+from bot.store.codec import DataclassesJsonCodec, FastJsonCodec
+
+SOLVE_TIME = datetime.datetime(2026, 1, 17, 12, 30, 15, 250000, tzinfo=datetime.timezone.utc)
+
+
+def make_puzzle():
+    puzzle = PuzzleData("Puzzle", hunt_id=2, channel_id=101, tags=[3, 4], puzzle_type="ünïcode",
+                        solved=True, solution="ANSWER", start_time=SOLVE_TIME - datetime.timedelta(hours=1),
+                        solve_time=SOLVE_TIME)
+    puzzle.additional_sheets.append(AdditionalSheetData(google_page_id="sheet", puzzle=True, puzzle_name="Extra"))
+    return puzzle
+
+
+@pytest.mark.parametrize("obj", [
+    make_puzzle(),
+    PuzzleData("New"),
+    RoundData("Round", hunt_id=2),
+    HuntData(name="Hunt", guild_id=1),
+    GuildSettings(guild_id=1, guild_name="Guild", discord_use_voice_channels=True),
+    HuntSettings(hunt_name="Hunt"),
+], ids=lambda obj: type(obj).__name__)
+class TestFastJsonCodec:
+    def test_encodes_like_dataclasses_json(self, obj):
+        assert FastJsonCodec().encode(obj, indent=4) == obj.to_json(indent=4)
+        assert FastJsonCodec().to_dict(obj) == obj.to_dict(encode_json=True)
+
+    def test_round_trip(self, obj):
+        text = obj.to_json(indent=4)
+        assert FastJsonCodec().decode(type(obj), text) == DataclassesJsonCodec().decode(type(obj), text) == obj
+
+
+def test_decoded_times_are_utc():
+    puzzle = FastJsonCodec().decode(PuzzleData, make_puzzle().to_json())
+    assert puzzle.solve_time == SOLVE_TIME
+    assert puzzle.solve_time.utcoffset() == datetime.timedelta(0)
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from bot.store import ChannelContext, CommandContext, CommandContexts, uses_context
+
+
+def make_context(calls, needs=("puzzle",)):
+    async def load_puzzle():
+        calls.append("puzzle")
+        return "the puzzle"
+
+    async def load_hunt():
+        calls.append("hunt")
+        return "the hunt"
+
+    return CommandContext(ChannelContext("Puzzle", hunt_id=1, puzzle_id=2),
+                          {"puzzle": load_puzzle, "hunt": load_hunt}, needs=needs)
+
+
+class TestCommandContext:
+    def test_loads_only_what_is_needed_and_memoises(self):
+        calls = []
+        context = make_context(calls)
+        asyncio.run(context.load())
+        assert context.peek("puzzle") == "the puzzle"
+        assert context.peek("channel_type") == "Puzzle"
+        with pytest.raises(RuntimeError):
+            context.peek("hunt")
+        assert asyncio.run(context.hunt()) == "the hunt"
+        assert asyncio.run(context.puzzle()) == "the puzzle"
+        assert calls == ["puzzle", "hunt"]
+
+    def test_uses_context_rejects_unknown_fields(self):
+        @uses_context("puzzle")
+        async def command(self, ctx):
+            pass
+        assert command.context_needs == ("puzzle",)
+        with pytest.raises(ValueError):
+            uses_context("round")
+
+
+class TestCommandContexts:
+    def test_gauge_counts_open_contexts(self):
+        contexts = CommandContexts()
+        contexts.open(1, make_context([]))
+        contexts.open(2, make_context([]))
+        assert contexts.metrics()["live"] == 2
+        contexts.close(1)
+        contexts.close(1)
+        assert contexts.metrics()["live"] == 1
+        assert (contexts.opened, contexts.closed) == (2, 1)
@@ -0,0 +1,61 @@
+import datetime
+import json
+
+from bot.store import PuzzleData
+from bot.store.fs import FilePuzzleJsonDb
+
+
+class TestFilePuzzleJsonDb:
+    def test_commits_are_coalesced_into_one_write(self, tmp_path):
+        puzzle_db = FilePuzzleJsonDb(dir_path=tmp_path, flush_delay=60)
+        puzzle = PuzzleData("Puzzle", hunt_id=2, channel_id=101, tags=[3])
+        puzzle_db.commit(puzzle, guild_id=1)
+        puzzle.status = "solved"
+        puzzle_db.commit(puzzle)
+        path = tmp_path / "1" / "2" / "3" / "101.json"
+        assert not path.exists()
+        puzzle_db.flush()
+        assert puzzle_db.writes == 1
+        assert json.loads(path.read_text())["status"] == "solved"
+        assert [p.name for p in tmp_path.rglob("*") if p.is_file()] == ["101.json"]
+
+    def test_manifest_loaded_once(self, tmp_path):
+        writer = FilePuzzleJsonDb(dir_path=tmp_path)
+        writer.commit(PuzzleData("Puzzle", hunt_id=2, channel_id=101, tags=[3]), guild_id=1)
+        writer.flush()
+
+        puzzle_db = FilePuzzleJsonDb(dir_path=tmp_path)
+        assert [p.channel_id for p in puzzle_db.get_all(1)] == [101]
+        (tmp_path / "1" / "2" / "3" / "101.json").unlink()
+        assert puzzle_db.get(1, 101, 3, 2).name == "Puzzle"
+        assert list(puzzle_db.aggregate_json()) == ["1/2/3/101.json"]
+
+    def test_moving_round_replaces_file(self, tmp_path):
+        puzzle_db = FilePuzzleJsonDb(dir_path=tmp_path)
+        puzzle = PuzzleData("Puzzle", hunt_id=2, channel_id=101, tags=[3])
+        puzzle_db.commit(puzzle, guild_id=1)
+        puzzle_db.flush()
+        puzzle.tags = [4]
+        puzzle_db.commit(puzzle)
+        puzzle_db.flush()
+        assert [str(p.relative_to(tmp_path)) for p in tmp_path.rglob("*.json")] == ["1/2/4/101.json"]
+
+    def test_uncommitted_changes_stay_with_the_caller(self, tmp_path):
+        puzzle_db = FilePuzzleJsonDb(dir_path=tmp_path, flush_delay=60)
+        puzzle = PuzzleData("Puzzle", hunt_id=2, channel_id=101, tags=[3])
+        puzzle_db.commit(puzzle, guild_id=1)
+        puzzle.status = "stuck"
+        loaded = puzzle_db.get(1, 101, 3, 2)
+        loaded.status = "solved"
+        assert puzzle_db.get(1, 101, 3, 2).status == ""
+        puzzle_db.flush()
+        assert json.loads((tmp_path / "1" / "2" / "3" / "101.json").read_text())["status"] == ""
+
+    def test_puzzles_without_start_time_sorted_last(self, tmp_path):
+        puzzle_db = FilePuzzleJsonDb(dir_path=tmp_path, flush_delay=60)
+        started = datetime.datetime(2026, 1, 17, 12, 0, tzinfo=datetime.timezone.utc)
+        for channel_id, start_time in ((101, None), (102, started), (103, None)):
+            puzzle_db.commit(PuzzleData("Puzzle", hunt_id=2, channel_id=channel_id, tags=[3], start_time=start_time),
+                             guild_id=1)
+        assert [p.channel_id for p in puzzle_db.get_all(1)][0] == 102
+        assert puzzle_db.get_solved_puzzles_to_archive(1) == []
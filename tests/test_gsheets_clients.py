@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.http import HttpMockSequence
+
+from bot.utils import gsheets
+from bot.store import HuntData
+from bot.utils.gsheets import GoogleClients, GoogleTransport, HuntSheets
+
+
+def make_clients(monkeypatch):
+    clients = GoogleClients()
+    clients._credentials = AnonymousCredentials()
+    monkeypatch.setattr(gsheets, "clients", clients)
+    return clients
+
+
+class TestGoogleClients:
+    def test_clients_built_once_per_thread(self, monkeypatch):
+        clients = make_clients(monkeypatch)
+        assert clients.sheets() is clients.sheets()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(clients.sheets()))
+        thread.start()
+        thread.join()
+        assert other[0] is not clients.sheets()
+        assert clients.builds == 2
+        assert len(clients._documents) == 1
+
+    def test_calls_timed_by_method(self, monkeypatch):
+        clients = make_clients(monkeypatch)
+        http = HttpMockSequence([({"status": "200"}, '{"spreadsheetId": "abc"}')])
+        assert clients.sheets().get(spreadsheetId="abc").execute(http=http) == {"spreadsheetId": "abc"}
+        assert clients.metrics()["sheets.spreadsheets.get"].startswith("n=1 ")
+        assert clients.refreshes == 0
+
+
+class TestGoogleTransport:
+    def test_calls_limited_per_spreadsheet_off_the_loop(self, monkeypatch):
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+        lock = threading.Lock()
+
+        class Request:
+            def __init__(self, spreadsheet_id):
+                self.spreadsheet_id = spreadsheet_id
+
+            def execute(self):
+                with lock:
+                    running[self.spreadsheet_id] += 1
+                    peak[self.spreadsheet_id] = max(peak[self.spreadsheet_id], running[self.spreadsheet_id])
+                time.sleep(0.02)
+                with lock:
+                    running[self.spreadsheet_id] -= 1
+                return threading.current_thread().name
+
+        monkeypatch.setattr(gsheets, "get_sheet", lambda: None)
+        transport = GoogleTransport(workers=8, per_spreadsheet=2)
+
+        async def main():
+            calls = [transport.sheets(spreadsheet_id, lambda sheets, spreadsheet_id=spreadsheet_id: Request(spreadsheet_id))
+                     for spreadsheet_id in "aaaaab"]
+            return await asyncio.gather(*calls)
+
+        threads = asyncio.run(main())
+        assert all(name.startswith("google") for name in threads)
+        assert peak == {"a": 2, "b": 1}
+
+
+class TestHuntSheets:
+    def test_targets_the_hunts_own_spreadsheets(self):
+        first = HuntSheets.for_hunt(HuntData(name="One", google_sheet_id="one", archive_google_sheet_id="one-archive"))
+        second = HuntSheets.for_hunt(HuntData(name="Two", google_sheet_id="two"))
+        assert (first.target(), first.target(archive=True)) == ("one", "one-archive")
+        assert (second.target(), second.target(archive=True)) == ("two", None)
+
+    def test_prewarm_builds_clients_on_every_worker(self, monkeypatch):
+        clients = make_clients(monkeypatch)
+        transport = GoogleTransport(workers=3)
+        asyncio.run(transport.prewarm())
+        assert clients.builds == 6
+
+        class Request:
+            def execute(self):
+                return "done"
+
+        # Calls then use the clients already built on their thread
+        assert asyncio.run(transport.sheets("a", lambda sheets: Request())) == "done"
+        assert clients.builds == 6
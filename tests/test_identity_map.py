@@ -0,0 +1,49 @@
+from bot.store import PuzzleData, RoundData
+from bot.store.identity_map import IdentityMap
+
+
+class TestIdentityMap:
+    def test_lookup_by_secondary_key(self):
+        cache = IdentityMap()
+        puzzle = PuzzleData(id=1, channel_id=10)
+        cache.put("puzzles", puzzle)
+        assert cache.get("puzzles", "channel_id", 10) == puzzle
+        assert cache.get("rounds", "id", 1) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_hands_out_copies_of_committed_state(self):
+        cache = IdentityMap()
+        puzzle = cache.adopt("puzzles", PuzzleData(id=1, status="stuck", tags=[5]))
+        puzzle.status = "solved"
+        puzzle.tags.append(6)
+        cached = cache.get("puzzles", "id", 1)
+        assert (cached.status, cached.tags) == ("stuck", [5])
+        assert cached is not cache.get("puzzles", "id", 1)
+
+    def test_stale_key_is_a_miss(self):
+        cache = IdentityMap()
+        hunt_round = RoundData(id=1, meta_code="ABCDEF")
+        cache.put("rounds", hunt_round)
+        hunt_round.meta_code = "GHIJKL"
+        cache.put("rounds", hunt_round)
+        assert cache.get("rounds", "meta_code", "ABCDEF") is None
+        assert cache.get("rounds", "meta_code", "GHIJKL").id == 1
+
+    def test_least_recently_used_evicted(self):
+        cache = IdentityMap(maxsize=2)
+        for puzzle_id in (1, 2):
+            cache.put("puzzles", PuzzleData(id=puzzle_id, channel_id=puzzle_id * 10))
+        cache.get("puzzles", "id", 1)
+        cache.put("puzzles", PuzzleData(id=3))
+        assert cache.peek("puzzles", 2) is None
+        assert cache.get("puzzles", "channel_id", 20) is None
+        assert cache.peek("puzzles", 1) is not None
+        assert cache.evictions == 1
+
+    def test_discard(self):
+        cache = IdentityMap()
+        cache.put("puzzles", PuzzleData(id=1, tags=[5]))
+        cache.put("puzzles", PuzzleData(id=2, tags=[6]))
+        cache.discard("puzzles", 2)
+        cache.discard_if("puzzles", lambda puzzle: 5 in puzzle.tags)
+        assert len(cache) == 0
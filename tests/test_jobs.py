@@ -0,0 +1,157 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bot.store import JobData
+from bot.store.async_store import AsyncStore
+from bot.store.mysqldb import MySQLJobsDb
+from bot.store.sqlite import SQLiteDatabase, SQLiteSchemaDb
+from bot.utils.jobs import JobQueue
+from bot.utils.meta_refresh import MetaRefresher
+
+
+@pytest.fixture
+def jobs_db(tmp_path):
+    db = SQLiteDatabase(tmp_path / "bot.sqlite3")
+    SQLiteSchemaDb(mydb=db).migrate()
+    yield MySQLJobsDb(mydb=db)
+    db.close()
+
+
+def run_queue(jobs_db, setup):
+    """Queue jobs with `setup(queue)` then dispatch until the queue is empty"""
+    async def main():
+        queue = JobQueue(AsyncStore(jobs_db, ThreadPoolExecutor(max_workers=1)), workers=2)
+        await setup(queue)
+        while await queue.store.get_pending() or queue._running:
+            await queue.dispatch_pending()
+            await asyncio.sleep(0.01)
+        return queue
+    return asyncio.run(main())
+
+
+class TestJobsDb:
+    def test_enqueue_round_trip_and_dedupe(self, jobs_db):
+        first = jobs_db.enqueue(JobData(hunt_id=1, kind="refresh_meta", payload={"round_id": 2, "channel_id": 3}))
+        again = jobs_db.enqueue(JobData(hunt_id=1, kind="refresh_meta", payload={"channel_id": 3, "round_id": 2}))
+        assert again.id == first.id
+        [job] = jobs_db.get_pending()
+        assert job.payload == {"channel_id": 3, "round_id": 2}
+        assert job.created_time is not None
+        assert jobs_db.counts() == {"pending": 1}
+
+    def test_reset_running(self, jobs_db):
+        job = jobs_db.enqueue(JobData(hunt_id=1, kind="announce"))
+        job.status = "running"
+        jobs_db.commit(job)
+        assert jobs_db.reset_running() == 1
+        assert [job.id for job in jobs_db.get_pending()] == [job.id]
+
+
+class TestJobQueue:
+    def test_jobs_of_a_hunt_run_in_order(self, jobs_db):
+        order = []
+
+        async def handler(job):
+            await asyncio.sleep(0.02 if job.payload["n"] == 0 else 0)
+            order.append((job.hunt_id, job.payload["n"]))
+
+        async def setup(queue):
+            queue.register("step", handler)
+            for n in range(3):
+                await queue.enqueue("step", 1, n=n)
+            await queue.enqueue("step", 2, n=0)
+
+        queue = run_queue(jobs_db, setup)
+        assert [n for hunt_id, n in order if hunt_id == 1] == [0, 1, 2]
+        assert queue.done == 4
+        assert jobs_db.counts() == {"done": 4}
+
+    def test_failed_job_retried_then_given_up(self, jobs_db, monkeypatch):
+        monkeypatch.setattr(JobQueue, "RETRY_SECONDS", (0,))
+        attempts = []
+
+        async def handler(job):
+            attempts.append(job.attempts)
+            raise RuntimeError("sheet unavailable")
+
+        async def setup(queue):
+            queue.register("archive_sheet", handler)
+            await queue.enqueue("archive_sheet", 1, channel_id=5)
+
+        queue = run_queue(jobs_db, setup)
+        assert attempts == list(range(1, JobQueue.MAX_ATTEMPTS + 1))
+        [job] = jobs_db.get_recent("failed")
+        assert job.last_error == "RuntimeError: sheet unavailable"
+        assert queue.failed == 1
+
+    def test_recorded_progress_survives_a_retry(self, jobs_db, monkeypatch):
+        monkeypatch.setattr(JobQueue, "RETRY_SECONDS", (0,))
+        sent = []
+
+        async def setup(queue):
+            async def handler(job):
+                if not job.payload.get("message_id"):
+                    sent.append(job.payload["message"])
+                    await queue.record(job, message_id=len(sent))
+                if job.attempts == 1:
+                    raise RuntimeError("commit failed")
+            queue.register("announce", handler)
+            await queue.enqueue("announce", 1, channel_id=5, message="Sheets all tidied away.")
+
+        run_queue(jobs_db, setup)
+        assert sent == ["Sheets all tidied away."]
+        [job] = jobs_db.get_recent("done")
+        assert job.payload["message_id"] == 1
+
+    def test_job_backing_off_holds_up_only_its_puzzle(self, jobs_db, monkeypatch):
+        monkeypatch.setattr(JobQueue, "RETRY_SECONDS", (60,))
+        ran = []
+
+        async def archive(job):
+            raise RuntimeError("sheet unavailable")
+
+        async def announce(job):
+            ran.append(job.payload["channel_id"])
+
+        async def main():
+            queue = JobQueue(AsyncStore(jobs_db, ThreadPoolExecutor(max_workers=1)), workers=2)
+            queue.register("archive_sheet", archive)
+            queue.register("announce", announce)
+            await queue.enqueue("archive_sheet", 1, channel_id=5)
+            await queue.enqueue("announce", 1, channel_id=5)
+            await queue.enqueue("announce", 1, channel_id=6)
+            for _ in range(3):
+                await queue.dispatch_pending()
+                while queue._running:
+                    await asyncio.sleep(0.01)
+
+        asyncio.run(main())
+        assert ran == [6]
+        assert jobs_db.counts() == {"done": 1, "pending": 2}
+
+    def test_refresh_meta_jobs_share_one_write(self, jobs_db):
+        written = []
+
+        async def flush(key):
+            written.append(key)
+
+        async def main():
+            refresher = MetaRefresher(flush, window=0.2)
+            queue = JobQueue(AsyncStore(jobs_db, ThreadPoolExecutor(max_workers=1)), workers=4)
+
+            async def refresh_meta(job):
+                await refresher.refresh(("meta", job.hunt_id, job.payload["round_id"]))
+            queue.register("refresh_meta", refresh_meta, ordered=False)
+            await queue.enqueue("refresh_meta", 1, round_id=2)
+            await queue.dispatch_pending()
+            for _ in range(4):
+                await queue.enqueue("refresh_meta", 1, round_id=2)
+            await queue.dispatch_pending()
+            while queue._running:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(main())
+        assert written == [("meta", 1, 2)]
+        assert jobs_db.counts() == {"done": 2}
@@ -0,0 +1,81 @@
+import asyncio
+
+from bot.utils.locks import LockManager
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestLockManager:
+    def test_puzzles_in_a_round_run_in_parallel(self):
+        async def main():
+            locks = LockManager()
+            running = []
+
+            async def command(puzzle_id):
+                async with locks.hold(("hunt", 1), ("round", 2), ("puzzle", puzzle_id)):
+                    running.append(puzzle_id)
+                    await asyncio.sleep(0.01)
+                    return len(running)
+
+            counts = await asyncio.gather(command(3), command(4))
+            assert max(counts) == 2
+            assert len(locks) == 0
+        run(main())
+
+    def test_round_lock_waits_for_its_puzzles(self):
+        async def main():
+            locks = LockManager()
+            order = []
+
+            async def solve():
+                async with locks.hold(("hunt", 1), ("round", 2), ("puzzle", 3)):
+                    await asyncio.sleep(0.01)
+                    order.append("solve")
+
+            async def delete_round():
+                await asyncio.sleep(0)
+                async with locks.hold(("hunt", 1), ("round", 2)):
+                    order.append("delete")
+                    # The holder can still take locks beneath it
+                    async with locks.hold(("hunt", 1), ("round", 2), ("meta", 5)):
+                        order.append("meta")
+
+            await asyncio.gather(solve(), delete_round())
+            assert order == ["solve", "delete", "meta"]
+            assert locks.metrics()["round_hold"].startswith("n=1")
+        run(main())
+
+    def test_meta_refreshes_serialised_per_meta(self):
+        async def main():
+            locks = LockManager()
+            active = {5: 0, 6: 0}
+            peak = {5: 0, 6: 0}
+
+            async def refresh(meta_id):
+                async with locks.hold(("hunt", 1), ("meta", meta_id)):
+                    active[meta_id] += 1
+                    peak[meta_id] = max(peak[meta_id], active[meta_id])
+                    await asyncio.sleep(0.01)
+                    active[meta_id] -= 1
+
+            await asyncio.gather(refresh(5), refresh(5), refresh(6))
+            assert peak == {5: 1, 6: 1}
+            assert locks.wait_times["meta"].count == 3
+        run(main())
+
+    def test_non_blocking_hold_lets_one_command_in(self):
+        async def main():
+            locks = LockManager()
+            results = []
+
+            async def command():
+                async with locks.hold(("hunt", 1), ("round", 2), ("puzzle", 3), blocking=False) as acquired:
+                    results.append(acquired)
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(command(), command())
+            assert sorted(results) == [False, True]
+            assert len(locks) == 0
+        run(main())
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from bot.utils.meta_refresh import MetaRefresher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def recorder(written):
+    async def flush(key):
+        written.append(key)
+    return flush
+
+
+class TestMetaRefresher:
+    def test_marks_in_a_window_write_once(self):
+        written = []
+
+        async def main():
+            refresher = MetaRefresher(recorder(written), window=0.02)
+            for _ in range(5):
+                refresher.mark(("meta", 1, 2))
+            refresher.mark(("metameta", 1, 9))
+            refresher.mark(("metameta", 1, 9))
+            await asyncio.sleep(0.05)
+            return refresher
+
+        refresher = run(main())
+        assert sorted(written) == [("meta", 1, 2), ("metameta", 1, 9)]
+        assert refresher.metrics()["saved"] == 5
+
+    def test_mark_during_write_writes_again(self):
+        written = []
+
+        async def main():
+            async def flush(key):
+                written.append(key)
+                if len(written) == 1:
+                    refresher.mark(key)
+            refresher = MetaRefresher(flush, window=0.01)
+            refresher.mark("meta")
+            await asyncio.sleep(0.05)
+
+        run(main())
+        assert written == ["meta", "meta"]
+
+    def test_close_writes_what_is_waiting(self):
+        written = []
+
+        async def main():
+            refresher = MetaRefresher(recorder(written), window=60)
+            refresher.mark("meta")
+            await refresher.close()
+
+        run(main())
+        assert written == ["meta"]
+
+    def test_refresh_waits_for_the_write(self):
+        written = []
+
+        async def main():
+            refresher = MetaRefresher(recorder(written), window=0.01)
+            await asyncio.gather(refresher.refresh("meta"), refresher.refresh("meta"))
+            assert written == ["meta"]
+
+            async def fail(key):
+                raise RuntimeError("sheet unavailable")
+            refresher.flush = fail
+            with pytest.raises(RuntimeError):
+                await refresher.refresh("meta")
+
+        run(main())
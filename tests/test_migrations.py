@@ -0,0 +1,37 @@
+from bot.store import migrations
+from bot.store.migrations import ensure_index, has_index
+
+
+class IndexCursor:
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.created = []
+        self.rows = []
+
+    def execute(self, stmt, params=()):
+        if stmt.startswith("CREATE"):
+            self.created.append(stmt)
+        else:
+            self.rows = [{"index_name": name, "column_name": column}
+                         for name, columns in self.indexes.get(params[0], {}).items() for column in columns]
+
+    def fetchall(self):
+        return self.rows
+
+
+class TestMigrations:
+    def test_versions_are_unique_and_ordered(self):
+        versions = [migration.VERSION for migration in migrations.load_migrations()]
+        assert versions == sorted(set(versions))
+        assert versions[0] == 1
+
+    def test_composite_index_covers_its_prefix(self):
+        indexes = {"PRIMARY": ("puzzle_id", "round_id")}
+        assert has_index(indexes, ("puzzle_id",))
+        assert not has_index(indexes, ("round_id",))
+
+    def test_ensure_index_only_creates_missing(self):
+        cursor = IndexCursor({"puzzles": {"channel": ("channel_id",)}})
+        assert not ensure_index(cursor, "puzzles", "ix_puzzles_channel_id", ("channel_id",))
+        assert ensure_index(cursor, "puzzles", "ix_puzzles_hunt_id_name", ("hunt_id", "name"))
+        assert cursor.created == ["CREATE INDEX `ix_puzzles_hunt_id_name` ON `puzzles` (`hunt_id`, `name`)"]
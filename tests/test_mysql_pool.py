@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+from mysql.connector import errors
+
+from bot.store import mysql_pool
+from bot.store.mysql_pool import MySQLConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.autocommit = False
+        self.pings = 0
+        self.alive = True
+        self.closed = False
+        self.statements = []
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise errors.InterfaceError("gone away")
+
+    def reconnect(self, attempts=1, delay=0):
+        self.alive = True
+
+    def cursor(self, *args, **kwargs):
+        return self
+
+    def start_transaction(self):
+        self.statements.append("START TRANSACTION")
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def connect(**cfg):
+        created.append(FakeConnection())
+        return created[-1]
+
+    monkeypatch.setattr(mysql_pool.mysql.connector, "connect", connect)
+    return created
+
+
+class TestMySQLConnectionPool:
+    def test_connection_reused_without_ping(self, connections):
+        pool = MySQLConnectionPool(size=2)
+        for _ in range(3):
+            with pool.checkout():
+                pool.cursor()
+        assert len(connections) == 1
+        assert connections[0].pings == 0
+        assert pool.metrics()["checkouts"] == 3
+
+    def test_nested_checkout_shares_connection(self, connections):
+        pool = MySQLConnectionPool(size=2)
+        with pool.checkout() as outer:
+            with pool.checkout() as inner:
+                assert inner is outer
+        assert pool.metrics()["checkouts"] == 1
+
+    def test_idle_connection_checked(self, connections):
+        pool = MySQLConnectionPool(size=1, idle_check=0)
+        with pool.checkout():
+            pass
+        connections[0].alive = False
+        time.sleep(0.01)
+        with pool.checkout():
+            pass
+        assert connections[0].pings == 1
+        assert pool.metrics()["reconnects"] == 1
+
+    def test_waits_when_exhausted(self, connections):
+        pool = MySQLConnectionPool(size=1, timeout=0.01)
+        timed_out = []
+
+        def checkout_in_thread():
+            try:
+                with pool.checkout():
+                    pass
+            except PoolTimeoutError:
+                timed_out.append(True)
+
+        with pool.checkout():
+            thread = threading.Thread(target=checkout_in_thread)
+            thread.start()
+            thread.join()
+        assert timed_out
+        assert pool.metrics()["waits"] == 1
+
+    def test_broken_connection_discarded(self, connections):
+        pool = MySQLConnectionPool(size=1)
+        with pytest.raises(errors.OperationalError):
+            with pool.checkout():
+                raise errors.OperationalError("lost connection")
+        assert connections[0].closed
+        assert pool.metrics()["open"] == 0
+
+    def test_cursor_requires_checkout(self, connections):
+        pool = MySQLConnectionPool(size=1)
+        with pytest.raises(RuntimeError):
+            pool.cursor()
+
+    def test_transaction_defers_commits_and_callbacks(self, connections):
+        pool = MySQLConnectionPool(size=1)
+        committed = []
+        with pool.transaction():
+            with pool.transaction():
+                pool.commit()
+                pool.after_commit(lambda: committed.append(True))
+            assert committed == []
+        assert connections[0].statements == ["START TRANSACTION", "COMMIT"]
+        assert committed == [True]
+
+    def test_transaction_rolls_back_on_error(self, connections):
+        pool = MySQLConnectionPool(size=1)
+        rolled_back = []
+        with pytest.raises(ValueError):
+            with pool.transaction():
+                pool.after_rollback(lambda: rolled_back.append(True))
+                pool.after_commit(lambda: pytest.fail("committed"))
+                raise ValueError()
+        assert connections[0].statements == ["START TRANSACTION", "ROLLBACK"]
+        assert rolled_back == [True]
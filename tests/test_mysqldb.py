@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+
+from mysql.connector import errors, errorcode
+
+from bot.store import AdditionalSheetData, RoundData
+from bot.store.identity_map import IdentityMap
+from bot.store.mysqldb import MySQLPuzzleJsonDb, MySQLRoundJsonDb
+
+
+class RecordingDb:
+    """Stands in for the connection pool, answering each query from canned rows"""
+
+    def __init__(self, puzzles, tags, sheets):
+        self.tables = {"puzzles": puzzles, "tags": tags, "additional_sheets": sheets}
+        self.queries = []
+        self.duplicates = 0
+        self.transactions = 0
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self)
+
+    def commit(self):
+        pass
+
+    @contextmanager
+    def transaction(self):
+        self.transactions += 1
+        yield self
+
+    def after_commit(self, callback):
+        callback()
+
+    def after_rollback(self, callback):
+        pass
+
+
+class RecordingCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    lastrowid = 0
+
+    def execute(self, stmt, params=()):
+        self.db.queries.append(stmt)
+        if stmt.startswith("INSERT") and self.db.duplicates:
+            self.db.duplicates -= 1
+            raise errors.IntegrityError(errno=errorcode.ER_DUP_ENTRY)
+        if stmt.startswith("SELECT"):
+            table = stmt.split("FROM ")[1].split()[0].split(".")[0].strip("`")
+            self.rows = self.db.tables.get(table, [])
+
+    def executemany(self, stmt, seq_params):
+        self.db.queries.append(stmt)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def load_puzzle(db, row, tags=()):
+    db.tables = {"puzzles": [row], "tags": [{"puzzle_id": row["id"], "round_id": tag} for tag in tags],
+                 "additional_sheets": []}
+    puzzle = MySQLPuzzleJsonDb(mydb=db).construct_puzzle(row)
+    db.queries.clear()
+    return puzzle
+
+
+def puzzle_rows(count):
+    return [{"id": i, "name": f"Puzzle {i}", "hunt_id": 1, "channel_id": 100 + i, "priority": ""} for i in range(1, count + 1)]
+
+
+class TestMySQLPuzzleJsonDb:
+    def test_get_all_from_hunt_query_count_is_constant(self):
+        for count in (1, 150):
+            tags = [{"puzzle_id": i, "round_id": 7} for i in range(1, count + 1)]
+            sheets = [{"puzzle_id": 1, "id": 3, "google_page_id": "abc", "puzzle_name": "Extra"}]
+            db = RecordingDb(puzzle_rows(count), tags, sheets)
+            puzzles = MySQLPuzzleJsonDb(mydb=db).get_all_from_hunt(1)
+            assert len(db.queries) == 3
+            assert len(puzzles) == count
+            assert all(puzzle.tags == [7] for puzzle in puzzles)
+            assert puzzles[0].additional_sheets[0].google_page_id == "abc"
+
+    def test_no_rows_skips_hydration(self):
+        db = RecordingDb([], [], [])
+        assert MySQLPuzzleJsonDb(mydb=db).get_all_from_hunt(1) == []
+        assert len(db.queries) == 1
+
+    def test_commit_skips_clean_puzzle(self):
+        db = RecordingDb([], [], [])
+        puzzle = load_puzzle(db, puzzle_rows(1)[0], tags=[7])
+        MySQLPuzzleJsonDb(mydb=db).commit(puzzle)
+        assert db.queries == []
+
+    def test_commit_updates_only_changed_columns(self):
+        db = RecordingDb([], [], [])
+        puzzle = load_puzzle(db, puzzle_rows(1)[0], tags=[7])
+        puzzle.status = "solved"
+        puzzle.priority = "high"
+        MySQLPuzzleJsonDb(mydb=db).commit(puzzle)
+        assert db.queries == ["UPDATE `puzzles` SET `status` = %s, `priority` = %s WHERE `id` = %s"]
+        assert not puzzle.is_dirty()
+
+    def test_commit_diffs_tags_against_loaded_tags(self):
+        db = RecordingDb([], [], [])
+        puzzle = load_puzzle(db, puzzle_rows(1)[0], tags=[7])
+        puzzle.tags = [8]
+        MySQLPuzzleJsonDb(mydb=db).commit(puzzle)
+        assert not any(query.startswith("SELECT") for query in db.queries)
+        assert db.queries[0].startswith("DELETE FROM tags")
+        assert db.queries[1].startswith("INSERT INTO tags")
+
+    def test_commit_writes_puzzle_tags_and_sheets_in_one_transaction(self):
+        db = RecordingDb([], [], [])
+        puzzle = load_puzzle(db, puzzle_rows(1)[0], tags=[7])
+        puzzle.solved = True
+        puzzle.tags.append(8)
+        puzzle.additional_sheets.append(AdditionalSheetData(puzzle_name="Extra"))
+        MySQLPuzzleJsonDb(mydb=db).commit(puzzle)
+        assert db.transactions == 1
+        assert [query.split(" (")[0] for query in db.queries] == [
+            "UPDATE `puzzles` SET `solved` = %s WHERE `id` = %s",
+            "INSERT INTO tags",
+            "INSERT INTO `additional_sheets`",
+        ]
+        assert not puzzle.is_dirty()
+
+    def test_identity_map_skips_repeat_loads(self):
+        db = RecordingDb(puzzle_rows(3), [], [])
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db, cache=IdentityMap())
+        db.tables["puzzles"] = puzzle_rows(1)
+        puzzle = puzzle_db.get_by_attr(channel_id=101)
+        db.queries.clear()
+        assert puzzle_db.get_by_attr(id=1) == puzzle
+        assert db.queries == []
+        db.tables["puzzles"] = puzzle_rows(3)
+        puzzles = puzzle_db.get_all_from_hunt(1)
+        assert puzzles[0] == puzzle
+        assert len(db.queries) == 3
+
+
+class TestBulkApis:
+    def test_sync_round_query_count_is_constant(self):
+        for count in (1, 40):
+            tags = [{"puzzle_id": i, "round_id": 7} for i in range(1, count + 1)]
+            db = RecordingDb(puzzle_rows(count), tags, [])
+            puzzle_db = MySQLPuzzleJsonDb(mydb=db)
+            puzzles = puzzle_db.get_many(channel_ids=[100 + i for i in range(1, count + 1)])
+            for puzzle in puzzles:
+                puzzle.tags = [8]
+            puzzle_db.commit_many(puzzles)
+            assert [query.split(" ")[0] for query in db.queries] == ["SELECT", "SELECT", "SELECT", "DELETE", "INSERT"]
+            assert not any(puzzle.is_dirty() for puzzle in puzzles)
+
+    def test_commit_many_groups_rows_by_changed_columns(self):
+        db = RecordingDb(puzzle_rows(3), [], [])
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db)
+        first, second, third = puzzle_db.get_all_from_hunt(1)
+        db.queries.clear()
+        first.status = "solved"
+        second.status = "backsolved"
+        puzzle_db.commit_many([first, second, third])
+        assert db.queries == ["UPDATE `puzzles` SET `status` = CASE `id` WHEN %s THEN %s WHEN %s THEN %s END "
+                              "WHERE `id` IN (%s, %s)"]
+
+    def test_delete_many_removes_rows_tags_and_notes(self):
+        db = RecordingDb([], [], [])
+        MySQLPuzzleJsonDb(mydb=db).delete_many([1, 2, 3])
+        assert db.queries == ["DELETE FROM `puzzles` WHERE id IN (%s, %s, %s)",
+                              "DELETE FROM tags WHERE puzzle_id IN (%s, %s, %s)",
+                              "DELETE FROM puzzle_notes WHERE puzzle_id IN (%s, %s, %s)"]
+
+
+class TestCommitWithUid:
+    def test_code_avoids_existing_codes_in_one_query(self):
+        db = RecordingDb([], [], [])
+        taken = {"ABCDE" + letter for letter in "ABCDEFGHIJKLMNOPQRSTUVWXY"}
+        db.tables["rounds"] = [(code,) for code in taken]
+        hunt_round = RoundData("Ab Cd Ef")
+        code = MySQLRoundJsonDb(mydb=db).commit_with_uid(hunt_round, "meta_code", 6, hunt_round.name)
+        assert code.startswith("ABC") and code not in taken
+        assert len(db.queries) == 2
+        assert db.queries[1].startswith("INSERT INTO `rounds`")
+
+    def test_duplicate_key_tries_next_code(self):
+        db = RecordingDb([], [], [])
+        db.duplicates = 1
+        hunt_round = RoundData("Ab Cd Ef")
+        code = MySQLRoundJsonDb(mydb=db).commit_with_uid(hunt_round, "meta_code", 6, hunt_round.name)
+        assert code.startswith("ABCDE") and code != "ABCDEF"
+        assert len(db.queries) == 3
@@ -0,0 +1,41 @@
+from bot.utils.sheet_properties import SheetPropertiesCache
+
+
+def tab(sheet_id, title, index, **properties):
+    return {"properties": dict(sheetId=sheet_id, title=title, index=index, **properties)}
+
+
+def titles(cache, spreadsheet_id="hunt"):
+    return [sheet["properties"]["title"] for sheet in cache.sheets(spreadsheet_id)]
+
+
+class TestSheetPropertiesCache:
+    def test_miss_then_hits(self):
+        cache = SheetPropertiesCache()
+        assert cache.sheets("hunt") is None
+        cache.store("hunt", [tab(2, "Template", 1, hidden=True), tab(1, "OVERVIEW", 0)])
+        assert titles(cache) == ["OVERVIEW", "Template"]
+        assert cache.metrics()["hits"] == 1 and cache.metrics()["misses"] == 1
+
+    def test_batch_update_replies_applied(self):
+        cache = SheetPropertiesCache()
+        cache.store("hunt", [tab(1, "OVERVIEW", 0), tab(2, "Template", 1, hidden=True), tab(3, "Old", 2)])
+        requests = [
+            {"updateSheetProperties": {"properties": {"sheetId": 2, "hidden": False}, "fields": "hidden"}},
+            {"duplicateSheet": {"sourceSheetId": 2, "insertSheetIndex": 1, "newSheetName": "Puzzle"}},
+            {"updateSheetProperties": {"properties": {"sheetId": 2, "hidden": True}, "fields": "hidden"}},
+            {"deleteSheet": {"sheetId": 3}},
+            {"updateSheetProperties": {"properties": {"sheetId": 1, "index": 3}, "fields": "index"}},
+            {"updateSheetProperties": {"properties": {"sheetId": 9, "title": "Puzzle (2)"}, "fields": "title"}},
+        ]
+        replies = [{}, {"duplicateSheet": {"properties": {"sheetId": 9, "title": "Puzzle", "index": 1}}}, {}, {}, {}, {}]
+        cache.apply("hunt", requests, replies)
+        assert titles(cache) == ["Puzzle (2)", "Template", "OVERVIEW"]
+        assert [sheet["properties"]["index"] for sheet in cache.sheets("hunt")] == [0, 1, 2]
+        assert cache.sheets("hunt")[1]["properties"]["hidden"] is True
+
+    def test_unknown_tab_invalidates(self):
+        cache = SheetPropertiesCache()
+        cache.store("hunt", [tab(1, "OVERVIEW", 0)])
+        cache.apply("hunt", [{"updateSheetProperties": {"properties": {"sheetId": 5, "title": "X"}, "fields": "title"}}], [])
+        assert cache.sheets("hunt") is None
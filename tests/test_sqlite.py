@@ -0,0 +1,130 @@
+import datetime
+
+import pytest
+
+from bot.store import AdditionalSheetData, GuildSettings, HuntData, NoteData, PuzzleData, RoundData
+from bot.store.identity_map import IdentityMap
+from bot.store.migrations import v0004_puzzle_notes
+from bot.store.mysqldb import MySQLGuildSettingsDb, MySQLHuntJsonDb, MySQLNotesDb, MySQLPuzzleJsonDb, MySQLRoundJsonDb
+from bot.store.sqlite import SQLiteDatabase, SQLiteSchemaDb
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteDatabase(tmp_path / "bot.sqlite3")
+    SQLiteSchemaDb(mydb=db).migrate()
+    yield db
+    db.close()
+
+
+class TestSQLiteStorage:
+    def test_schema_has_every_expected_index(self, db):
+        schema = SQLiteSchemaDb(mydb=db)
+        assert schema.missing_indexes() == []
+        assert schema.pending() == []
+
+    def test_puzzle_round_trip(self, db):
+        hunt = HuntData(name="Hunt")
+        MySQLHuntJsonDb(mydb=db).commit_with_uid(hunt, "uid")
+        hunt_round = RoundData("Round", hunt_id=hunt.id)
+        MySQLRoundJsonDb(mydb=db).commit(hunt_round)
+        solve_time = datetime.datetime(2026, 1, 17, 12, 30, tzinfo=datetime.timezone.utc)
+        puzzle = PuzzleData("Puzzle", hunt_id=hunt.id, channel_id=101, tags=[hunt_round.id],
+                            solve_time=solve_time)
+        puzzle.additional_sheets.append(AdditionalSheetData(puzzle_name="Extra"))
+        MySQLPuzzleJsonDb(mydb=db).commit(puzzle)
+
+        loaded = MySQLPuzzleJsonDb(mydb=db).get_by_attr(channel_id=101)
+        assert loaded.id == puzzle.id
+        assert loaded.tags == [hunt_round.id]
+        assert loaded.solve_time == solve_time
+        assert loaded.additional_sheets[0].puzzle_name == "Extra"
+        assert [p.id for p in MySQLPuzzleJsonDb(mydb=db).get_all_from_round(hunt_round.id)] == [puzzle.id]
+
+    def test_duplicate_code_tries_next(self, db):
+        round_db = MySQLRoundJsonDb(mydb=db)
+        first = RoundData("Ab Cd Ef")
+        round_db.commit_with_uid(first, "meta_code", 6, first.name)
+        second = RoundData("Ab Cd Ef")
+        round_db.commit_with_uid(second, "meta_code", 6, second.name)
+        assert first.meta_code == "ABCDEF"
+        assert second.meta_code.startswith("ABCDE") and second.meta_code != first.meta_code
+
+    def test_failed_transaction_rolls_back(self, db):
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db)
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                puzzle_db.commit(PuzzleData("Puzzle", channel_id=101))
+                raise RuntimeError()
+        assert puzzle_db.get_many(channel_ids=[101]) == []
+
+    def test_rolled_back_change_not_seen_by_other_commands(self, db):
+        cache = IdentityMap()
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db, cache=cache)
+        puzzle_db.commit(PuzzleData("Puzzle", channel_id=101, status="new"))
+        first = puzzle_db.get_by_attr(channel_id=101)
+        second = puzzle_db.get_by_attr(channel_id=101)
+        first.status = "stuck"
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                puzzle_db.commit(first)
+                raise RuntimeError()
+        assert puzzle_db.get_by_attr(channel_id=101).status == "new"
+        second.priority = "high"
+        puzzle_db.commit(second)
+        cache.clear()
+        loaded = puzzle_db.get_by_attr(channel_id=101)
+        assert (loaded.status, loaded.priority) == ("new", "high")
+
+    def test_archive_candidates_filtered_in_query(self, db):
+        settings = GuildSettings(guild_id=987654321098765432, guild_name="Guild")
+        MySQLGuildSettingsDb(None, mydb=db).commit(settings)
+        assert settings.id != settings.guild_id
+        # Hunts hold the guilds row id, not the Discord guild id
+        hunt = HuntData(name="Hunt", guild_id=settings.id)
+        MySQLHuntJsonDb(mydb=db).commit(hunt)
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        long_ago = now - datetime.timedelta(hours=1)
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db)
+        puzzle_db.commit_many([
+            PuzzleData("Candidate", hunt_id=hunt.id, channel_id=101, solved=True, solve_time=long_ago),
+            PuzzleData("Just solved", hunt_id=hunt.id, channel_id=102, solved=True, solve_time=now),
+            PuzzleData("Archived", hunt_id=hunt.id, channel_id=103, solved=True, solve_time=long_ago, archive_time=now),
+            PuzzleData("Unsolved", hunt_id=hunt.id, channel_id=104),
+            PuzzleData("meta", hunt_id=hunt.id, channel_id=105, solved=True, solve_time=long_ago),
+        ])
+        assert [p.name for p in puzzle_db.get_solved_puzzles_to_archive(settings.id, minutes=10)] == ["Candidate"]
+        assert {p.name for p in puzzle_db.get_solved_puzzles_to_archive(settings.id, include_meta=True)} == {"Candidate", "meta"}
+        assert puzzle_db.get_solved_puzzles_to_archive(settings.guild_id, minutes=10) == []
+
+        cursor = db.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + MySQLPuzzleJsonDb.archive_candidates_stmt(), (settings.id, "2026-01-01"))
+        assert "ix_puzzles_archive_candidates" in " ".join(str(row) for row in cursor.fetchall())
+
+    def test_notes_are_rows(self, db):
+        puzzle_db = MySQLPuzzleJsonDb(mydb=db)
+        puzzle = PuzzleData("Puzzle", channel_id=101)
+        puzzle_db.commit(puzzle)
+        notes_db = MySQLNotesDb(mydb=db)
+        for text in ("first", "second"):
+            notes_db.commit(NoteData(puzzle_id=puzzle.id, text=text, author="Solver",
+                                     jump_url="https://discord.com/channels/1/2/3"))
+        notes = notes_db.get_by_puzzle(puzzle.id)
+        assert [str(note) for note in notes] == ["first - https://discord.com/channels/1/2/3",
+                                                 "second - https://discord.com/channels/1/2/3"]
+        assert notes[0].created_time.tzinfo == datetime.timezone.utc
+        notes_db.delete(notes[0].id)
+        assert [note.text for note in notes_db.get_by_puzzle(puzzle.id)] == ["second"]
+        puzzle_db.delete_many([puzzle.id])
+        assert notes_db.get_by_puzzle(puzzle.id) == []
+
+    def test_notes_copied_from_puzzle_rows(self, db):
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("INSERT INTO puzzles (name, notes) VALUES (%s, %s)",
+                       ("Puzzle", '["Try the first letters - https://discord.com/channels/1/2/3", "no link"]'))
+        puzzle_id = cursor.lastrowid
+        v0004_puzzle_notes.copy_data(cursor)
+        cursor.close()
+        notes = MySQLNotesDb(mydb=db).get_by_puzzle(puzzle_id)
+        assert [(note.text, note.jump_url) for note in notes] == [
+            ("Try the first letters", "https://discord.com/channels/1/2/3"), ("no link", "")]
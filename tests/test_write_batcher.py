@@ -0,0 +1,81 @@
+import asyncio
+
+from bot.utils.write_batcher import SheetsWriteBatcher
+
+
+def run(main):
+    return asyncio.run(main())
+
+
+class TestSheetsWriteBatcher:
+    def test_writes_merged_in_order_with_their_replies(self):
+        sent = []
+
+        async def send(spreadsheet_id, body):
+            sent.append((spreadsheet_id, [request["n"] for request in body["requests"]]))
+            return {"replies": [{"n": request["n"]} for request in body["requests"]]}
+
+        async def main():
+            batcher = SheetsWriteBatcher(send, interval=0.01)
+            results = await asyncio.gather(
+                batcher.submit("a", [{"n": 1}, {"n": 2}]),
+                batcher.submit("b", [{"n": 3}]),
+                batcher.submit("a", [{"n": 4}]),
+            )
+            return batcher, results
+
+        batcher, results = run(main)
+        assert sorted(sent) == [("a", [1, 2, 4]), ("b", [3])]
+        assert results == [[{"n": 1}, {"n": 2}], [{"n": 3}], [{"n": 4}]]
+        assert batcher.metrics() == {"submitted": 3, "batch_updates": 2, "saved": 1, "waiting": 0}
+
+    def test_failed_batch_resent_one_submission_at_a_time(self):
+        async def send(spreadsheet_id, body):
+            if any(request.get("bad") for request in body["requests"]):
+                raise RuntimeError("Invalid sheetId")
+            return {}
+
+        async def main():
+            batcher = SheetsWriteBatcher(send, interval=0.01)
+            return await asyncio.gather(
+                batcher.submit("a", [{"n": 1}]),
+                batcher.submit("a", [{"bad": True}]),
+                return_exceptions=True,
+            )
+
+        good, bad = run(main)
+        assert good == [{}]
+        assert isinstance(bad, RuntimeError)
+
+    def test_large_batches_split(self):
+        sizes = []
+
+        async def send(spreadsheet_id, body):
+            sizes.append(len(body["requests"]))
+            return {}
+
+        async def main():
+            batcher = SheetsWriteBatcher(send, interval=0.01, max_requests=3)
+            await asyncio.gather(*(batcher.submit("a", [{}, {}]) for _ in range(3)))
+
+        run(main)
+        assert sizes == [2, 2, 2]
+
+    def test_close_lets_batches_in_flight_finish(self):
+        sending = asyncio.Event()
+
+        async def send(spreadsheet_id, body):
+            sending.set()
+            await asyncio.sleep(0.05)
+            return {"replies": body["requests"]}
+
+        async def main():
+            batcher = SheetsWriteBatcher(send, interval=0)
+            submit = asyncio.create_task(batcher.submit("a", [{"n": 1}]))
+            await sending.wait()
+            waiting = asyncio.create_task(batcher.submit("a", [{"n": 2}]))
+            await asyncio.sleep(0)
+            await batcher.close()
+            return await asyncio.wait_for(asyncio.gather(submit, waiting), timeout=1)
+
+        assert run(main) == [[{"n": 1}], [{"n": 2}]]